@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+
+""" benchmarks mongobar backup, restore, metadata generation and listing
+    against a throwaway local mongod, see the Benchmarks section of README.md
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pymongo # noqa
+
+import mongobar # noqa
+import mongobar.__version__ # noqa
+
+
+# datasets
+
+def insert_documents(collection, documents, batch_size=1000):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def generate_small(client, scale, rng):
+    """ many small collections
+    """
+
+    database = client["bench_small"]
+    for i in range(int(200 * scale)):
+        insert_documents(database["c{}".format(i)], (
+            {"_id": j, "value": rng.random(), "name": "doc-{}".format(j)}
+            for j in range(100)
+        ))
+        database["c{}".format(i)].create_index("value")
+
+
+def generate_huge(client, scale, rng):
+    """ a few large collections with secondary indexes
+    """
+
+    database = client["bench_huge"]
+    for i in range(2):
+        insert_documents(database["c{}".format(i)], (
+            {
+                "_id": j,
+                "user": rng.randint(0, 10000),
+                "score": rng.random(),
+                "tags": [rng.choice(["a", "b", "c", "d"]) for _ in range(3)],
+                "payload": "x" * rng.randint(50, 500)
+            }
+            for j in range(int(200000 * scale))
+        ))
+        database["c{}".format(i)].create_index([("user", 1), ("score", -1)])
+
+
+def generate_wide(client, scale, rng):
+    """ one collection of documents with many fields
+    """
+
+    database = client["bench_wide"]
+    insert_documents(database["c0"], (
+        dict([("_id", j)] + [("f{}".format(k), rng.random()) for k in range(200)])
+        for j in range(int(20000 * scale))
+    ), batch_size=100)
+
+
+datasets = {
+    "small": generate_small,
+    "huge": generate_huge,
+    "wide": generate_wide
+}
+
+
+# server
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Mongod(object):
+
+    def __init__(self, binary="mongod", replica_set=True, timeout=30):
+        self.binary = binary
+        self.replica_set = replica_set
+        self.timeout = timeout
+        self.port = free_port()
+        self.dbpath = None
+        self.process = None
+
+    def __enter__(self):
+        self.dbpath = tempfile.mkdtemp(prefix="mongobar-bench-")
+
+        command = [
+            self.binary,
+            "--dbpath", self.dbpath,
+            "--port", str(self.port),
+            "--bind_ip", "127.0.0.1",
+            "--quiet"
+        ]
+        if self.replica_set:
+            command += ["--replSet", "bench"]
+
+        self.process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        try:
+            self.wait()
+        except Exception:
+            self.__exit__()
+            raise
+
+        return self
+
+    def __exit__(self, *args):
+        self.process.terminate()
+        self.process.wait()
+        shutil.rmtree(self.dbpath, ignore_errors=True)
+
+    def client(self):
+        return pymongo.MongoClient(
+            host="127.0.0.1",
+            port=self.port,
+            directConnection=True,
+            serverSelectionTimeoutMS=1000
+        )
+
+    def wait(self):
+        deadline = time.time() + self.timeout
+        client = self.client()
+
+        while True:
+            try:
+                client.admin.command("ping")
+                break
+            except pymongo.errors.PyMongoError:
+                if time.time() > deadline or self.process.poll() is not None:
+                    raise RuntimeError("mongod did not start")
+                time.sleep(0.2)
+
+        # the oplog exists only on replica set members
+        if self.replica_set:
+            client.admin.command("replSetInitiate", {
+                "_id": "bench",
+                "members": [{"_id": 0, "host": "127.0.0.1:{}".format(self.port)}]
+            })
+            while not client.admin.command("isMaster").get("ismaster"):
+                if time.time() > deadline:
+                    raise RuntimeError("mongod did not become primary")
+                time.sleep(0.2)
+
+        client.close()
+
+    @property
+    def version(self):
+        client = self.client()
+        try:
+            return client.server_info()["version"]
+        finally:
+            client.close()
+
+
+# benchmarks
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def summarize(runs):
+    return {
+        "runs": [round(r, 4) for r in runs],
+        "min": round(min(runs), 4),
+        "median": round(statistics.median(runs), 4)
+    }
+
+
+def benchmark_dataset(server, name, args, config):
+    rng = random.Random(args.seed)
+    client = server.client()
+
+    # drop everything but the system databases
+    for database in client.list_database_names():
+        if database not in ["admin", "config", "local"]:
+            client.drop_database(database)
+
+    generate_seconds, _ = timed(datasets[name], client, args.scale, rng)
+
+    database = "bench_{}".format(name)
+    stats = client[database].command("dbStats")
+    client.close()
+
+    root = tempfile.mkdtemp(prefix="mongobar-bench-root-")
+    mongobar.clients.registry.close()
+
+    try:
+        m = mongobar.Mongobar()
+        m.config.add({
+            "root": root,
+            "connections": {
+                "default": {"host": "127.0.0.1", "port": server.port}
+            }
+        })
+        m.config.add(config)
+
+        timings = {"metadata": [], "backup": [], "list": [], "restore": []}
+        for _ in range(args.repeat):
+            duration, _ = timed(m.generate_metadata, [database])
+            timings["metadata"].append(duration)
+
+            duration, backup_name = timed(m.backup, "benchmark", [database])
+            timings["backup"].append(duration)
+
+            duration, _ = timed(m.list_backups)
+            timings["list"].append(duration)
+
+            duration, _ = timed(m.restore, backup_name, [database])
+            timings["restore"].append(duration)
+
+        result = dict([(k, summarize(v)) for k, v in timings.items()])
+        result["dataset"] = {
+            "collections": stats["collections"],
+            "documents": stats["objects"],
+            "data_size": stats["dataSize"],
+            "generate_seconds": round(generate_seconds, 4)
+        }
+
+        return result
+
+    finally:
+        mongobar.clients.registry.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def compare(results, baseline, threshold):
+    """ prints the median of each operation against `baseline`, returns the
+        number of operations slower than the baseline by more than `threshold`
+    """
+
+    regressions = 0
+
+    print("{:<8} {:<9} {:>10} {:>10} {:>8}".format("dataset", "operation", "baseline", "current", "change"))
+    for name, result in sorted(results["results"].items()):
+        for operation in ["metadata", "backup", "list", "restore"]:
+            try:
+                before = baseline["results"][name][operation]["median"]
+            except KeyError:
+                continue
+
+            after = result[operation]["median"]
+            change = (after - before) / before if before else 0.0
+
+            flag = ""
+            if change > threshold:
+                flag = " REGRESSION"
+                regressions += 1
+
+            print("{:<8} {:<9} {:>10.4f} {:>10.4f} {:>+7.1%}{}".format(
+                name, operation, before, after, change, flag
+            ))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mongobar against a local mongod")
+    parser.add_argument("-d", "--dataset",
+        dest="datasets",
+        action="append",
+        choices=sorted(datasets.keys()),
+        help="Dataset(s) to benchmark, defaults to all"
+    )
+    parser.add_argument("--scale",
+        type=float,
+        default=1.0,
+        help="Multiplier for the size of the datasets"
+    )
+    parser.add_argument("--repeat",
+        type=int,
+        default=3,
+        help="Number of runs of each operation"
+    )
+    parser.add_argument("--seed",
+        type=int,
+        default=1,
+        help="Random seed for the generated documents"
+    )
+    parser.add_argument("--config",
+        default="{}",
+        help="JSON object merged into the mongobar config, e.g. '{\"engine\": \"native\"}'"
+    )
+    parser.add_argument("--mongod",
+        default="mongod",
+        help="Path to the mongod binary"
+    )
+    parser.add_argument("-o", "--output",
+        help="Path to write the results to"
+    )
+    parser.add_argument("--baseline",
+        help="Path to the results of a previous run to compare against"
+    )
+    parser.add_argument("--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown reported as a regression"
+    )
+    args = parser.parse_args()
+
+    config = json.loads(args.config)
+
+    with Mongod(args.mongod) as server:
+        results = {
+            "date": datetime.datetime.now().isoformat(),
+            "mongobar": mongobar.__version__.__version__,
+            "mongod": server.version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "config": config,
+            "results": {}
+        }
+
+        for name in args.datasets or sorted(datasets.keys()):
+            print("Benchmarking dataset '{}'".format(name), file=sys.stderr)
+            results["results"][name] = benchmark_dataset(server, name, args, config)
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            file_handle.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file_handle:
+            baseline = json.loads(file_handle.read())
+
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os
+import json
+import sqlite3
+import contextlib
+
+from mongobar.utils import get_directories
+
+
+def metadata_totals(metadata):
+    """ returns the database, collection and document counts of `metadata`
+    """
+
+    databases_count = len(metadata["databases"])
+    collections_count = 0
+    documents_count = 0
+
+    for database in metadata["databases"]:
+        collections_count += len(database["collections"])
+        for collection in database["collections"]:
+            documents_count += collection.get("document_count", 0)
+
+    return databases_count, collections_count, documents_count
+
+
+class Catalog(object):
+
+    filename = "catalog.sqlite"
+
+    # the catalog is rebuilt from disk when the schema changes
+    schema_version = 3
+    schema = [
+        """
+        CREATE TABLE backups (
+            directory TEXT NOT NULL,
+            name TEXT NOT NULL,
+            date TEXT,
+            message TEXT,
+            databases_count INTEGER,
+            collections_count INTEGER,
+            documents_count INTEGER,
+            complete INTEGER NOT NULL DEFAULT 1,
+            partial INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (directory, name)
+        )
+        """,
+        """
+        CREATE INDEX backups_directory_date ON backups (directory, date)
+        """,
+        """
+        CREATE TABLE directories (
+            directory TEXT PRIMARY KEY,
+            mtime INTEGER
+        )
+        """
+    ]
+
+    columns = [
+        "name",
+        "date",
+        "message",
+        "databases_count",
+        "collections_count",
+        "documents_count",
+        "complete",
+        "partial"
+    ]
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, self.filename)
+
+    @contextlib.contextmanager
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+
+        try:
+            if self.version(connection) != self.schema_version:
+                self.migrate(connection)
+
+            with connection:
+                yield connection
+
+        finally:
+            connection.close()
+
+    def version(self, connection):
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self, connection):
+        """ rebuilds the schema, the write lock is held while the version is
+            read again so concurrent connections migrate a new catalog once
+        """
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if self.version(connection) != self.schema_version:
+                connection.execute("DROP TABLE IF EXISTS backups")
+                connection.execute("DROP TABLE IF EXISTS directories")
+                for statement in self.schema:
+                    connection.execute(statement)
+                connection.execute("PRAGMA user_version = {}".format(self.schema_version))
+            connection.commit()
+
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def read_metadata(self, directory, name):
+        path = os.path.join(self.root, directory, name, "metadata.json")
+
+        try:
+            with open(path, "r") as file_handle:
+                return json.loads(file_handle.read())
+
+        except (FileNotFoundError, ValueError):
+            # a backup being written has no metadata yet
+            return {
+                "date": "0001-01-01T00:00:00.0000",
+                "databases": [],
+                "message": "Metadata not found",
+                "complete": False
+            }
+
+    def row(self, directory, name, metadata):
+        return [
+            directory,
+            name,
+            metadata.get("date"),
+            metadata.get("message")
+        ] + list(metadata_totals(metadata)) + [
+            int(bool(metadata.get("complete", True))),
+            int(bool(metadata.get("partial")))
+        ]
+
+    def add(self, directory, name, metadata):
+        """ adds or replaces backup `name` in connection directory `directory`
+        """
+
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO backups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.row(directory, name, metadata)
+            )
+
+    def remove(self, directory, name):
+        """ removes backup `name` from connection directory `directory`
+        """
+
+        with self.connect() as connection:
+            connection.execute(
+                "DELETE FROM backups WHERE directory = ? AND name = ?",
+                [directory, name]
+            )
+
+    def sync(self, directory):
+        """ reconciles the catalog with connection directory `directory`, the
+            directory is only listed when its mtime changed since the last sync
+            and metadata is only read for backups missing from the catalog
+        """
+
+        path = os.path.join(self.root, directory)
+
+        with self.connect() as connection:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                connection.execute("DELETE FROM backups WHERE directory = ?", [directory])
+                connection.execute("DELETE FROM directories WHERE directory = ?", [directory])
+                return
+
+            row = connection.execute(
+                "SELECT mtime FROM directories WHERE directory = ?",
+                [directory]
+            ).fetchone()
+
+            if row is not None and row[0] == mtime:
+                return
+
+            on_disk = set([d for d in get_directories(path) if not d.startswith(".")])
+            in_catalog = set([r[0] for r in connection.execute(
+                "SELECT name FROM backups WHERE directory = ?",
+                [directory]
+            )])
+
+            for name in in_catalog - on_disk:
+                connection.execute(
+                    "DELETE FROM backups WHERE directory = ? AND name = ?",
+                    [directory, name]
+                )
+
+            for name in on_disk - in_catalog:
+                connection.execute(
+                    "INSERT OR REPLACE INTO backups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self.row(directory, name, self.read_metadata(directory, name))
+                )
+
+            connection.execute(
+                "INSERT OR REPLACE INTO directories VALUES (?, ?)",
+                [directory, mtime]
+            )
+
+    def backups(self, directory, limit=None, complete=True):
+        """ returns the complete (or incomplete) backups in connection
+            directory `directory`, newest first
+        """
+
+        query = "SELECT {} FROM backups WHERE directory = ? AND complete = ? ORDER BY date DESC"
+        query = query.format(", ".join(self.columns))
+        parameters = [directory, int(complete)]
+
+        if limit:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        with self.connect() as connection:
+            return [
+                dict(zip(self.columns, row))
+                for row in connection.execute(query, parameters)
+            ]
+
+    def counts(self):
+        """ returns a dict of complete backup counts per connection directory
+        """
+
+        query = "SELECT directory, COUNT(*) FROM backups WHERE complete = 1 GROUP BY directory"
+
+        with self.connect() as connection:
+            return dict([row for row in connection.execute(query)])
@@ -0,0 +1,121 @@
+import os
+import time
+import zlib
+import struct
+import hashlib
+import tempfile
+
+
+def iter_documents(file_handle):
+    """ yields the raw bytes of each BSON document in `file_handle`
+    """
+
+    while True:
+        header = file_handle.read(4)
+        if not header:
+            return
+
+        size = struct.unpack("<i", header)[0]
+        yield header + file_handle.read(size - 4)
+
+
+def iter_chunks(file_handle, bson=True, mask=0x1ff, min_size=64 * 1024, \
+        max_size=8 * 1024 * 1024):
+    """ yields content-defined chunks of `file_handle`, BSON streams are cut
+        after documents whose crc32 matches `mask`, so unchanged runs of
+        documents produce the same chunks from one backup to the next
+    """
+
+    if not bson:
+        while True:
+            data = file_handle.read(max_size)
+            if not data:
+                return
+            yield data
+
+    chunk = []
+    size = 0
+    for document in iter_documents(file_handle):
+        chunk.append(document)
+        size += len(document)
+
+        if size >= max_size or \
+                (size >= min_size and zlib.crc32(document) & mask == 0):
+            yield b"".join(chunk)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield b"".join(chunk)
+
+
+class ChunkStore(object):
+
+    # chunks newer than this are never collected, protecting chunks written
+    # by backups whose manifest does not exist yet
+    grace_period = 24 * 60 * 60
+
+    def __init__(self, path):
+        self.path = path
+
+    def chunk_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def put(self, data):
+        """ stores `data` once, returns its sha256 digest
+        """
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+
+        # already stored, refresh mtime so it survives the grace period
+        if os.path.exists(path):
+            os.utime(path)
+            return digest
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # write atomically, concurrent backups may store the same chunk
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(file_descriptor, "wb") as file_handle:
+            file_handle.write(zlib.compress(data, 6))
+        os.replace(temp_path, path)
+
+        return digest
+
+    def get(self, digest):
+        with open(self.chunk_path(digest), "rb") as file_handle:
+            return zlib.decompress(file_handle.read())
+
+    def digests(self):
+        """ yields the digests of all stored chunks
+        """
+
+        if not os.path.exists(self.path):
+            return
+
+        for prefix in os.listdir(self.path):
+            prefix_path = os.path.join(self.path, prefix)
+            for name in os.listdir(prefix_path):
+                if len(prefix + name) == 64:
+                    yield prefix + name
+
+    def collect(self, referenced):
+        """ removes chunks not in `referenced` that are older than the grace
+            period, returns the number of chunks removed
+        """
+
+        cutoff = time.time() - self.grace_period
+        removed = 0
+
+        for digest in list(self.digests()):
+            if digest in referenced:
+                continue
+
+            path = self.chunk_path(digest)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+
+        return removed
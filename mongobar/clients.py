@@ -0,0 +1,47 @@
+import atexit
+import threading
+
+from mongobar.utils import lazy_import
+from mongobar.exceptions import ServerConnectionError
+
+# imported when the first client is created
+pymongo = lazy_import("pymongo")
+
+
+class ClientRegistry(object):
+
+    def __init__(self):
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, connection, options):
+        """ returns the client for `connection`, creating and verifying it
+            with a single ping the first time it is requested
+        """
+
+        with self.lock:
+            if connection.identity not in self.clients:
+
+                try:
+                    client = pymongo.MongoClient(**options)
+                    client.admin.command("ping")
+
+                except pymongo.errors.PyMongoError as e:
+                    raise ServerConnectionError(e)
+
+                self.clients[connection.identity] = client
+
+            return self.clients[connection.identity]
+
+    def close(self):
+        """ closes and forgets all clients
+        """
+
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
+
+
+registry = ClientRegistry()
+atexit.register(registry.close)
@@ -0,0 +1,148 @@
+import os
+import gzip
+import shutil
+import importlib
+
+from mongobar.exceptions import CodecNotAvailableError
+from mongobar.exceptions import CodecNotFoundError
+
+
+def require(codec, module):
+    """ imports optional dependency `module` of `codec`
+    """
+
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise CodecNotAvailableError(codec, module)
+
+
+class GzipCodec(object):
+
+    name = "gzip"
+    extension = ".gz"
+    default_level = 6
+
+    def __init__(self, level=None):
+        self.level = level
+
+    def open(self, path, mode):
+        if "w" in mode:
+            return gzip.open(path, mode, compresslevel=self.level or self.default_level)
+        return gzip.open(path, mode)
+
+
+class ZstdCodec(GzipCodec):
+
+    name = "zstd"
+    extension = ".zst"
+    default_level = 3
+
+    def open(self, path, mode):
+        zstandard = require(self.name, "zstandard")
+
+        if "w" in mode:
+            level = self.level or self.default_level
+            compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+            return zstandard.open(path, mode, cctx=compressor)
+        return zstandard.open(path, mode)
+
+
+class Lz4Codec(GzipCodec):
+
+    name = "lz4"
+    extension = ".lz4"
+    default_level = 0
+
+    def open(self, path, mode):
+        lz4_frame = require(self.name, "lz4.frame")
+
+        if "w" in mode:
+            level = self.level or self.default_level
+            return lz4_frame.open(path, mode, compression_level=level)
+        return lz4_frame.open(path, mode)
+
+
+codecs = {
+    GzipCodec.name: GzipCodec,
+    ZstdCodec.name: ZstdCodec,
+    Lz4Codec.name: Lz4Codec
+}
+
+
+def get_codec(spec=None):
+    """ returns a codec for `spec`, either "name", "name:level" or a dict
+        with "codec" and "level" keys as recorded in backup metadata
+    """
+
+    if spec is None:
+        return GzipCodec()
+
+    if isinstance(spec, dict):
+        name, level = spec.get("codec", "gzip"), spec.get("level")
+    else:
+        name, _, level = str(spec).partition(":")
+        level = int(level) if level else None
+
+    if name not in codecs:
+        raise CodecNotFoundError(name)
+
+    return codecs[name](level)
+
+
+def get_path_codec(path):
+    """ returns the codec for the extension of `path`, None if uncompressed
+    """
+
+    for codec in codecs.values():
+        if path.endswith(codec.extension):
+            return codec()
+
+    return None
+
+
+def open_path(path, mode="rb"):
+    """ opens `path` with the codec matching its extension
+    """
+
+    codec = get_path_codec(path)
+    if codec is None:
+        return open(path, mode)
+
+    return codec.open(path, mode)
+
+
+def strip_extension(path):
+    """ returns `path` without a codec extension
+    """
+
+    codec = get_path_codec(path)
+    if codec is None:
+        return path
+
+    return path[:-len(codec.extension)]
+
+
+def compress_file(codec, path, buffer_size=1024 * 1024):
+    """ streams the file at `path` into a compressed copy, removes the
+        original and returns the new path
+    """
+
+    compressed_path = path + codec.extension
+
+    with open(path, "rb") as source, codec.open(compressed_path, "wb") as destination:
+        shutil.copyfileobj(source, destination, buffer_size)
+
+    os.remove(path)
+
+    return compressed_path
+
+
+def decompress_file(path, destination_path, buffer_size=1024 * 1024):
+    """ streams the compressed file at `path` into `destination_path`
+    """
+
+    with open_path(path, "rb") as source, open(destination_path, "wb") as destination:
+        shutil.copyfileobj(source, destination, buffer_size)
+
+    return destination_path
@@ -6,6 +6,7 @@ import copy
 from mongobar.connection import Connection
 from mongobar.connection import Connections
 from mongobar.exceptions import ConnectionNotSetError
+from mongobar.exceptions import ConnectionGroupNotSetError
 from mongobar.utils import merge
 
 
@@ -15,6 +16,26 @@ class Config(object):
     default_config = {
         "root": "~/.mongobar_backups",
         "log_level": "INFO",
+        "concurrency": 1,
+        "engine": "tools",
+        "batch_size": 1000,
+        "insert_workers": 2,
+        "fast_metadata": False,
+        "metadata_concurrency": 8,
+        "storage": "directory",
+        "compression": "gzip",
+        "indexes": True,
+        "index_concurrency": 2,
+        "skip_unchanged": False,
+        "fingerprint": "stats",
+        "fanout_concurrency": 4,
+        "host_concurrency": 1,
+        "groups": {},
+        "gc_background": True,
+        "gc_workers": 4,
+        "gc_rate": 0,
+        "retention": {},
+        "prune_batch_size": 10,
         "connections": {
             "default": {
                 "host": "localhost",
@@ -43,6 +64,14 @@ class Config(object):
     def connection_dir(self):
         return os.path.join(self.root, self.connection.socket)
 
+    @property
+    def chunks_dir(self):
+        return os.path.join(self.connection_dir, ".chunks")
+
+    @property
+    def trash_dir(self):
+        return os.path.join(self.root, ".trash")
+
     @property
     def root(self):
         return os.path.expanduser(self.config.get("root"))
@@ -55,6 +84,119 @@ class Config(object):
     def log_file(self):
         return self.config.get("log_file", None)
 
+    @property
+    def concurrency(self):
+        return max(int(self.config.get("concurrency", 1)), 1)
+
+    @property
+    def engine(self):
+        return self.config.get("engine", "tools")
+
+    @property
+    def batch_size(self):
+        return int(self.config.get("batch_size", 1000))
+
+    @property
+    def insert_workers(self):
+        return max(int(self.config.get("insert_workers", 2)), 1)
+
+    @property
+    def write_concern(self):
+        return self.config.get("write_concern", None)
+
+    @property
+    def fast_metadata(self):
+        return bool(self.config.get("fast_metadata", False))
+
+    @property
+    def metadata_concurrency(self):
+        return max(int(self.config.get("metadata_concurrency", 8)), 1)
+
+    @property
+    def storage(self):
+        return self.config.get("storage", "directory")
+
+    @property
+    def indexes(self):
+        return bool(self.config.get("indexes", True))
+
+    @property
+    def index_concurrency(self):
+        return max(int(self.config.get("index_concurrency", 2)), 1)
+
+    @property
+    def skip_unchanged(self):
+        return bool(self.config.get("skip_unchanged", False))
+
+    @property
+    def fingerprint(self):
+        return self.config.get("fingerprint", "stats")
+
+    @property
+    def fanout_concurrency(self):
+        return max(int(self.config.get("fanout_concurrency", 4)), 1)
+
+    @property
+    def host_concurrency(self):
+        return max(int(self.config.get("host_concurrency", 1)), 1)
+
+    @property
+    def gc_background(self):
+        return bool(self.config.get("gc_background", True))
+
+    @property
+    def gc_workers(self):
+        return max(int(self.config.get("gc_workers", 4)), 1)
+
+    @property
+    def gc_rate(self):
+        return float(self.config.get("gc_rate", 0)) or None
+
+    def connection_names(self, group=None):
+        """ returns the connections of `group`, or every connection set in a
+            config file when `group` is None
+        """
+
+        if group is not None:
+            if group not in self.config.get("groups", {}):
+                raise ConnectionGroupNotSetError(group)
+
+            names = self.config["groups"][group]
+            for name in names:
+                self.connections.get(name)
+            return list(names)
+
+        # the built in default connection only counts if a config file sets it
+        names = set()
+        for layer in self.configs:
+            if layer is not self.default_config:
+                names.update(layer.get("connections", {}).keys())
+
+        return sorted(names)
+
+    @property
+    def compression(self):
+        """ codec spec of the current connection, falls back to the global one
+        """
+
+        if self.connection.compression is not None:
+            return self.connection.compression
+        return self.config.get("compression", "gzip")
+
+    @property
+    def retention(self):
+        """ retention policy of the current connection, rules set on the
+            connection override the global ones
+        """
+
+        policy = dict(self.config.get("retention", {}))
+        policy.update(self.connection.retention or {})
+        return policy
+
+    @property
+    def prune_batch_size(self):
+        return max(int(self.config.get("prune_batch_size", 10)), 1)
+
     def add(self, data):
         self.configs.append(data)
         self.merge()
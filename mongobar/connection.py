@@ -2,18 +2,33 @@ import os
 
 from mongobar.exceptions import ConnectionNotSetError
 from mongobar.exceptions import ConnectionAttributeNotSetError
+from mongobar.exceptions import ConnectionAttributeInvalidError
 
 
 class Connection(object):
 
+    read_preferences = [
+        "primary",
+        "primaryPreferred",
+        "secondary",
+        "secondaryPreferred",
+        "nearest"
+    ]
+
     def __init__(self, name, host=None, port=None, \
-            username=None, password=None, authdb=None):
+            username=None, password=None, authdb=None, compression=None, \
+            replicaset=None, hosts=None, read_preference=None, retention=None):
         self.name = name
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.authdb = authdb
+        self.compression = compression
+        self.replicaset = replicaset
+        self.hosts = hosts
+        self.read_preference = read_preference
+        self.retention = retention
 
     def validate(self):
 
@@ -34,12 +49,33 @@ class Connection(object):
             if self.password is None:
                 raise ConnectionAttributeNotSetError("password")
 
+        # read preference
+        if self.read_preference is not None:
+            if self.read_preference not in self.read_preferences:
+                raise ConnectionAttributeInvalidError("read_preference", self.read_preference)
+
         return True
 
     @property
     def socket(self):
         return "{}:{}".format(self.host, self.port)
 
+    @property
+    def seeds(self):
+        """ returns "host:port" of the connection followed by the `hosts` seed list
+        """
+
+        seeds = [self.socket]
+        for seed in self.hosts or []:
+            if seed not in seeds:
+                seeds.append(seed)
+        return seeds
+
+    @property
+    def identity(self):
+        return (self.host, self.port, self.username, self.authdb, \
+            self.replicaset, tuple(self.hosts or []), self.read_preference)
+
     @property
     def auth(self):
         return bool(self.username and self.password)
@@ -60,6 +96,21 @@ class Connection(object):
         if self.authdb is not None:
             data["authdb"] = self.authdb
 
+        if self.compression is not None:
+            data["compression"] = self.compression
+
+        if self.replicaset is not None:
+            data["replicaset"] = self.replicaset
+
+        if self.hosts is not None:
+            data["hosts"] = self.hosts
+
+        if self.read_preference is not None:
+            data["read_preference"] = self.read_preference
+
+        if self.retention is not None:
+            data["retention"] = self.retention
+
         return data
 
 
@@ -78,7 +129,12 @@ class Connections(object):
             data.get("port"),
             data.get("username", None),
             data.get("password", None),
-            data.get("authdb", None)
+            data.get("authdb", None),
+            data.get("compression", None),
+            data.get("replicaset", None),
+            data.get("hosts", None),
+            data.get("read_preference", None),
+            data.get("retention", None)
         )
 
     def get(self, name=None, socket=None):
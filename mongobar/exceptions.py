@@ -19,6 +19,10 @@ class ConnectionAttributeNotSetError(BaseError):
     msg = "Connection attribute '{}' not set"
 
 
+class ConnectionAttributeInvalidError(BaseError):
+    msg = "Connection attribute '{}' is invalid: '{}'"
+
+
 class BackupNotFoundError(BaseError):
     msg = "Backup '{}' not found"
 
@@ -27,6 +31,50 @@ class CommandError(BaseError):
     msg = "Command failed: {}"
 
 
+class EngineError(BaseError):
+    msg = "Engine failed: {}"
+
+
+class CodecNotFoundError(BaseError):
+    msg = "Codec '{}' not found"
+
+
+class CodecNotAvailableError(BaseError):
+    msg = "Codec '{}' requires the '{}' package"
+
+
+class IncrementalBackupError(BaseError):
+    msg = "Incremental backup failed: {}"
+
+
+class PartialBackupError(BaseError):
+    msg = "Partial backup failed: {}"
+
+
+class ResumeError(BaseError):
+    msg = "Can not resume backup: {}"
+
+
+class BackupIncompleteError(BaseError):
+    msg = "Backup '{}' is incomplete"
+
+
+class SwapRestoreError(BaseError):
+    msg = "Swap restore failed: {}"
+
+
+class RetentionPolicyError(BaseError):
+    msg = "Invalid retention policy: {}"
+
+
+class CloneError(BaseError):
+    msg = "Clone failed: {}"
+
+
+class ConnectionGroupNotSetError(BaseError):
+    msg = "Connection group not set in config: '{}'"
+
+
 class DatabaseNotFoundInBackupError(BaseError):
     msg = "Database '{}' not found in backup '{}'"
 
@@ -0,0 +1,80 @@
+import re
+import time
+import asyncio
+
+
+# "Backup <name> created!" printed by the backup action
+BACKUP_NAME_PATTERN = re.compile(r"Backup (?P<name>\S+) created!")
+
+# terminal color codes wrapped around script output
+ANSI_PATTERN = re.compile(r"\x1b\[[0-9;]*m")
+
+
+class FanoutScheduler(object):
+
+    def __init__(self, concurrency=4, host_concurrency=1):
+        self.concurrency = max(int(concurrency), 1)
+        self.host_concurrency = max(int(host_concurrency), 1)
+
+    def run(self, jobs):
+        """ runs the command of each job in `jobs`, a list of dicts with
+            `connection`, `host` and `command` keys, returns one result per job
+            in the same order
+        """
+
+        # the loop is set as current so the child watcher attaches to it
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(self.run_jobs(jobs))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    async def run_jobs(self, jobs):
+        # semaphores are created here so they belong to the running loop
+        limit = asyncio.Semaphore(self.concurrency)
+        hosts = {}
+        for job in jobs:
+            if job["host"] not in hosts:
+                hosts[job["host"]] = asyncio.Semaphore(self.host_concurrency)
+
+        return await asyncio.gather(*[
+            self.run_job(job, limit, hosts[job["host"]]) for job in jobs
+        ])
+
+    async def run_job(self, job, limit, host_limit):
+
+        # the host slot is taken first so a busy host never holds a global slot
+        async with host_limit:
+            async with limit:
+                start = time.time()
+
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        *job["command"],
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.STDOUT
+                    )
+                    output, _ = await process.communicate()
+                    returncode = process.returncode
+                    output = output.decode("utf-8", "replace")
+
+                except OSError as e:
+                    returncode = None
+                    output = str(e)
+
+                duration = time.time() - start
+
+        output = ANSI_PATTERN.sub("", output)
+        match = BACKUP_NAME_PATTERN.search(output)
+
+        return {
+            "connection": job["connection"],
+            "host": job["host"],
+            "returncode": returncode,
+            "success": returncode == 0,
+            "backup": match.group("name") if match else None,
+            "duration": duration,
+            "output": output
+        }
@@ -0,0 +1,41 @@
+import os
+import threading
+
+
+class Journal(object):
+
+    filename = "journal.log"
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, self.filename)
+        self.lock = threading.Lock()
+
+    def completed(self):
+        """ returns the set of namespaces recorded as complete
+        """
+
+        try:
+            with open(self.path, "r") as file_handle:
+                return set([line.rstrip("\n") for line in file_handle if line.endswith("\n")])
+
+        except FileNotFoundError:
+            return set()
+
+    def add(self, namespace):
+        """ records `namespace` as complete, the line is flushed to disk
+            before returning so a crash never loses a finished namespace
+        """
+
+        with self.lock:
+            with open(self.path, "a") as file_handle:
+                file_handle.write(namespace + "\n")
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+
+    def run(self, namespace, job):
+        """ calls `job` and records `namespace` once it succeeds
+        """
+
+        result = job()
+        self.add(namespace)
+        return result
@@ -1,34 +1,72 @@
 import os
+import re
 import sys
 import logging
 import pkgutil
 import random
-import pymongo
 import datetime
 import copy
 import json
 import subprocess
 import shutil
+import time
+import tempfile
+import functools
+import contextlib
+import concurrent.futures
 
 from mongobar.utils import create_directory
 from mongobar.utils import get_directories
-
+from mongobar.utils import lazy_import
+
+from mongobar import chunks
+from mongobar import compression
+from mongobar.chunks import ChunkStore
+from mongobar.catalog import Catalog
+from mongobar.progress import ProgressTracker
+from mongobar.journal import Journal
+from mongobar.trash import Trash
+from mongobar import retention
+from mongobar.clients import registry
 from mongobar.config import Config
+from mongobar.connection import Connection
 
-from mongobar.exceptions import ServerConnectionError
 from mongobar.exceptions import CommandError
 from mongobar.exceptions import BackupNotFoundError
 from mongobar.exceptions import DatabaseNotFoundInBackupError
 from mongobar.exceptions import CollectionNotFoundInBackupError
 from mongobar.exceptions import DestinationDatabasesLengthError
+from mongobar.exceptions import EngineError
+from mongobar.exceptions import IncrementalBackupError
+from mongobar.exceptions import CloneError
+from mongobar.exceptions import SwapRestoreError
+from mongobar.exceptions import ResumeError
+from mongobar.exceptions import PartialBackupError
+from mongobar.exceptions import BackupIncompleteError
+
+# imported when a server is first contacted, offline actions never load them
+pymongo = lazy_import("pymongo")
+native = lazy_import("mongobar.native")
 
 
 class Mongobar(object):
 
+    # swap restores load collections under this prefix before renaming them
+    staging_prefix = "mongobar_staging."
+
     def __init__(self):
         self.logger = logging.getLogger("mongobar")
         self.config = Config()
 
+        # called with the progress of each namespace, tool output is
+        # streamed and parsed only when it is set
+        self.progress_callback = None
+        self.progress = ProgressTracker()
+
+    @property
+    def catalog(self):
+        return Catalog(self.config.root)
+
     def generate_backup_name(self):
 
         # TODO: try, catch for potential get_data errors like returning None
@@ -45,31 +83,58 @@ class Mongobar(object):
 
         return "{}-{}".format(verb, noun)
 
-    def create_pymongo_client(self):
+    def create_pymongo_client(self, connection=None):
 
-        connection = self.config.connection
+        connection = connection or self.config.connection
 
         options = {
             "host": connection.host,
             "port": connection.port
         }
 
+        # replica sets are reached through their seed list
+        if connection.replicaset is not None or connection.hosts:
+            options["host"] = connection.seeds
+        if connection.replicaset is not None:
+            options["replicaset"] = connection.replicaset
+        if connection.read_preference is not None:
+            options["readPreference"] = connection.read_preference
+
         if connection.auth:
             options["username"] = connection.username
             options["password"] = connection.password
             if connection.authdb is not None:
                 options["authSource"] = connection.authdb
 
-        try:
-            client = pymongo.MongoClient(**options)
+        return registry.get(connection, options)
 
-            # test connection
-            client.database_names()
+    def tool_command(self, tool, connection=None):
 
-            return client
+        connection = connection or self.config.connection
 
-        except pymongo.errors.PyMongoError as e:
-            raise ServerConnectionError(e)
+        command = [tool]
+
+        # "rs/host1:port1,host2:port2" lets the tools find the members
+        if connection.replicaset is not None:
+            seeds = "{}/{}".format(connection.replicaset, ",".join(connection.seeds))
+            command += ["--host", seeds]
+        elif connection.hosts:
+            command += ["--host", ",".join(connection.seeds)]
+        else:
+            command += ["--host", connection.host]
+            command += ["--port", str(connection.port)]
+
+        # only mongodump reads, mongorestore always writes to the primary
+        if tool == "mongodump" and connection.read_preference is not None:
+            command += ["--readPreference", connection.read_preference]
+
+        if connection.auth:
+            command += ["-u", connection.username]
+            command += ["-p", connection.password]
+            if connection.authdb is not None:
+                command += ["--authenticationDatabase", connection.authdb]
+
+        return command
 
     def generate_metadata(self, databases=None, collections=None):
 
@@ -87,24 +152,66 @@ class Mongobar(object):
         if "local" in dbs:
             dbs.remove("local")
 
-        for db in dbs:
-            db_metadata = {
-                "name": db,
-                "collections": []
-            }
-
-            for collection in collections or client[db].collection_names():
-                db_metadata["collections"].append({
-                    "name": collection,
-                    "document_count": client[db][collection].count()
+        if not self.config.fast_metadata:
+            for db in dbs:
+                db_metadata = self.generate_database_metadata(client, db, collections)
+                if db_metadata["collections"]:
+                    metadata["databases"].append(db_metadata)
+
+            return metadata
+
+        # fast metadata lists the collections of each database, then runs one
+        # collStats per collection, both `metadata_concurrency` at a time
+        concurrency = self.config.metadata_concurrency
+
+        names = [collections for db in dbs]
+        if not collections:
+            names = self.run_jobs([client[db].collection_names for db in dbs], concurrency)
+
+        results = iter(self.run_jobs([
+            functools.partial(self.generate_collection_metadata, client, db, collection)
+            for db, db_collections in zip(dbs, names)
+            for collection in db_collections
+        ], concurrency))
+
+        for db, db_collections in zip(dbs, names):
+            if db_collections:
+                metadata["databases"].append({
+                    "name": db,
+                    "collections": [next(results) for _ in db_collections]
                 })
 
-            if db_metadata["collections"]:
-                metadata["databases"].append(db_metadata)
+        return metadata
 
-        client.close()
+    def generate_database_metadata(self, client, database, collections=None):
 
-        return metadata
+        db_metadata = {
+            "name": database,
+            "collections": []
+        }
+
+        for collection in collections or client[database].collection_names():
+            db_metadata["collections"].append({
+                "name": collection,
+                "document_count": client[database][collection].count()
+            })
+
+        return db_metadata
+
+    def generate_collection_metadata(self, client, database, collection):
+
+        # collStats also returns the data and storage sizes
+        try:
+            stats = client[database].command("collStats", collection)
+        except pymongo.errors.OperationFailure:
+            stats = {}
+
+        return {
+            "name": collection,
+            "document_count": stats.get("count", 0),
+            "size": stats.get("size", 0),
+            "storage_size": stats.get("storageSize", 0)
+        }
 
     def write_metadata(self, name, data):
 
@@ -144,7 +251,157 @@ class Mongobar(object):
 
         return metadata
 
-    def backup(self, message=None, databases=None, collections=None):
+    def get_oplog_timestamp(self, client, direction=-1):
+
+        try:
+            return native.oplog_timestamp(client, direction)
+
+        except pymongo.errors.PyMongoError as e:
+            self.logger.debug("Oplog not readable: {}".format(e))
+            return None
+
+    def get_incremental_parent(self, parent=None):
+
+        # default to the most recent backup of the connection
+        if parent is None:
+            backups = self.list_backups(limit=1)
+            if not backups:
+                raise IncrementalBackupError("no backup to use as parent")
+            parent = backups[0]["name"]
+
+        if not os.path.exists(os.path.join(self.config.connection_dir, parent)):
+            raise BackupNotFoundError(parent)
+
+        metadata = self.read_metadata(parent)
+        if not metadata.get("complete", True):
+            raise BackupIncompleteError(parent)
+
+        if not (metadata.get("oplog") or {}).get("end"):
+            msg = "backup '{}' has no oplog position".format(parent)
+            raise IncrementalBackupError(msg)
+
+        return parent, metadata
+
+    def get_backup_chain(self, name):
+        """ returns the names of the backups needed to restore `name`, starting
+            with the full backup the incremental backups are based on
+        """
+
+        chain = [name]
+        metadata = self.read_metadata(name)
+
+        while metadata.get("type") == "incremental":
+            name = metadata["parent"]
+            if not os.path.exists(os.path.join(self.config.connection_dir, name)):
+                raise BackupNotFoundError(name)
+
+            chain.insert(0, name)
+            metadata = self.read_metadata(name)
+
+        return chain
+
+    def backup_oplog(self, client, backup_dir, start, end, databases=None, collections=None):
+
+        # the oplog must still contain every entry after the parent backup
+        oldest = self.get_oplog_timestamp(client, 1)
+        if oldest is None or oldest > start:
+            msg = "oplog no longer covers {}".format(native.timestamp_to_json(start))
+            raise IncrementalBackupError(msg)
+
+        namespaces = []
+        for db in databases or []:
+            if not collections:
+                namespaces.append("^{}\\.".format(re.escape(db)))
+            else:
+                namespaces.append("^{}\\.\\$cmd$".format(re.escape(db)))
+                for col in collections:
+                    namespaces.append("^{}$".format(re.escape("{}.{}".format(db, col))))
+
+        start_time = time.time()
+
+        codec = self.get_codec()
+
+        try:
+            entry_count = native.dump_oplog(
+                client,
+                os.path.join(backup_dir, "oplog.bson" + codec.extension),
+                start,
+                end,
+                namespaces,
+                self.config.batch_size,
+                codec
+            )
+        except pymongo.errors.PyMongoError as e:
+            raise EngineError(e)
+
+        msg = "Dumped {} oplog entries in {:.2f}s"
+        self.logger.info(msg.format(entry_count, time.time() - start_time))
+
+        return entry_count
+
+    def get_resume_metadata(self, name):
+        """ returns the metadata of incomplete backup `name` after checking
+            it can be resumed with the current settings
+        """
+
+        if not os.path.exists(os.path.join(self.config.connection_dir, name)):
+            raise BackupNotFoundError(name)
+
+        metadata = self.read_metadata(name)
+
+        if metadata.get("complete", True):
+            raise ResumeError("backup '{}' is complete".format(name))
+
+        if metadata.get("type") == "incremental":
+            raise ResumeError("incremental backups can not be resumed")
+
+        settings = [
+            ("engine", self.config.engine),
+            ("storage", self.config.storage),
+            ("compression", {
+                "codec": self.get_codec().name,
+                "level": self.get_codec().level
+            })
+        ]
+        for key, value in settings:
+            if metadata.get(key) != value:
+                msg = "backup '{}' was started with {} {}, not {}"
+                raise ResumeError(msg.format(name, key, metadata.get(key), value))
+
+        return metadata
+
+    def backup(self, message=None, databases=None, collections=None, \
+            incremental=False, parent=None, resume=None, filters=None, sample=None):
+
+        if resume is not None and incremental:
+            raise ResumeError("incremental backups can not be resumed")
+
+        if filters or sample is not None:
+            self.check_partial(incremental, sample)
+
+        # resolve the parent before the new backup directory exists
+        if incremental:
+            parent, parent_metadata = self.get_incremental_parent(parent)
+
+        # continue an incomplete backup with its original targets
+        if resume is not None:
+            metadata = self.get_resume_metadata(resume)
+            databases = metadata["targets"]["databases"]
+            collections = metadata["targets"]["collections"]
+
+            if metadata.get("partial"):
+                filters = native.filters_from_json(metadata["partial"]["filters"])
+                sample = metadata["partial"]["sample"]
+
+        if self.config.storage == "archive" and self.config.engine == "native":
+            raise EngineError("archive storage requires the tools engine")
+
+        # the backup unchanged collections are linked from, found before the
+        # new backup directory exists
+        reuse_source = None
+        if resume is None and self.config.skip_unchanged and not incremental \
+                and not filters and sample is None:
+            reuse_source = self.get_reuse_source()
 
         # create root directory if necessary
         root_dir = self.config.root
@@ -158,101 +415,1058 @@ class Mongobar(object):
             self.logger.debug("Backup directory '{}' created".format(conn_dir))
             create_directory(conn_dir)
 
-        # generate unique backup name
-        while 1:
-            backup_name = self.generate_backup_name()
-            if backup_name not in get_directories(conn_dir):
-                break
+        if resume is not None:
+            backup_name = resume
+            backup_dir = os.path.join(conn_dir, backup_name)
+
+        else:
+            # generate unique backup name
+            while 1:
+                backup_name = self.generate_backup_name()
+                if backup_name not in get_directories(conn_dir):
+                    break
 
-        # create backup directory
-        backup_dir = os.path.join(conn_dir, backup_name)
-        create_directory(backup_dir)
+            # create backup directory
+            backup_dir = os.path.join(conn_dir, backup_name)
+            create_directory(backup_dir)
 
         # pymongo client
         client = self.create_pymongo_client()
 
+        # shards of a cluster are dumped one directory each
+        shards = self.get_shards(client)
+        if shards:
+            if filters or sample is not None:
+                raise PartialBackupError("sharded clusters can not be filtered or sampled")
+            if incremental:
+                raise IncrementalBackupError("sharded clusters have no single oplog")
+            if self.config.engine == "native" or self.config.storage == "archive":
+                raise EngineError("sharded clusters require the tools engine and file storage")
+
         # determine dbs
         all_databases = client.database_names()
         dbs = databases or all_databases
         if "local" in dbs:
             dbs.remove("local")
 
-        # generate metadata
-        metadata = self.generate_metadata(dbs, collections)
-        metadata["name"] = backup_name
-        metadata["message"] = message
+        # a resumed backup keeps the databases and oplog position it started with
+        if resume is not None:
+            dbs = [d["name"] for d in metadata["databases"]]
+            oplog_end = native.timestamp_from_json(metadata["oplog"]["end"])
+
+        else:
+            # the oplog position the next incremental backup starts from
+            oplog_end = self.get_oplog_timestamp(client)
+
+            # generate metadata, the backup is incomplete until all data is dumped
+            metadata = self.generate_metadata(dbs, collections)
+            metadata["name"] = backup_name
+            metadata["message"] = message
+            metadata["type"] = "full"
+            metadata["complete"] = False
+            metadata["targets"] = {
+                "databases": databases,
+                "collections": collections
+            }
+            metadata["oplog"] = {
+                "start": None,
+                "end": native.timestamp_to_json(oplog_end)
+            }
+            metadata["engine"] = self.config.engine
+            metadata["storage"] = self.config.storage
+            metadata["compression"] = {
+                "codec": self.get_codec().name,
+                "level": self.get_codec().level
+            }
+
+            if incremental:
+                metadata["type"] = "incremental"
+                metadata["parent"] = parent
+                metadata["oplog"]["start"] = parent_metadata["oplog"]["end"]
+
+            # dev snapshots keep a filtered or sampled part of each collection
+            if filters or sample is not None:
+                metadata["partial"] = {
+                    "filters": native.filters_to_json(filters),
+                    "sample": sample
+                }
+
+            # fingerprints let the next backup find unchanged collections
+            if self.config.skip_unchanged and self.config.storage == "directory" \
+                    and not incremental and not shards and not metadata.get("partial"):
+                self.fingerprint_metadata(client, metadata)
+
+                if reuse_source is not None:
+                    metadata["reused"] = self.link_unchanged(backup_dir, metadata, *reuse_source)
+
+            self.write_metadata(backup_dir, metadata)
+
+            # replaces any row a sync stored before the metadata existed
+            self.catalog.add(self.config.connection.socket, backup_name, metadata)
+
+        # collections linked from the previous backup are not dumped again
+        exclude = {}
+        for namespace in (metadata.get("reused") or {}).get("collections", []):
+            database, _, collection = namespace.partition(".")
+            exclude.setdefault(database, set()).add(collection)
+
+        self.progress = ProgressTracker(self.progress_callback)
+
+        # completed namespaces are recorded so a failed backup can be resumed
+        journal = Journal(backup_dir)
+
+        try:
+
+            # capture only the oplog slice since the parent backup
+            if incremental:
+                if oplog_end is None:
+                    raise IncrementalBackupError("server has no oplog")
+
+                self.backup_oplog(
+                    client,
+                    backup_dir,
+                    native.timestamp_from_json(metadata["oplog"]["start"]),
+                    oplog_end,
+                    databases and dbs,
+                    collections
+                )
+
+            # dump every shard at the same time with the balancer paused
+            elif shards:
+                metadata["shards"] = self.shard_backup(client, shards, dbs, collections, \
+                    backup_dir, journal)
+
+            # filtered and sampled collections are read with pymongo cursors
+            elif metadata.get("partial"):
+                self.native_backup(client, dbs, collections, backup_dir, journal, \
+                    filters, sample)
+
+            # stream mongodump archives into single files
+            elif self.config.storage == "archive":
+                self.archive_backup(dbs, collections, backup_dir, not databases, journal)
+
+            # dump with pymongo cursors instead of mongodump
+            elif self.config.engine == "native":
+                self.native_backup(client, dbs, collections, backup_dir, journal, \
+                    exclude=exclude)
+
+            else:
+                self.tools_backup(client, dbs, collections, backup_dir, all_databases, \
+                    journal, exclude)
+
+        except Exception:
+            if not incremental:
+                msg = "Backup '{}' is incomplete, resume it with --resume {}"
+                self.logger.error(msg.format(backup_name, backup_name))
+            raise
+
+        # record the final throughput of each namespace
+        throughput = self.progress.summary()
+        if throughput:
+            metadata["throughput"] = throughput
+            self.write_metadata(backup_dir, metadata)
+
+        # partial backups hold fewer documents than the server counts
+        if metadata.get("partial"):
+            for database in metadata["databases"]:
+                for collection in database["collections"]:
+                    namespace = "{}.{}".format(database["name"], collection["name"])
+                    if namespace in throughput:
+                        collection["document_count"] = throughput[namespace]["documents"]
+
+        # move the dump files into the shared chunk store
+        if self.config.storage == "dedup":
+            self.store_backup(backup_dir)
+
+        metadata["complete"] = True
         self.write_metadata(backup_dir, metadata)
 
+        self.catalog.add(self.config.connection.socket, backup_name, metadata)
+
+        return backup_name
+
+    def tools_backup(self, client, databases, collections, backup_dir, all_databases, \
+            journal=None, exclude=None):
+
+        # mongodump compresses with gzip at its default level by itself
+        codec = self.get_codec()
+        tool_gzip = codec.name == "gzip" and codec.level is None
+
         # get connection
         conn = self.config.connection
 
-        for db in dbs:
+        commands = []
+        for db in databases:
 
             if db not in all_databases:
                 msg = "Database '{}' does not exist"
                 msg = msg.format(db)
                 self.logger.warning(msg)
 
-            command = ["mongodump"]
-            command += ["--host", conn.host]
-            command += ["--port", str(conn.port)]
-
-            if conn.auth:
-                command += ["-u", conn.username]
-                command += ["-p", conn.password]
-                if conn.authdb is not None:
-                    command += ["--authenticationDatabase", conn.authdb]
-
+            command = self.tool_command("mongodump", conn)
             command += ["--db", db]
 
+            excluded = sorted((exclude or {}).get(db, []))
+
             command_end = ["--out", backup_dir]
-            command_end += ["--quiet"]
-            command_end += ["--gzip"]
+            if tool_gzip:
+                command_end += ["--gzip"]
 
             # call command once per datbase
             if not collections:
-                command += command_end
-
-                try:
-                    subprocess.check_output(command)
-                    self.logger.debug("Command called: {}".format(" ".join(command)))
-                except subprocess.CalledProcessError as e:
-                    raise CommandError(e)
+                for col in excluded:
+                    command += ["--excludeCollection", col]
+                commands.append((db, command + command_end))
 
-            # call command once per collection
             else:
                 all_collections = client[db].collection_names()
 
+                selected = []
                 for col in collections:
 
+                    if col in excluded:
+                        continue
+
                     if col not in all_collections:
                         msg = "Collection '{}' does not exist in database '{}'"
                         msg = msg.format(col, db)
                         self.logger.warning(msg)
 
+                    selected.append(col)
+
+                # call command once for a single collection
+                if len(selected) == 1:
                     col_command = copy.copy(command)
-                    col_command += ["--collection", col]
+                    col_command += ["--collection", selected[0]]
                     col_command += command_end
+                    commands.append(("{}.{}".format(db, selected[0]), col_command))
 
-                    try:
-                        subprocess.check_output(col_command)
-                        self.logger.debug("Command called: {}".format(" ".join(col_command)))
-                    except subprocess.CalledProcessError as e:
-                        raise CommandError(e)
+                # call command once per database, excluding the other collections
+                elif selected:
+                    db_command = copy.copy(command)
+                    for col in sorted(set(all_collections) - set(selected)):
+                        db_command += ["--excludeCollection", col]
+                    db_command += command_end
+                    commands.append((db, db_command))
 
-        return backup_name
+        durations = self.run_jobs(self.journal_jobs(journal, [
+            (namespace, functools.partial(self.run_command, command))
+            for namespace, command in commands
+        ]))
+
+        if not tool_gzip:
+            self.compress_backup(backup_dir, codec)
+
+        return durations
+
+    def check_partial(self, incremental=False, sample=None):
+        """ raises PartialBackupError when a filtered or sampled backup can
+            not be created with the current settings
+        """
+
+        if incremental:
+            raise PartialBackupError("incremental backups can not be filtered or sampled")
+
+        if self.config.storage == "archive":
+            raise PartialBackupError("archive storage can not be filtered or sampled")
+
+        if sample is not None and not sample > 0:
+            msg = "sample must be a ratio below 1 or a number of documents, not {}"
+            raise PartialBackupError(msg.format(sample))
+
+    def get_partial_filter(self, filters, database, collection):
+        """ returns the filter of `database`.`collection` in `filters`, the
+            "*" filter applies to collections without their own
+        """
+
+        if not filters:
+            return None
+
+        namespace = "{}.{}".format(database, collection)
+        return filters.get(namespace, filters.get("*"))
+
+    def get_reuse_source(self):
+        """ returns the name and metadata of the latest backup whose dump files
+            can be linked into a new backup, None if there is none
+        """
+
+        backups = self.list_backups(limit=1)
+        if not backups:
+            return None
+
+        name = backups[0]["name"]
+        metadata = self.read_metadata(name)
+
+        codec_spec = {"codec": self.get_codec().name, "level": self.get_codec().level}
+
+        if metadata.get("type", "full") != "full" or metadata.get("partial") \
+                or metadata.get("shards") \
+                or metadata.get("storage", "directory") != "directory" \
+                or metadata.get("compression") != codec_spec:
+            self.logger.debug("Backup '{}' can not be reused".format(name))
+            return None
+
+        return name, metadata
+
+    def fingerprint_metadata(self, client, metadata):
+        """ adds the fingerprint of each collection in `metadata`
+        """
+
+        def fingerprint_database(database):
+            names = [c["name"] for c in database["collections"]]
+            try:
+                fingerprints = native.collection_fingerprints(
+                    client[database["name"]],
+                    names,
+                    self.config.fingerprint
+                )
+            except pymongo.errors.PyMongoError as e:
+                raise EngineError(e)
+
+            for collection in database["collections"]:
+                collection["fingerprint"] = fingerprints.get(collection["name"])
+
+        self.run_jobs([
+            functools.partial(fingerprint_database, database)
+            for database in metadata["databases"]
+        ])
+
+    def link_unchanged(self, backup_dir, metadata, source_name, source_metadata):
+        """ links the dump files of collections whose fingerprint matches the
+            one in `source_metadata` into `backup_dir`, returns the reused
+            backup and collections
+        """
+
+        fingerprints = {}
+        for database in source_metadata["databases"]:
+            for collection in database["collections"]:
+                namespace = "{}.{}".format(database["name"], collection["name"])
+                fingerprints[namespace] = collection.get("fingerprint")
+
+        source_dir = os.path.join(self.config.connection_dir, source_name)
+
+        reused = []
+        for database in metadata["databases"]:
+            for collection in database["collections"]:
+                namespace = "{}.{}".format(database["name"], collection["name"])
+
+                fingerprint = collection.get("fingerprint")
+                if fingerprint is None or fingerprints.get(namespace) != fingerprint:
+                    continue
+
+                if self.link_collection(source_dir, backup_dir, database["name"], collection["name"]):
+                    reused.append(namespace)
+
+        msg = "Reusing {} unchanged collections from backup '{}'"
+        self.logger.info(msg.format(len(reused), source_name))
+
+        return {"backup": source_name, "collections": reused}
+
+    def link_collection(self, source_dir, backup_dir, database, collection):
+        """ hard links the dump files of `collection` in `source_dir` into
+            `backup_dir`, copying them where links are not supported, returns
+            False when the source has no documents file
+        """
+
+        source = os.path.join(source_dir, database)
+        destination = os.path.join(backup_dir, database)
+
+        try:
+            filenames = [
+                f for f in os.listdir(source)
+                if compression.strip_extension(f) in [
+                    collection + ".bson",
+                    collection + ".metadata.json"
+                ]
+            ]
+        except FileNotFoundError:
+            return False
+
+        if collection + ".bson" not in [compression.strip_extension(f) for f in filenames]:
+            return False
+
+        os.makedirs(destination, exist_ok=True)
+
+        for filename in filenames:
+            try:
+                os.link(os.path.join(source, filename), os.path.join(destination, filename))
+            except OSError:
+                shutil.copy2(os.path.join(source, filename), os.path.join(destination, filename))
+
+        return True
+
+    def get_shards(self, client):
+        """ returns the name and host of each shard when `client` is connected
+            to a mongos, an empty list otherwise
+        """
+
+        if client.admin.command("isMaster").get("msg") != "isdbgrid":
+            return []
+
+        return [
+            {"name": shard["_id"], "host": shard["host"]}
+            for shard in client.admin.command("listShards")["shards"]
+        ]
+
+    def shard_connection(self, shard, connection=None):
+        """ returns a connection to the replica set of `shard` using the
+            credentials and read preference of `connection`
+        """
+
+        connection = connection or self.config.connection
+
+        # shard hosts look like "rs/host1:port1,host2:port2"
+        replicaset, _, seeds = shard["host"].rpartition("/")
+        seeds = seeds.split(",")
+
+        host, _, port = seeds[0].partition(":")
+
+        return Connection(
+            "{}/{}".format(connection.name, shard["name"]),
+            host,
+            int(port or 27017),
+            connection.username,
+            connection.password,
+            connection.authdb,
+            connection.compression,
+            replicaset or None,
+            seeds,
+            connection.read_preference
+        )
+
+    @contextlib.contextmanager
+    def paused_balancer(self, client):
+        """ stops the balancer so no chunk migrates while the shards are
+            dumped, and starts it again if it was running
+        """
+
+        if client.admin.command("balancerStatus").get("mode") == "off":
+            yield
+            return
+
+        # waits for a migration in progress to finish
+        client.admin.command("balancerStop")
+        self.logger.info("Balancer stopped")
+
+        try:
+            yield
+        finally:
+            client.admin.command("balancerStart")
+            self.logger.info("Balancer started")
+
+    def shard_backup(self, client, shards, databases, collections, backup_dir, journal=None):
+        """ dumps each shard into its own directory of `backup_dir`, all shards
+            at the same time, returns the result of each shard
+        """
+
+        codec = self.get_codec()
+        tool_gzip = codec.name == "gzip" and codec.level is None
+
+        jobs = [
+            functools.partial(self.dump_shard, shard, databases, collections, \
+                backup_dir, tool_gzip, journal)
+            for shard in shards
+        ]
+
+        with self.paused_balancer(client):
+            results = self.run_jobs(jobs, len(jobs))
+
+        if not tool_gzip:
+            self.compress_backup(backup_dir, codec)
+
+        return results
+
+    def dump_shard(self, shard, databases, collections, backup_dir, tool_gzip=True, \
+            journal=None):
+
+        connection = self.shard_connection(shard)
+        shard_dir = os.path.join(backup_dir, shard["name"])
+
+        command_end = ["--out", shard_dir]
+        if tool_gzip:
+            command_end += ["--gzip"]
+
+        commands = []
+        for db in databases:
+            command = self.tool_command("mongodump", connection)
+            command += ["--db", db]
+
+            if not collections:
+                commands.append(("{}/{}".format(shard["name"], db), command + command_end))
+
+            else:
+                for col in collections:
+                    col_command = command + ["--collection", col] + command_end
+                    namespace = "{}/{}.{}".format(shard["name"], db, col)
+                    commands.append((namespace, col_command))
+
+        # the namespaces of a shard are dumped in turn, shards side by side
+        start = time.time()
+        for job in self.journal_jobs(journal, [
+            (namespace, functools.partial(self.run_command, command))
+            for namespace, command in commands
+        ]):
+            job()
+
+        duration = time.time() - start
+
+        msg = "Shard '{}' dumped in {:.2f}s"
+        self.logger.info(msg.format(shard["name"], duration))
+
+        return {
+            "name": shard["name"],
+            "host": shard["host"],
+            "namespaces": len(commands),
+            "duration": round(duration, 3)
+        }
+
+    def archive_backup(self, databases, collections, backup_dir, whole_server=False, \
+            journal=None):
+        """ streams `mongodump --archive` output through the codec into one
+            file per dump command, a single file when `whole_server` is set
+        """
+
+        codec = self.get_codec()
+        command = self.tool_command("mongodump", self.config.connection)
+        command += ["--archive", "--quiet"]
+
+        jobs = []
+        for name, arguments in self.archive_targets(databases, collections, whole_server):
+            path = os.path.join(backup_dir, "{}.archive{}".format(name, codec.extension))
+            jobs.append((name, functools.partial(self.dump_archive, command + arguments, path, codec)))
+
+        return self.run_jobs(self.journal_jobs(journal, jobs))
+
+    def archive_targets(self, databases, collections, whole_server=False):
+        """ returns the name and target arguments of each `mongodump --archive`
+            command, mongodump takes one database and collection at most
+        """
+
+        if whole_server and not collections:
+            return [("dump", [])]
+
+        targets = []
+        for db in databases:
+            if not collections:
+                targets.append((db, ["--db", db]))
+                continue
+
+            for col in collections:
+                targets.append(("{}.{}".format(db, col), ["--db", db, "--collection", col]))
+
+        return targets
+
+    def dump_archive(self, command, path, codec, buffer_size=1024 * 1024):
+        """ runs `command` and streams its stdout into `path` with `codec`
+        """
+
+        start = time.time()
+
+        process = subprocess.Popen(command, stdout=subprocess.PIPE)
+        try:
+            with codec.open(path, "wb") as file_handle:
+                shutil.copyfileobj(process.stdout, file_handle, buffer_size)
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+
+        if returncode:
+            raise CommandError(subprocess.CalledProcessError(returncode, command))
+
+        duration = time.time() - start
+        self.logger.debug("Command called ({:.2f}s): {}".format(duration, " ".join(command)))
+
+        return duration
+
+    def restore_archive(self, command, path, buffer_size=1024 * 1024):
+        """ runs `command` and streams the archive at `path` into its stdin
+        """
+
+        start = time.time()
+
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            with compression.open_path(path, "rb") as file_handle:
+                shutil.copyfileobj(file_handle, process.stdin, buffer_size)
+
+        # the command exited early, its return code tells why
+        except BrokenPipeError:
+            pass
+
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            returncode = process.wait()
+
+        if returncode:
+            raise CommandError(subprocess.CalledProcessError(returncode, command))
+
+        duration = time.time() - start
+        self.logger.debug("Command called ({:.2f}s): {}".format(duration, " ".join(command)))
+
+        return duration
+
+    def pipe_commands(self, source_command, destination_command):
+        """ pipes the stdout of `source_command` into the stdin of
+            `destination_command`, the os pipe bounds the data in flight
+        """
+
+        start = time.time()
+
+        source = subprocess.Popen(source_command, stdout=subprocess.PIPE)
+        try:
+            destination = subprocess.Popen(destination_command, stdin=source.stdout)
+        except Exception:
+            source.kill()
+            source.wait()
+            raise
+
+        # only the destination reads the pipe, so the source stops if it exits
+        finally:
+            source.stdout.close()
+
+        destination_returncode = destination.wait()
+        source_returncode = source.wait()
+
+        for returncode, command in [(source_returncode, source_command), \
+                (destination_returncode, destination_command)]:
+            if returncode:
+                raise CommandError(subprocess.CalledProcessError(returncode, command))
+
+        duration = time.time() - start
+        msg = "Command called ({:.2f}s): {} | {}"
+        self.logger.debug(msg.format(duration, " ".join(source_command), \
+            " ".join(destination_command)))
+
+        return duration
+
+    def journal_jobs(self, journal, jobs):
+        """ returns the jobs of (namespace, job) pairs `jobs` that `journal`
+            has not recorded as complete, wrapped to record them when done
+        """
+
+        if journal is None:
+            return [job for _, job in jobs]
+
+        completed = journal.completed()
+
+        skipped = len([n for n, _ in jobs if n in completed])
+        if skipped:
+            self.logger.info("Skipping {} completed namespaces".format(skipped))
+
+        return [
+            functools.partial(journal.run, namespace, job)
+            for namespace, job in jobs if namespace not in completed
+        ]
+
+    def get_codec(self):
+        return compression.get_codec(self.config.compression)
+
+    def get_backup_files(self, backup_dir):
+        """ returns the paths of the dump files in `backup_dir`, relative to it
+        """
+
+        paths = []
+        for directory, _, filenames in os.walk(backup_dir):
+            for filename in filenames:
+                path = os.path.relpath(os.path.join(directory, filename), backup_dir)
+                if path not in ["metadata.json", "manifest.json", Journal.filename]:
+                    paths.append(path)
+
+        return paths
+
+    def compress_backup(self, backup_dir, codec):
+        """ compresses the uncompressed dump files in `backup_dir` with `codec`,
+            one file per worker
+        """
+
+        start = time.time()
+
+        paths = [
+            os.path.join(backup_dir, p) for p in self.get_backup_files(backup_dir)
+            if compression.get_path_codec(p) is None
+        ]
+        self.run_jobs([functools.partial(compression.compress_file, codec, p) for p in paths])
+
+        msg = "Compressed {} files with {} in {:.2f}s"
+        self.logger.debug(msg.format(len(paths), codec.name, time.time() - start))
+
+    def run_command(self, command):
+
+        start = time.time()
+
+        try:
+            self.stream_command(command)
+        except subprocess.CalledProcessError as e:
+            raise CommandError("{}\n{}".format(e, e.output.strip()) if e.output else e)
+
+        duration = time.time() - start
+        self.logger.debug("Command called ({:.2f}s): {}".format(duration, " ".join(command)))
+
+        return duration
+
+    def stream_command(self, command):
+        """ runs `command` and feeds its output to the progress tracker line by
+            line as it is written, raises CalledProcessError when it fails
+        """
+
+        start = time.time()
+
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+
+        # the last lines are kept to report failures
+        output = []
+        with process.stderr:
+            for line in process.stderr:
+                output = output[-19:] + [line]
+                self.progress.feed(line, start)
+
+        returncode = process.wait()
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, command, "".join(output))
+
+    def run_commands(self, commands, concurrency=None):
+        """ runs `commands` in a pool of `concurrency` workers
+        """
+
+        jobs = [functools.partial(self.run_command, c) for c in commands]
+        return self.run_jobs(jobs, concurrency)
+
+    def run_jobs(self, jobs, concurrency=None):
+        """ calls `jobs` in a pool of `concurrency` workers, a failed job
+            cancels the jobs that have not started yet
+        """
+
+        concurrency = concurrency or self.config.concurrency
+
+        if concurrency <= 1 or len(jobs) <= 1:
+            return [job() for job in jobs]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(job) for job in jobs]
+
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return [future.result() for future in futures]
+
+    def dump_collection(self, client, database, collection, backup_dir, options=None, \
+            query=None, sample=None):
+
+        directory = os.path.join(backup_dir, database)
+        os.makedirs(directory, exist_ok=True)
+
+        start = time.time()
+
+        try:
+            document_count = native.dump_collection(
+                client[database],
+                collection,
+                directory,
+                self.config.batch_size,
+                options,
+                self.get_codec(),
+                query,
+                sample
+            )
+        except pymongo.errors.PyMongoError as e:
+            raise EngineError(e)
+
+        duration = time.time() - start
+        namespace = "{}.{}".format(database, collection)
+        self.progress.update(namespace, "documents", document_count, document_count, \
+            done=True, started=start)
+
+        msg = "Dumped '{}.{}': {} documents in {:.2f}s ({:.0f} documents/s)"
+        msg = msg.format(database, collection, document_count, duration, \
+            document_count / duration if duration else 0)
+        self.logger.debug(msg)
+
+        return document_count
+
+    def native_backup(self, client, databases, collections, backup_dir, journal=None, \
+            filters=None, sample=None, exclude=None):
+
+        jobs = []
+        for db in databases:
+            for info in client[db].list_collections():
+
+                # views have no documents and system collections are skipped
+                if info.get("type", "collection") != "collection":
+                    continue
+                if info["name"].startswith("system."):
+                    continue
+                if collections and info["name"] not in collections:
+                    continue
+                if info["name"] in (exclude or {}).get(db, []):
+                    continue
+
+                jobs.append(("{}.{}".format(db, info["name"]), functools.partial(
+                    self.dump_collection,
+                    client,
+                    db,
+                    info["name"],
+                    backup_dir,
+                    info.get("options"),
+                    self.get_partial_filter(filters, db, info["name"]),
+                    sample
+                )))
+
+        start = time.time()
+        document_count = sum(self.run_jobs(self.journal_jobs(journal, jobs)))
+        duration = time.time() - start
+
+        msg = "Dumped {} documents in {:.2f}s ({:.0f} documents/s)"
+        msg = msg.format(document_count, duration, \
+            document_count / duration if duration else 0)
+        self.logger.info(msg)
+
+        return document_count
+
+    def restore_collection(self, client, path, database, collection, options=None):
+
+        collection_options = {}
+        if self.config.write_concern is not None:
+            collection_options["write_concern"] = pymongo.write_concern.WriteConcern(
+                **self.config.write_concern
+            )
+
+        start = time.time()
+
+        try:
+            document_count = native.restore_collection(
+                client[database].get_collection(collection, **collection_options),
+                path,
+                self.config.batch_size,
+                self.config.insert_workers,
+                options
+            )
+        except pymongo.errors.PyMongoError as e:
+            raise EngineError(e)
+
+        duration = time.time() - start
+        namespace = "{}.{}".format(database, collection)
+        self.progress.update(namespace, "documents", document_count, document_count, \
+            done=True, started=start)
+
+        msg = "Restored '{}.{}': {} documents in {:.2f}s ({:.0f} documents/s)"
+        msg = msg.format(database, collection, document_count, duration, \
+            document_count / duration if duration else 0)
+        self.logger.debug(msg)
+
+        return document_count
+
+    def native_restore(self, backup_dir, metadata, databases=None, collections=None, \
+            destination_databases=None, destination_connection=None, gzipped=True):
+
+        client = self.create_pymongo_client(destination_connection)
+
+        targets = self.get_restore_targets(metadata, databases, collections, \
+            destination_databases)
+
+        # start the largest collections first so they do not finish last
+        targets.sort(key=lambda target: target[3], reverse=True)
+
+        start = time.time()
+        document_count = sum(self.run_jobs(
+            self.native_restore_jobs(client, backup_dir, targets, gzipped)
+        ))
+        duration = time.time() - start
+
+        msg = "Restored {} documents in {:.2f}s ({:.0f} documents/s)"
+        msg = msg.format(document_count, duration, \
+            document_count / duration if duration else 0)
+        self.logger.info(msg)
+
+        return document_count
+
+    def native_restore_jobs(self, client, backup_dir, targets, gzipped=True, prefix=""):
+        """ returns a job restoring each of `targets` into its destination
+            collection, named with `prefix`, from its dump file and options
+        """
+
+        jobs = []
+        for database, collection, destination_database, _ in targets:
+
+            # views and system collections are listed without data
+            filename = "{}.bson{}".format(collection, ".gz" if gzipped else "")
+            path = os.path.join(backup_dir, database, filename)
+            if not os.path.exists(path):
+                self.logger.debug("Skipping '{}.{}', no dump file".format(database, collection))
+                continue
+
+            collection_metadata = native.read_collection_metadata(
+                os.path.join(backup_dir, database),
+                collection
+            ) or {}
+
+            jobs.append(functools.partial(
+                self.restore_collection,
+                client,
+                path,
+                destination_database,
+                prefix + collection,
+                collection_metadata.get("options")
+            ))
+
+        return jobs
+
+    def store_file(self, store, backup_dir, path):
+
+        full_path = os.path.join(backup_dir, path)
+
+        with compression.open_path(full_path, "rb") as file_handle:
+            digests = [
+                store.put(chunk)
+                for chunk in chunks.iter_chunks(file_handle, ".bson" in path)
+            ]
+
+        return digests
+
+    def store_backup(self, backup_dir):
+        """ moves the dump files of `backup_dir` into the chunk store of the
+            connection and replaces them with a manifest
+        """
+
+        store = ChunkStore(self.config.chunks_dir)
+
+        paths = self.get_backup_files(backup_dir)
+
+        start = time.time()
+
+        jobs = [functools.partial(self.store_file, store, backup_dir, p) for p in paths]
+        manifest = {"files": dict(zip(paths, self.run_jobs(jobs)))}
+
+        with open(os.path.join(backup_dir, "manifest.json"), "w+") as file_handle:
+            json.dump(manifest, file_handle)
+
+        # files are removed once the manifest refers to their chunks
+        for path in paths:
+            os.remove(os.path.join(backup_dir, path))
+
+        # remove the emptied database directories
+        for directory, _, _ in sorted(os.walk(backup_dir), reverse=True):
+            if directory != backup_dir and not os.listdir(directory):
+                os.rmdir(directory)
+
+        msg = "Stored {} files in {:.2f}s"
+        self.logger.debug(msg.format(len(paths), time.time() - start))
+
+        return manifest
+
+    def reassemble_file(self, store, directory, path, digests):
+
+        # chunks hold uncompressed data, files are reassembled uncompressed
+        full_path = compression.strip_extension(os.path.join(directory, path))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        with open(full_path, "wb") as file_handle:
+            for digest in digests:
+                file_handle.write(store.get(digest))
+
+    def decompress_file(self, backup_dir, directory, path):
+
+        full_path = os.path.join(directory, compression.strip_extension(path))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        compression.decompress_file(os.path.join(backup_dir, path), full_path)
+
+    @contextlib.contextmanager
+    def open_backup(self, name, metadata):
+        """ yields the directory holding the dump files of backup `name` and
+            whether they are gzipped, deduplicated backups and backups
+            compressed with codecs mongorestore cannot read are restored
+            from uncompressed files in a temporary directory
+        """
+
+        backup_dir = os.path.join(self.config.connection_dir, name)
+        codec = compression.get_codec(metadata.get("compression"))
+
+        if metadata.get("storage") != "dedup" and codec.name == "gzip":
+            yield backup_dir, True
+            return
+
+        directory = tempfile.mkdtemp(prefix=".restore-", dir=self.config.connection_dir)
+
+        if metadata.get("storage") == "dedup":
+            with open(os.path.join(backup_dir, "manifest.json"), "r") as file_handle:
+                manifest = json.loads(file_handle.read())
+
+            store = ChunkStore(self.config.chunks_dir)
+            jobs = [
+                functools.partial(self.reassemble_file, store, directory, path, digests)
+                for path, digests in manifest["files"].items()
+            ]
+        else:
+            jobs = [
+                functools.partial(self.decompress_file, backup_dir, directory, path)
+                for path in self.get_backup_files(backup_dir)
+            ]
+
+        try:
+            self.run_jobs(jobs)
+            yield directory, False
+
+        finally:
+            shutil.rmtree(directory)
+
+    def collect_chunks(self):
+        """ removes chunks no manifest of the connection refers to
+        """
+
+        store = ChunkStore(self.config.chunks_dir)
+        if not os.path.isdir(store.path):
+            return 0
+
+        referenced = set()
+        for name in self.get_backups():
+            manifest_path = os.path.join(self.config.connection_dir, name, "manifest.json")
+
+            try:
+                with open(manifest_path, "r") as file_handle:
+                    manifest = json.loads(file_handle.read())
+            except FileNotFoundError:
+                continue
+
+            for digests in manifest["files"].values():
+                referenced.update(digests)
+
+        removed = store.collect(referenced)
+        self.logger.debug("Removed {} unreferenced chunks".format(removed))
+
+        return removed
 
     def restore(self, name, databases=None, collections=None, \
-            destination_databases=None, destination_connection=None):
+            destination_databases=None, destination_connection=None, \
+            schedule=False, swap=False):
 
         # check if backup directory exists
         backup_dir = os.path.join(self.config.connection_dir, name)
         if not os.path.exists(backup_dir):
             raise BackupNotFoundError(name)
 
+        self.progress = ProgressTracker(self.progress_callback)
+
         # read backup metadata
         metadata = self.read_metadata(name)
 
+        # partial backups are never restored
+        if not metadata.get("complete", True):
+            raise BackupIncompleteError(name)
+
         # check databases against metadata
         if databases:
             for database in databases:
@@ -279,74 +1493,577 @@ class Mongobar(object):
         conn = self.config.connection
         dest_conn = self.config.connections.get(destination_connection or self.config.connection.name)
 
-        # iterate databases and collections
+        # swapped collections are loaded from a single dump directory
+        if swap:
+            if metadata.get("type") == "incremental":
+                raise SwapRestoreError("incremental backups can not be swapped in")
+            if metadata.get("storage") == "archive":
+                raise SwapRestoreError("archive storage can not be swapped in")
+            if metadata.get("shards"):
+                raise SwapRestoreError("sharded backups can not be swapped in")
+
+        # restore the full backup, then replay each oplog slice in order
+        if metadata.get("type") == "incremental":
+            if destination_databases:
+                msg = "destination databases can not be used with incremental backups"
+                raise IncrementalBackupError(msg)
+
+            # --oplogReplay applies the whole slice, it can not be filtered
+            if databases or collections:
+                msg = "databases and collections can not be selected for incremental backups"
+                raise IncrementalBackupError(msg)
+
+            chain = self.get_backup_chain(name)
+            self.restore(chain[0], destination_connection=destination_connection, \
+                schedule=schedule)
+
+            for incremental_name in chain[1:]:
+                incremental_metadata = self.read_metadata(incremental_name)
+                with self.open_backup(incremental_name, incremental_metadata) as opened:
+                    directory, gzipped = opened
+                    command = self.tool_command("mongorestore", dest_conn)
+                    command += ["--oplogReplay"]
+                    command += ["--dir", directory]
+                    if gzipped:
+                        command += ["--gzip"]
+                    self.run_command(command)
+
+            return
+
+        # archives are streamed into mongorestore without unpacking them
+        if metadata.get("storage") == "archive":
+            if self.config.engine == "native":
+                raise EngineError("archive storage requires the tools engine")
+
+            backup_dir = os.path.join(self.config.connection_dir, name)
+            self.archive_restore(backup_dir, metadata, databases, collections, \
+                destination_databases, dest_conn)
+            return
+
+        with self.open_backup(name, metadata) as opened:
+            backup_dir, gzipped = opened
+
+            # live collections are replaced only once everything is loaded
+            if swap:
+                self.swap_restore(backup_dir, metadata, databases, collections, \
+                    destination_databases, dest_conn, gzipped)
+                return
+
+            # each shard directory holds part of the documents
+            if metadata.get("shards"):
+                if self.config.engine == "native":
+                    raise EngineError("sharded backups require the tools engine")
+
+                self.shard_restore(backup_dir, metadata, databases, collections, \
+                    destination_databases, dest_conn, schedule, gzipped)
+
+            # insert with pymongo instead of mongorestore
+            elif self.config.engine == "native":
+                self.native_restore(backup_dir, metadata, databases, collections, \
+                    destination_databases, dest_conn, gzipped)
+
+            else:
+                self.tools_restore(backup_dir, metadata, databases, collections, \
+                    destination_databases, dest_conn, schedule, gzipped)
+
+            # indexes are built once all data is loaded
+            if self.config.indexes:
+                for dump_dir in self.get_dump_directories(backup_dir, metadata):
+                    self.restore_indexes(dump_dir, metadata, databases, collections, \
+                        destination_databases, dest_conn)
+
+    def get_restore_targets(self, metadata, databases=None, collections=None, \
+            destination_databases=None):
+        """ returns the database, collection, destination database and
+            document count of each collection to restore
+        """
+
+        targets = []
         for i, database in enumerate(databases or [d["name"] for d in metadata["databases"]]):
+            destination_database = database
+            if destination_databases:
+                destination_database = destination_databases[i]
+
+            for d in metadata["databases"]:
+                if d["name"] != database:
+                    continue
+
+                for c in d["collections"]:
+                    if collections and c["name"] not in collections:
+                        continue
+
+                    targets.append((database, c["name"], destination_database, \
+                        c.get("document_count", 0)))
+
+        return targets
+
+    def swap_restore(self, backup_dir, metadata, databases=None, collections=None, \
+            destination_databases=None, destination_connection=None, gzipped=True):
+        """ restores into staging collections, builds their indexes and then
+            renames each over its target, the targets are left untouched if
+            loading fails
+        """
+
+        client = self.create_pymongo_client(destination_connection)
+        targets = self.get_restore_targets(metadata, databases, collections, \
+            destination_databases)
+
+        # the largest collections take longest, start them first
+        targets.sort(key=lambda target: target[3], reverse=True)
 
-            # command, host and port
-            command = ["mongorestore"]
-            command += ["--host", dest_conn.host]
-            command += ["--port", str(dest_conn.port)]
+        start = time.time()
 
-            # authentication
-            if dest_conn.auth:
-                command += ["-u", dest_conn.username]
-                command += ["-p", dest_conn.password]
+        try:
+            if self.config.engine == "native":
+                self.run_jobs(self.native_restore_jobs(client, backup_dir, targets, \
+                    gzipped, self.staging_prefix))
+
+            else:
+                self.run_commands([
+                    self.swap_restore_command(backup_dir, database, collection, \
+                        destination_database, destination_connection, gzipped)
+                    for database, collection, destination_database, _ in targets
+                ])
+
+            if self.config.indexes:
+                index_count = sum(self.run_jobs([
+                    functools.partial(
+                        self.restore_collection_indexes,
+                        client,
+                        os.path.join(backup_dir, database),
+                        destination_database,
+                        collection,
+                        self.staging_prefix + collection
+                    )
+                    for database, collection, destination_database, _ in targets
+                ], self.config.index_concurrency))
+                self.logger.info("Built {} indexes on staging collections".format(index_count))
+
+        except Exception:
+            self.logger.error("Swap restore failed, dropping staging collections")
+            self.drop_staging_collections(client, targets)
+            raise
+
+        msg = "Loaded {} staging collections in {:.2f}s"
+        self.logger.info(msg.format(len(targets), time.time() - start))
+
+        self.swap_collections(client, targets)
+
+    def swap_restore_command(self, backup_dir, database, collection, \
+            destination_database, destination_connection, gzipped=True):
+        """ returns the mongorestore command loading `database`.`collection`
+            into its staging collection in `destination_database`
+        """
+
+        command = self.tool_command("mongorestore", destination_connection)
+        command += ["--nsInclude", "{}.{}".format(database, collection)]
+        command += ["--nsFrom", "{}.{}".format(database, collection)]
+        command += ["--nsTo", "{}.{}{}".format(destination_database, self.staging_prefix, collection)]
+
+        # --drop only ever drops the staging collection
+        command += ["--drop"]
+        command += ["--dir", backup_dir]
+        if gzipped:
+            command += ["--gzip"]
+        command += ["--noIndexRestore"]
+
+        return command
+
+    def swap_collections(self, client, targets):
+        """ renames each staging collection over its target with dropTarget,
+            one atomic rename per collection
+        """
+
+        start = time.time()
+
+        swapped = []
+        for i, (_, collection, destination_database, _) in enumerate(targets):
+            staging = self.staging_prefix + collection
+
+            if staging not in client[destination_database].collection_names():
+                msg = "Staging collection '{}.{}' not found, '{}' is left as it is"
+                self.logger.warning(msg.format(destination_database, staging, collection))
+                continue
+
+            rename_start = time.time()
+
+            try:
+                client.admin.command(
+                    "renameCollection",
+                    "{}.{}".format(destination_database, staging),
+                    to="{}.{}".format(destination_database, collection),
+                    dropTarget=True
+                )
+
+            # earlier renames can not be undone, the rest are left untouched
+            except pymongo.errors.PyMongoError as e:
+                self.drop_staging_collections(client, targets[i:])
+                msg = "{}, swapped in before the failure: {}".format(
+                    e,
+                    ", ".join(swapped) or "none"
+                )
+                raise SwapRestoreError(msg)
+
+            swapped.append("{}.{}".format(destination_database, collection))
 
-                if dest_conn.authdb is not None:
-                    command += ["--authenticationDatabase", dest_conn.authdb]
+            msg = "Swapped in '{}.{}' in {:.3f}s"
+            self.logger.debug(msg.format(destination_database, collection, time.time() - rename_start))
+
+        msg = "Swapped in {} collections in {:.2f}s"
+        self.logger.info(msg.format(len(targets), time.time() - start))
+
+    def drop_staging_collections(self, client, targets):
+        for _, collection, destination_database, _ in targets:
+            try:
+                client[destination_database].drop_collection(self.staging_prefix + collection)
+            except pymongo.errors.PyMongoError as e:
+                self.logger.warning("Staging collection not dropped: {}".format(e))
+
+    def get_dump_directories(self, backup_dir, metadata):
+        """ returns the directories of `backup_dir` laid out like a mongodump
+            output directory, one per shard for sharded backups
+        """
+
+        if metadata.get("shards"):
+            return [os.path.join(backup_dir, s["name"]) for s in metadata["shards"]]
+        return [backup_dir]
+
+    def shard_restore(self, backup_dir, metadata, databases=None, collections=None, \
+            destination_databases=None, destination_connection=None, schedule=False, \
+            gzipped=True):
+        """ restores the directory of each shard in turn, the collections are
+            dropped first because every shard holds part of their documents
+        """
+
+        client = self.create_pymongo_client(destination_connection)
+        databases = databases or [d["name"] for d in metadata["databases"]]
+
+        for i, database in enumerate(databases):
+            destination_database = database
+            if destination_databases:
+                destination_database = destination_databases[i]
+
+            for d in metadata["databases"]:
+                if d["name"] != database:
+                    continue
+
+                for c in d["collections"]:
+                    if not collections or c["name"] in collections:
+                        client[destination_database].drop_collection(c["name"])
+
+        for shard_dir in self.get_dump_directories(backup_dir, metadata):
+
+            # a shard only has directories for the databases it holds
+            indices = [
+                i for i, database in enumerate(databases)
+                if os.path.isdir(os.path.join(shard_dir, database))
+            ]
+            if not indices:
+                continue
+
+            self.tools_restore(
+                shard_dir,
+                metadata,
+                [databases[i] for i in indices],
+                collections,
+                [destination_databases[i] for i in indices] if destination_databases else None,
+                destination_connection,
+                schedule,
+                gzipped,
+                drop=False
+            )
+
+    def tools_restore(self, backup_dir, metadata, databases=None, collections=None, \
+            destination_databases=None, destination_connection=None, schedule=False, \
+            gzipped=True, drop=True):
+
+        dest_conn = destination_connection
+
+        # document counts per namespace, used to schedule the largest first
+        document_counts = {}
+        for database in metadata["databases"]:
+            for collection in database["collections"]:
+                namespace = "{}.{}".format(database["name"], collection["name"])
+                document_counts[namespace] = collection.get("document_count", 0)
+
+        databases = databases or [d["name"] for d in metadata["databases"]]
+
+        # without scheduling one command restores every namespace
+        if not schedule:
+            command = self.batched_restore_command(backup_dir, databases, collections, \
+                destination_databases, dest_conn, gzipped, drop)
+
+            start = time.time()
+            self.run_command(command)
+
+            msg = "Restore finished in {:.2f}s"
+            self.logger.info(msg.format(time.time() - start))
+            return
+
+        # iterate databases and collections
+        jobs = []
+        for i, database in enumerate(databases):
+
+            # command, host, port and authentication
+            command = self.tool_command("mongorestore", dest_conn)
 
             # destination databases
             if destination_databases:
                 command += ["--db", destination_databases[i]]
 
             # command output
-            command_out = ["--drop"]
+            command_out = ["--drop"] if drop else []
             source_dir = copy.copy(backup_dir)
             if destination_databases:
                 source_dir = os.path.join(source_dir, database)
             command_out += ["--dir", source_dir]
-            command_out += ["--gzip"]
+            if gzipped:
+                command_out += ["--gzip"]
             command_out += ["--noIndexRestore"]
 
-            if not collections:
+            # scheduled restores are split into one job per namespace
+            database_collections = collections
+            if not database_collections:
+                for d in metadata["databases"]:
+                    if d["name"] == database:
+                        database_collections = [c["name"] for c in d["collections"]]
 
-                command += ["--nsInclude", "{}.*".format(database)]
-                command += command_out
+            if not database_collections:
 
-                try:
-                    self.logger.debug("Command called: {}".format(" ".join(command)))
-                    subprocess.check_output(command)
-                except subprocess.CalledProcessError as e:
-                    raise CommandError(e)
+                namespace = "{}.*".format(database)
+                document_count = sum([
+                    v for k, v in document_counts.items()
+                    if k.startswith(database + ".")
+                ])
+
+                command += ["--nsInclude", namespace]
+                command += command_out
+                jobs.append((document_count, command))
 
             else:
 
-                for collection in collections:
+                for collection in database_collections:
+
+                    namespace = "{}.{}".format(database, collection)
+                    document_count = document_counts.get(namespace, 0)
 
                     collection_command = copy.copy(command)
-                    collection_command += ["--nsInclude", "{}.{}".format(database, collection)]
+                    collection_command += ["--nsInclude", namespace]
                     collection_command += command_out
+                    jobs.append((document_count, collection_command))
+
+        # start the largest namespaces first so they do not finish last
+        jobs.sort(key=lambda job: job[0], reverse=True)
+
+        start = time.time()
+        durations = self.run_commands([job[1] for job in jobs])
+        duration = time.time() - start
+
+        msg = "Restore finished in {:.2f}s ({:.2f}s summed across {} commands)"
+        self.logger.info(msg.format(duration, sum(durations), len(durations)))
+
+    def batched_restore_command(self, backup_dir, databases, collections=None, \
+            destination_databases=None, destination_connection=None, gzipped=True, \
+            drop=True):
+        """ returns one mongorestore command selecting every namespace with
+            --nsInclude and renaming destination databases with --nsFrom/--nsTo
+        """
+
+        command = self.tool_command("mongorestore", destination_connection)
+
+        for database in databases:
+            for collection in collections or ["*"]:
+                command += ["--nsInclude", "{}.{}".format(database, collection)]
+
+        if destination_databases:
+            for database, destination_database in zip(databases, destination_databases):
+                if database != destination_database:
+                    command += ["--nsFrom", "{}.$collection$".format(database)]
+                    command += ["--nsTo", "{}.$collection$".format(destination_database)]
+
+        if drop:
+            command += ["--drop"]
+        command += ["--dir", backup_dir]
+        if gzipped:
+            command += ["--gzip"]
+        command += ["--noIndexRestore"]
+
+        # mongorestore restores collections in parallel by itself
+        if self.config.concurrency > 1:
+            command += ["--numParallelCollections", str(self.config.concurrency)]
+
+        return command
+
+    def clone(self, databases=None, collections=None, destination_databases=None, \
+            destination_connection=None):
+        """ copies databases to `destination_connection` by piping
+            `mongodump --archive` into `mongorestore --archive`, nothing is
+            written to disk
+        """
+
+        conn = self.config.connection
+        dest_conn = self.config.connections.get(destination_connection or conn.name)
+
+        # check destination databases against databases
+        if destination_databases:
+            databases_len = len(databases or [])
+            destination_databases_len = len(destination_databases)
+            if databases_len != destination_databases_len:
+                raise DestinationDatabasesLengthError(
+                    databases_len,
+                    destination_databases_len
+                )
+
+        # never restore over the source
+        if dest_conn.identity == conn.identity and \
+                (not destination_databases or destination_databases == databases):
+            raise CloneError("source and destination are the same")
+
+        client = self.create_pymongo_client()
+        dbs = databases or [d for d in client.database_names() if d != "local"]
+
+        dump_command = self.tool_command("mongodump", conn)
+        dump_command += ["--archive", "--quiet"]
+
+        restore_command = self.tool_command("mongorestore", dest_conn)
+        for i, database in enumerate(destination_databases or []):
+            restore_command += ["--nsFrom", "{}.*".format(databases[i])]
+            restore_command += ["--nsTo", "{}.*".format(database)]
+        restore_command += ["--archive"]
+        restore_command += ["--drop"]
+        if not self.config.indexes:
+            restore_command += ["--noIndexRestore"]
+
+        jobs = [
+            functools.partial(self.pipe_commands, dump_command + arguments, restore_command)
+            for _, arguments in self.archive_targets(dbs, collections, not databases)
+        ]
+
+        start = time.time()
+        durations = self.run_jobs(jobs)
+        duration = time.time() - start
+
+        msg = "Clone finished in {:.2f}s ({:.2f}s summed across {} commands)"
+        self.logger.info(msg.format(duration, sum(durations), len(durations)))
+
+    def restore_indexes(self, backup_dir, metadata, databases=None, collections=None, \
+            destination_databases=None, destination_connection=None):
+        """ builds the indexes dumped with the restored collections,
+            `index_concurrency` collections at a time, returns the index count
+        """
+
+        client = self.create_pymongo_client(destination_connection)
 
-                    try:
-                        self.logger.debug("Command called: {}".format(" ".join(collection_command)))
-                        subprocess.check_output(collection_command)
-                    except subprocess.CalledProcessError as e:
-                        raise CommandError(e)
+        targets = self.get_restore_targets(metadata, databases, collections, \
+            destination_databases)
+
+        # the largest collections take longest to index, start them first
+        targets.sort(key=lambda target: target[3], reverse=True)
+
+        jobs = [
+            functools.partial(
+                self.restore_collection_indexes,
+                client,
+                os.path.join(backup_dir, database),
+                destination_database,
+                collection
+            )
+            for database, collection, destination_database, _ in targets
+        ]
+
+        start = time.time()
+        index_count = sum(self.run_jobs(jobs, self.config.index_concurrency))
+
+        msg = "Built {} indexes in {:.2f}s"
+        self.logger.info(msg.format(index_count, time.time() - start))
+
+        return index_count
+
+    def restore_collection_indexes(self, client, directory, database, collection, \
+            destination_collection=None):
+
+        destination_collection = destination_collection or collection
+
+        collection_metadata = native.read_collection_metadata(directory, collection)
+        if collection_metadata is None:
+            return 0
+
+        # the _id index is created with the collection
+        indexes = [
+            i for i in collection_metadata.get("indexes", [])
+            if i.get("name") != "_id_"
+        ]
+
+        for spec in indexes:
+            start = time.time()
+
+            try:
+                native.create_index(client[database], destination_collection, spec)
+            except pymongo.errors.PyMongoError as e:
+                raise EngineError(e)
+
+            msg = "Index '{}' on '{}.{}' built in {:.2f}s"
+            msg = msg.format(spec.get("name"), database, destination_collection, time.time() - start)
+            self.logger.info(msg)
+
+        return len(indexes)
+
+    def archive_restore(self, backup_dir, metadata, databases=None, collections=None, \
+            destination_databases=None, destination_connection=None):
+
+        databases = databases or [d["name"] for d in metadata["databases"]]
+
+        # select namespaces from the archives, renaming destination databases
+        command = self.tool_command("mongorestore", destination_connection)
+        for i, database in enumerate(databases):
+            for collection in collections or ["*"]:
+                command += ["--nsInclude", "{}.{}".format(database, collection)]
+
+            if destination_databases:
+                command += ["--nsFrom", "{}.*".format(database)]
+                command += ["--nsTo", "{}.*".format(destination_databases[i])]
+
+        command += ["--archive"]
+        command += ["--drop"]
+
+        # index specs are inside the archives, mongorestore builds them inline
+        if not self.config.indexes:
+            command += ["--noIndexRestore"]
+
+        # archives named after a database hold nothing else
+        jobs = []
+        for filename in sorted(os.listdir(backup_dir)):
+            name = compression.strip_extension(filename)
+            if not name.endswith(".archive"):
+                continue
+
+            prefix = name[:-len(".archive")].split(".")[0]
+            if prefix != "dump" and prefix not in databases:
+                continue
+
+            path = os.path.join(backup_dir, filename)
+            jobs.append(functools.partial(self.restore_archive, command, path))
+
+        start = time.time()
+        durations = self.run_jobs(jobs)
+        duration = time.time() - start
+
+        msg = "Restore finished in {:.2f}s ({:.2f}s summed across {} commands)"
+        self.logger.info(msg.format(duration, sum(durations), len(durations)))
 
     def get_connection_directories(self, count=False):
         if not os.path.exists(self.config.root):
             return []
 
-        directories = []
-        for directory in get_directories(self.config.root):
+        directories = [d for d in get_directories(self.config.root) if not d.startswith(".")]
 
-            if count:
-                path = os.path.join(self.config.root, directory)
-                backup_count = len(get_directories(path))
-                directories.append((directory, backup_count))
+        if count:
+            catalog = self.catalog
+            for directory in directories:
+                catalog.sync(directory)
 
-            else:
-                directories.append(directory)
+            counts = catalog.counts()
+            return [(d, counts.get(d, 0)) for d in directories]
 
         return directories
 
@@ -356,12 +2073,171 @@ class Mongobar(object):
         if not os.path.exists(path):
             return []
 
-        return get_directories(path)
+        return [d for d in get_directories(path) if not d.startswith(".")]
 
-    def remove_backup(self, name):
+    def list_backups(self, limit=None, complete=True):
+        """ returns catalog rows for the complete (or incomplete) backups of
+            the current connection, newest first
+        """
+
+        if not os.path.exists(self.config.connection_dir):
+            return []
+
+        catalog = self.catalog
+        catalog.sync(self.config.connection.socket)
+
+        return catalog.backups(self.config.connection.socket, limit, complete)
+
+    def remove_backup(self, name, collect=True):
         path = os.path.join(self.config.connection_dir, name)
 
         if not os.path.exists(path):
             raise BackupNotFoundError(name)
 
-        shutil.rmtree(path)
+        # renaming is instant, the files are deleted later by `collect_trash`
+        Trash(self.config.trash_dir).move(path)
+
+        self.catalog.remove(self.config.connection.socket, name)
+
+        if collect:
+            self.collect_chunks()
+
+    def get_backup_inodes(self, name):
+        """ returns the files of backup `name`, including the chunks of dedup
+            backups, as a dict of (st_dev, st_ino) to (st_size, st_nlink) so
+            hard linked files are only counted once
+        """
+
+        backup_dir = os.path.join(self.config.connection_dir, name)
+
+        paths = []
+        for root, _, files in os.walk(backup_dir):
+            paths.extend([os.path.join(root, f) for f in files])
+
+        try:
+            with open(os.path.join(backup_dir, "manifest.json"), "r") as file_handle:
+                manifest = json.loads(file_handle.read())
+        except FileNotFoundError:
+            manifest = {"files": {}}
+
+        store = ChunkStore(self.config.chunks_dir)
+        for digests in manifest["files"].values():
+            paths.extend([store.chunk_path(d) for d in digests])
+
+        inodes = {}
+        for path in paths:
+            try:
+                stat = os.lstat(path)
+            except FileNotFoundError:
+                continue
+            inodes[(stat.st_dev, stat.st_ino)] = (stat.st_size, stat.st_nlink)
+
+        return inodes
+
+    def get_backup_size(self, name):
+        """ returns the number of bytes used by backup `name`
+        """
+
+        return sum([size for size, _ in self.get_backup_inodes(name).values()])
+
+    def plan_prune(self, policy=None):
+        """ returns the backups of the current connection that `policy`, or the
+            configured retention policy, does not keep, oldest first
+        """
+
+        policy = self.config.retention if policy is None else policy
+        if not policy:
+            return []
+
+        backups = []
+        links = {}
+        nlinks = {}
+        for name in self.get_backups():
+            metadata_path = os.path.join(self.config.connection_dir, name, "metadata.json")
+
+            # backups still being written have no metadata yet
+            try:
+                with open(metadata_path, "r") as file_handle:
+                    metadata = json.loads(file_handle.read())
+            except (FileNotFoundError, ValueError):
+                self.logger.debug("Skipping backup {} without metadata".format(name))
+                continue
+
+            # incomplete backups may still be resumed
+            if not metadata.get("complete", True):
+                continue
+
+            inodes = self.get_backup_inodes(name)
+            backups.append({
+                "name": name,
+                "date": retention.parse_date(metadata["date"]),
+                "files": dict([(k, v[0]) for k, v in inodes.items()]),
+                "parent": metadata.get("parent")
+            })
+            for key, (_, nlink) in inodes.items():
+                links[key] = links.get(key, 0) + 1
+                nlinks[key] = nlink
+
+        keep = retention.select_backups(backups, policy)
+
+        kept = set()
+        for backup in backups:
+            if backup["name"] in keep:
+                kept.update(backup["files"].keys())
+
+        # a file is freed once no kept backup or path outside the pruned
+        # backups links it, each file counts towards the oldest backup
+        pruned = sorted(
+            [b for b in backups if b["name"] not in keep],
+            key=lambda b: b["date"]
+        )
+        counted = set()
+        for backup in pruned:
+            files = backup.pop("files")
+            backup["size"] = 0
+            for key, size in files.items():
+                if key in kept or key in counted or links[key] < nlinks[key]:
+                    continue
+                counted.add(key)
+                backup["size"] += size
+
+        return pruned
+
+    def prune(self, policy=None, dry_run=False):
+        """ removes the backups the retention policy does not keep, in batches
+            of `prune_batch_size`, returns them whether removed or not
+        """
+
+        backups = self.plan_prune(policy)
+        if dry_run:
+            return backups
+
+        batch_size = self.config.prune_batch_size
+        for i in range(0, len(backups), batch_size):
+            batch = backups[i:i + batch_size]
+            for backup in batch:
+                self.remove_backup(backup["name"], collect=False)
+
+            # one chunk collection per batch instead of one per backup
+            self.collect_chunks()
+
+            msg = "Pruned {} of {} backups"
+            self.logger.debug(msg.format(i + len(batch), len(backups)))
+
+        return backups
+
+    def collect_trash(self):
+        """ deletes removed backups from the trash, returns the number of
+            files deleted
+        """
+
+        start = time.time()
+        removed = Trash(self.config.trash_dir).collect(
+            self.config.gc_workers,
+            self.config.gc_rate
+        )
+
+        msg = "Deleted {} trashed files in {:.2f}s"
+        self.logger.debug(msg.format(removed, time.time() - start))
+
+        return removed
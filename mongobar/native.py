@@ -0,0 +1,286 @@
+import os
+import math
+import json
+import datetime
+import itertools
+import concurrent.futures
+
+import bson
+import bson.json_util
+import bson.timestamp
+import bson.regex
+import bson.objectid
+
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from mongobar import compression
+
+
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def dump_collection(database, name, directory, batch_size=1000, options=None, \
+        codec=None, query=None, sample=None):
+    """ streams the documents of collection `name` in `database` matching
+        `query` to `directory` using the mongodump layout, `sample` picks a
+        random ratio (below 1) or number of them, returns the document count
+    """
+
+    codec = codec or compression.GzipCodec()
+    collection = database.get_collection(name, codec_options=RAW_CODEC_OPTIONS)
+
+    if sample is None:
+        cursor = collection.find(query or {}, batch_size=batch_size)
+
+    else:
+        size = sample
+        if sample < 1:
+            size = math.ceil(collection.count_documents(query or {}) * sample)
+
+        pipeline = [{"$match": query}] if query else []
+        pipeline += [{"$sample": {"size": int(size)}}]
+
+        cursor = []
+        if size:
+            cursor = collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+
+    # documents, written as they arrive to keep memory bounded
+    bson_path = os.path.join(directory, "{}.bson{}".format(name, codec.extension))
+    document_count = 0
+    with codec.open(bson_path, "wb") as file_handle:
+        for document in cursor:
+            file_handle.write(document.raw)
+            document_count += 1
+
+    # collection options and indexes, read by mongorestore
+    metadata = {
+        "options": options or {},
+        "indexes": [index for index in database[name].list_indexes()]
+    }
+
+    metadata_path = os.path.join(directory, "{}.metadata.json{}".format(name, codec.extension))
+    with codec.open(metadata_path, "wb") as file_handle:
+        file_handle.write(bson.json_util.dumps(metadata).encode("utf-8"))
+
+    return document_count
+
+
+def collection_fingerprints(database, names, method="stats"):
+    """ returns a fingerprint of each collection `names` in `database` that
+        changes when its documents do, "stats" combines the count, size and
+        largest _id, "dbhash" hashes every document
+    """
+
+    if method == "dbhash":
+        hashes = database.command("dbHash", collections=list(names))["collections"]
+        return dict([(name, hashes.get(name)) for name in names])
+
+    fingerprints = {}
+    for name in names:
+        stats = database.command("collStats", name)
+
+        last_id = None
+        for document in database[name].find({}, {"_id": 1}).sort("_id", -1).limit(1):
+            last_id = document["_id"]
+
+        fingerprints[name] = bson.json_util.dumps([
+            stats.get("count"),
+            stats.get("size"),
+            last_id
+        ])
+
+    return fingerprints
+
+
+def read_collection_metadata(directory, name):
+    """ returns the options and indexes dumped for collection `name` in
+        `directory` with any codec, None when there is no metadata file
+    """
+
+    path = os.path.join(directory, "{}.metadata.json".format(name))
+
+    for extension in [""] + [c.extension for c in compression.codecs.values()]:
+        try:
+            with compression.open_path(path + extension, "rb") as file_handle:
+                return bson.json_util.loads(file_handle.read().decode("utf-8"))
+        except FileNotFoundError:
+            continue
+
+    return None
+
+
+def create_index(database, name, spec):
+    """ builds index `spec`, as dumped in collection metadata, on collection
+        `name` in `database`
+    """
+
+    spec = dict([(k, v) for k, v in spec.items() if k not in ["ns", "v"]])
+    database.command("createIndexes", name, indexes=[spec])
+
+
+def filters_to_json(filters):
+    """ returns query `filters` as json serializable extended JSON
+    """
+
+    if filters is None:
+        return None
+
+    return json.loads(bson.json_util.dumps(filters))
+
+
+def filters_from_json(data):
+    """ returns the query filters of extended JSON `data`, from a string or
+        from a dict created by `filters_to_json`
+    """
+
+    if data is None:
+        return None
+
+    if not isinstance(data, str):
+        data = json.dumps(data)
+
+    return bson.json_util.loads(data)
+
+
+def since_filter(days, now=None):
+    """ returns a filter matching documents whose ObjectId `_id` was
+        generated in the last `days` days
+    """
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    start = bson.objectid.ObjectId.from_datetime(now - datetime.timedelta(days=days))
+    return {"_id": {"$gte": start}}
+
+
+def combine_filters(queries, since=None):
+    """ returns the filters of `queries`, a list of (namespace, query) pairs
+        with "*" for all collections, queries of the same namespace and the
+        `since` filter are combined with $and so none of them is dropped
+    """
+
+    filters = {}
+    for namespace, query in queries:
+        filters.setdefault(namespace, []).append(query)
+
+    if since is not None:
+        filters.setdefault("*", [])
+        for namespace in filters:
+            filters[namespace].insert(0, since)
+
+    return dict([
+        (n, q[0] if len(q) == 1 else {"$and": q})
+        for n, q in filters.items()
+    ])
+
+
+def timestamp_to_json(timestamp):
+    """ returns a json serializable dict for bson `timestamp`
+    """
+
+    if timestamp is None:
+        return None
+
+    return {"t": timestamp.time, "i": timestamp.inc}
+
+
+def timestamp_from_json(data):
+    """ returns a bson timestamp for a dict created by `timestamp_to_json`
+    """
+
+    if data is None:
+        return None
+
+    return bson.timestamp.Timestamp(data["t"], data["i"])
+
+
+def oplog_timestamp(client, direction=-1):
+    """ returns the newest (or oldest with `direction` 1) oplog timestamp,
+        None when the server has no oplog
+    """
+
+    oplog = client["local"]["oplog.rs"]
+    for entry in oplog.find({}, {"ts": 1}).sort("$natural", direction).limit(1):
+        return entry["ts"]
+
+    return None
+
+
+def dump_oplog(client, path, start, end, namespaces=None, batch_size=1000, \
+        codec=None):
+    """ streams the oplog entries after `start` up to and including `end` to
+        a compressed BSON file at `path`, `namespaces` is a list of regular
+        expressions to filter entries by, returns the entry count
+    """
+
+    codec = codec or compression.GzipCodec()
+
+    query = {"ts": {"$gt": start, "$lte": end}}
+    if namespaces:
+        query["ns"] = {"$in": [bson.regex.Regex(n) for n in namespaces]}
+
+    oplog = client["local"].get_collection("oplog.rs", codec_options=RAW_CODEC_OPTIONS)
+
+    entry_count = 0
+    with codec.open(path, "wb") as file_handle:
+        for entry in oplog.find(query, batch_size=batch_size):
+            file_handle.write(entry.raw)
+            entry_count += 1
+
+    return entry_count
+
+
+def iter_batches(iterable, size):
+    """ yields lists of at most `size` items from `iterable`
+    """
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_batch(collection, documents):
+    """ inserts `documents` into `collection` unordered, returns the count
+    """
+
+    collection.insert_many(documents, ordered=False)
+    return len(documents)
+
+
+def restore_collection(collection, path, batch_size=1000, workers=1, options=None):
+    """ drops `collection`, creates it with the dumped `options` and inserts
+        the documents of the BSON file at `path` in unordered batches on
+        `workers` threads, returns the document count
+    """
+
+    collection.drop()
+
+    # capped collections, collations and validators are set on creation
+    if options:
+        collection.database.command("create", collection.name, **options)
+
+    document_count = 0
+    with compression.open_path(path, "rb") as file_handle, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+
+        documents = bson.decode_file_iter(file_handle, RAW_CODEC_OPTIONS)
+
+        # at most two batches per worker are held in memory
+        pending = set()
+        for batch in iter_batches(documents, batch_size):
+            if len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(
+                    pending,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                document_count += sum([f.result() for f in done])
+
+            pending.add(executor.submit(insert_batch, collection, batch))
+
+        done, pending = concurrent.futures.wait(pending)
+        document_count += sum([f.result() for f in done])
+
+    return document_count
@@ -0,0 +1,151 @@
+import re
+import time
+import threading
+
+
+# "[####....]  d1.c1  2500/10000  (25.0%)" from mongodump and
+# "[####....]  d1.c1  1.50MB/6.00MB  (25.0%)" from mongorestore
+PROGRESS_PATTERN = re.compile(
+    r"\]\s+(?P<namespace>\S+)\s+"
+    r"(?P<current>[\d.]+)(?P<current_unit>[KMGT]?B)?/"
+    r"(?P<total>[\d.]+)(?P<total_unit>[KMGT]?B)?\s+\("
+)
+
+# "done dumping d1.c1 (10000 documents)" and
+# "finished restoring d1.c1 (10000 documents, 0 failures)"
+DONE_PATTERN = re.compile(
+    r"(?:done dumping|finished restoring) (?P<namespace>\S+) "
+    r"\((?P<documents>\d+) documents?"
+)
+
+UNITS = {
+    "B": 1,
+    "KB": 1024,
+    "MB": 1024 ** 2,
+    "GB": 1024 ** 3,
+    "TB": 1024 ** 4
+}
+
+
+def parse_amount(value, unit=None):
+    if unit:
+        return int(float(value) * UNITS[unit])
+    return int(float(value))
+
+
+def parse_line(line):
+    """ returns the namespace, unit, current and total amounts of a
+        mongodump or mongorestore progress line, None for other lines
+    """
+
+    match = PROGRESS_PATTERN.search(line)
+    if match:
+        return {
+            "namespace": match.group("namespace"),
+            "unit": "bytes" if match.group("total_unit") else "documents",
+            "current": parse_amount(match.group("current"), match.group("current_unit")),
+            "total": parse_amount(match.group("total"), match.group("total_unit")),
+            "done": False
+        }
+
+    match = DONE_PATTERN.search(line)
+    if match:
+        documents = int(match.group("documents"))
+        return {
+            "namespace": match.group("namespace"),
+            "unit": "documents",
+            "current": documents,
+            "total": documents,
+            "done": True
+        }
+
+    return None
+
+
+class ProgressTracker(object):
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.namespaces = {}
+        self.lock = threading.Lock()
+
+    def update(self, namespace, unit, current, total, done=False, started=None):
+        """ records progress of `namespace`, calls the callback with the
+            rate and ETA and returns them, the clock of a namespace starts at
+            its first update unless that update is already `done`
+        """
+
+        now = time.time()
+
+        with self.lock:
+            state = self.namespaces.setdefault(namespace, {
+                "start": (started or now) if done else now,
+                "documents": 0,
+                "bytes": None
+            })
+
+            state[unit] = current
+            state["elapsed"] = now - state["start"]
+            state["done"] = done
+
+            rate = current / state["elapsed"] if state["elapsed"] > 0 else 0.0
+            eta = None
+            if done:
+                eta = 0.0
+            elif rate:
+                eta = (total - current) / rate
+
+            event = {
+                "namespace": namespace,
+                "unit": unit,
+                "current": current,
+                "total": total,
+                "rate": rate,
+                "eta": eta,
+                "elapsed": state["elapsed"],
+                "done": done
+            }
+
+        if self.callback is not None:
+            self.callback(event)
+
+        return event
+
+    def feed(self, line, started=None):
+        """ updates progress from a line of tool output, `started` is when
+            the command started, only used for namespaces whose first line is
+            their done line
+        """
+
+        progress = parse_line(line)
+        if progress is None:
+            return None
+
+        return self.update(started=started, **progress)
+
+    def summary(self):
+        """ returns the final documents and bytes per second of each namespace
+        """
+
+        summary = {}
+
+        with self.lock:
+            for namespace, state in self.namespaces.items():
+                elapsed = state.get("elapsed") or 0.0
+
+                summary[namespace] = {
+                    "documents": state["documents"],
+                    "bytes": state["bytes"],
+                    "duration": round(elapsed, 3),
+                    "documents_per_second": None,
+                    "bytes_per_second": None
+                }
+
+                if elapsed > 0:
+                    summary[namespace]["documents_per_second"] = \
+                        round(state["documents"] / elapsed, 1)
+                    if state["bytes"] is not None:
+                        summary[namespace]["bytes_per_second"] = \
+                            round(state["bytes"] / elapsed, 1)
+
+        return summary
@@ -0,0 +1,111 @@
+import datetime
+
+from mongobar.exceptions import RetentionPolicyError
+
+
+# bucket of a backup date for each count rule, newest buckets are kept first
+periods = [
+    ("hourly", lambda d: (d.year, d.month, d.day, d.hour)),
+    ("daily", lambda d: (d.year, d.month, d.day)),
+    ("weekly", lambda d: tuple(d.isocalendar()[:2])),
+    ("monthly", lambda d: (d.year, d.month)),
+    ("yearly", lambda d: (d.year,))
+]
+
+rules = [p[0] for p in periods] + ["max_bytes"]
+
+
+def validate_policy(policy):
+    """ raises RetentionPolicyError unless every rule of `policy` is known and
+        set to a non negative integer
+    """
+
+    for rule, value in policy.items():
+        if rule not in rules:
+            raise RetentionPolicyError("unknown rule '{}'".format(rule))
+
+        if value is None:
+            continue
+
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            msg = "'{}' must be a non negative integer, got {!r}".format(rule, value)
+            raise RetentionPolicyError(msg)
+
+    return True
+
+
+def parse_date(value):
+    """ parses a metadata date written by `datetime.isoformat`
+    """
+
+    for date_format in ["%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"]:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+
+    raise RetentionPolicyError("unreadable backup date '{}'".format(value))
+
+
+def select_backups(backups, policy):
+    """ returns the names of `backups` kept by `policy`, each backup is a dict
+        with `name`, `date`, `parent` and either `size` or `files`, a dict of
+        file identity to size so files shared between backups count once
+
+        count rules keep the newest backup of each of the N most recent hours,
+        days, weeks, months or years, `max_bytes` then drops the oldest kept
+        backups until the total fits, the newest backup and the parents of
+        kept incremental backups are always kept
+    """
+
+    validate_policy(policy)
+
+    backups = sorted(backups, key=lambda b: b["date"], reverse=True)
+    if not backups:
+        return set()
+
+    counted = [(r, k) for r, k in periods if policy.get(r) is not None]
+
+    # without count rules every backup is a candidate
+    if counted:
+        keep = set()
+        for rule, bucket in counted:
+            buckets = set()
+            for backup in backups:
+                key = bucket(backup["date"])
+                if key in buckets:
+                    continue
+                if len(buckets) == policy[rule]:
+                    break
+
+                buckets.add(key)
+                keep.add(backup["name"])
+    else:
+        keep = set([b["name"] for b in backups])
+
+    keep.add(backups[0]["name"])
+
+    if policy.get("max_bytes") is not None:
+        total = 0
+        seen = set()
+        for i, backup in enumerate(backups):
+            if backup["name"] not in keep:
+                continue
+
+            if "files" in backup:
+                total += sum([s for f, s in backup["files"].items() if f not in seen])
+                seen.update(backup["files"].keys())
+            else:
+                total += backup["size"] or 0
+            if i > 0 and total > policy["max_bytes"]:
+                keep.discard(backup["name"])
+
+    # incremental backups can not be restored without their chain
+    parents = dict([(b["name"], b.get("parent")) for b in backups])
+    for name in list(keep):
+        parent = parents.get(name)
+        while parent is not None and parent not in keep:
+            keep.add(parent)
+            parent = parents.get(parent)
+
+    return keep
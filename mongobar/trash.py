@@ -0,0 +1,100 @@
+import os
+import time
+import uuid
+import threading
+import concurrent.futures
+
+
+class Throttle(object):
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """ blocks until the next operation is allowed, operations are spaced
+            `1 / rate` seconds apart across all threads
+        """
+
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.time()
+            delay = self.next - now
+            self.next = max(self.next, now) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Trash(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def move(self, path):
+        """ renames `path` into the trash, returns its new path
+        """
+
+        os.makedirs(self.path, exist_ok=True)
+
+        # the suffix keeps entries unique when a name is removed twice
+        name = "{}.{}".format(os.path.basename(path), uuid.uuid4().hex[:8])
+        destination = os.path.join(self.path, name)
+        os.rename(path, destination)
+
+        return destination
+
+    def entries(self):
+        """ returns the paths of the entries waiting to be deleted
+        """
+
+        try:
+            names = sorted(os.listdir(self.path))
+        except FileNotFoundError:
+            return []
+
+        return [os.path.join(self.path, n) for n in names]
+
+    def collect(self, workers=4, rate=None):
+        """ deletes every entry, files are unlinked on `workers` threads at
+            most `rate` per second, returns the number of files deleted
+        """
+
+        throttle = Throttle(rate)
+
+        def unlink(path):
+            throttle.wait()
+            try:
+                os.unlink(path)
+                return 1
+            except FileNotFoundError:
+                # another collector got there first
+                return 0
+
+        removed = 0
+        with concurrent.futures.ThreadPoolExecutor(max(int(workers), 1)) as executor:
+            for entry in self.entries():
+                if not os.path.isdir(entry) or os.path.islink(entry):
+                    removed += unlink(entry)
+                    continue
+
+                paths = []
+                for root, directories, files in os.walk(entry):
+                    paths.extend([os.path.join(root, f) for f in files])
+                    paths.extend([
+                        os.path.join(root, d) for d in directories
+                        if os.path.islink(os.path.join(root, d))
+                    ])
+                removed += sum(executor.map(unlink, paths))
+
+                # directories are empty once their files are gone
+                for root, _, _ in os.walk(entry, topdown=False):
+                    try:
+                        os.rmdir(root)
+                    except FileNotFoundError:
+                        pass
+
+        return removed
@@ -1,5 +1,7 @@
 import os
 import copy
+import importlib
+import threading
 
 
 def _merge(a, b):
@@ -21,6 +23,35 @@ def merge(a, b):
     return _merge(copy.deepcopy(a), copy.deepcopy(b))
 
 
+class LazyModule(object):
+    """ imports module `name` on first attribute access
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+
+    def __getattr__(self, attribute):
+        return getattr(importlib.import_module(self._name), attribute)
+
+    def __repr__(self):
+        return "<lazy module '{}'>".format(self._name)
+
+
+_lazy_modules = {}
+_lazy_modules_lock = threading.Lock()
+
+
+def lazy_import(name):
+    """ returns a shared stand-in for module `name` that imports it when one
+        of its attributes is first used
+    """
+
+    with _lazy_modules_lock:
+        if name not in _lazy_modules:
+            _lazy_modules[name] = LazyModule(name)
+        return _lazy_modules[name]
+
+
 def get_directories(path):
     """ returns a list of directory names from `path`
     """
@@ -47,6 +47,12 @@ setuptools.setup(
             "green",
             "coverage"
         ],
+        "zstd": [
+            "zstandard"
+        ],
+        "lz4": [
+            "lz4"
+        ]
     },
     classifiers=[
         "Development Status :: 3 - Alpha",
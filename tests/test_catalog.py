@@ -0,0 +1,176 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import tempfile
+import json
+import os
+import multiprocessing
+
+from unittest import mock
+
+from mongobar.catalog import Catalog
+from mongobar.catalog import metadata_totals
+
+
+def metadata(date, message=None, document_count=1):
+    return {
+        "date": date,
+        "message": message,
+        "databases": [{
+            "name": "d1",
+            "collections": [
+                {"name": "c1", "document_count": document_count},
+                {"name": "c2", "document_count": document_count}
+            ]
+        }]
+    }
+
+
+def add_backup(root, name, barrier):
+    barrier.wait()
+    Catalog(root).add("host:27017", name, metadata("2017-01-01"))
+
+
+# Test Catalog
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.catalog = Catalog(self.root.name)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def create_backup(self, name, data, directory="host:27017"):
+        path = os.path.join(self.root.name, directory, name)
+        os.makedirs(path)
+        with open(os.path.join(path, "metadata.json"), "w+") as file_handle:
+            json.dump(data, file_handle)
+
+    # metadata_totals
+
+    def test__metadata_totals(self):
+        totals = metadata_totals(metadata("2017-01-01", document_count=3))
+        self.assertEqual(totals, (1, 2, 6))
+
+    # add
+
+    def test__add(self):
+        self.catalog.add("host:27017", "b1", metadata("2017-01-01", "foo"))
+        self.assertEqual(self.catalog.backups("host:27017"), [{
+            "name": "b1",
+            "date": "2017-01-01",
+            "message": "foo",
+            "databases_count": 1,
+            "collections_count": 2,
+            "documents_count": 2,
+            "complete": 1,
+            "partial": 0
+        }])
+
+    def test__add__concurrent_new_catalog(self):
+        names = ["b{}".format(i) for i in range(8)]
+
+        for trial in range(5):
+            root = os.path.join(self.root.name, str(trial))
+            os.makedirs(root)
+
+            barrier = multiprocessing.Barrier(len(names))
+            processes = [
+                multiprocessing.Process(target=add_backup, args=(root, name, barrier))
+                for name in names
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            self.assertEqual([p.exitcode for p in processes], [0] * len(names))
+            backups = Catalog(root).backups("host:27017")
+            self.assertEqual(sorted([b["name"] for b in backups]), names)
+
+    # remove
+
+    def test__remove(self):
+        self.catalog.add("host:27017", "b1", metadata("2017-01-01"))
+        self.catalog.remove("host:27017", "b1")
+        self.assertEqual(self.catalog.backups("host:27017"), [])
+
+    # sync
+
+    def test__sync(self):
+        self.create_backup("b1", metadata("2017-01-01"))
+        self.create_backup("b2", metadata("2017-01-02"))
+        self.catalog.sync("host:27017")
+
+        names = [b["name"] for b in self.catalog.backups("host:27017")]
+        self.assertEqual(names, ["b2", "b1"])
+
+    def test__sync__removed_backup(self):
+        self.catalog.add("host:27017", "b1", metadata("2017-01-01"))
+        self.create_backup("b2", metadata("2017-01-02"))
+        self.catalog.sync("host:27017")
+
+        names = [b["name"] for b in self.catalog.backups("host:27017")]
+        self.assertEqual(names, ["b2"])
+
+    def test__sync__unchanged_directory_not_listed(self):
+        self.create_backup("b1", metadata("2017-01-01"))
+        self.catalog.sync("host:27017")
+
+        with mock.patch("mongobar.catalog.get_directories") as get_directories:
+            self.catalog.sync("host:27017")
+            get_directories.assert_not_called()
+
+    def test__sync__missing_metadata(self):
+        os.makedirs(os.path.join(self.root.name, "host:27017", "b1"))
+        self.catalog.sync("host:27017")
+        self.assertEqual(self.catalog.backups("host:27017"), [])
+        self.assertEqual(
+            self.catalog.backups("host:27017", complete=False)[0]["message"],
+            "Metadata not found"
+        )
+
+    def test__sync__directory_does_not_exist(self):
+        self.catalog.add("host:27017", "b1", metadata("2017-01-01"))
+        self.catalog.sync("host:27017")
+        self.assertEqual(self.catalog.backups("host:27017"), [])
+
+    # backups
+
+    def test__backups__limit(self):
+        for i in range(5):
+            self.catalog.add("host:27017", "b{}".format(i), metadata("2017-01-0{}".format(i + 1)))
+
+        names = [b["name"] for b in self.catalog.backups("host:27017", limit=2)]
+        self.assertEqual(names, ["b4", "b3"])
+
+    def test__backups__incomplete(self):
+        data = metadata("2017-01-02")
+        data["complete"] = False
+        self.catalog.add("host:27017", "b1", metadata("2017-01-01"))
+        self.catalog.add("host:27017", "b2", data)
+
+        names = [b["name"] for b in self.catalog.backups("host:27017")]
+        self.assertEqual(names, ["b1"])
+
+        names = [b["name"] for b in self.catalog.backups("host:27017", complete=False)]
+        self.assertEqual(names, ["b2"])
+        self.assertEqual(self.catalog.counts(), {"host:27017": 1})
+
+    def test__backups__partial(self):
+        data = metadata("2017-01-02")
+        data["partial"] = {"filters": None, "sample": 0.01}
+        self.catalog.add("host:27017", "b1", metadata("2017-01-01"))
+        self.catalog.add("host:27017", "b2", data)
+
+        partial = [(b["name"], b["partial"]) for b in self.catalog.backups("host:27017")]
+        self.assertEqual(partial, [("b2", 1), ("b1", 0)])
+
+    # counts
+
+    def test__counts(self):
+        self.catalog.add("host:27017", "b1", metadata("2017-01-01"))
+        self.catalog.add("host:27017", "b2", metadata("2017-01-01"))
+        self.catalog.add("other:27017", "b1", metadata("2017-01-01"))
+        self.assertEqual(self.catalog.counts(), {"host:27017": 2, "other:27017": 1})
@@ -0,0 +1,84 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import tempfile
+import io
+import os
+import bson
+
+from unittest import mock
+
+import mongobar.chunks as chunks
+
+
+def bson_stream(documents):
+    return io.BytesIO(b"".join([bson.encode(d) for d in documents]))
+
+
+# Test Chunks
+
+class TestChunks(unittest.TestCase):
+
+    # iter_documents
+
+    def test__iter_documents(self):
+        documents = [{"_id": i} for i in range(3)]
+        raw = list(chunks.iter_documents(bson_stream(documents)))
+        self.assertEqual([bson.decode(r) for r in raw], documents)
+
+    # iter_chunks
+
+    def test__iter_chunks__reassembles(self):
+        documents = [{"_id": i, "v": "x" * 100} for i in range(1000)]
+        data = bson_stream(documents).getvalue()
+        output = list(chunks.iter_chunks(io.BytesIO(data), min_size=1024, max_size=16 * 1024))
+
+        self.assertGreater(len(output), 1)
+        self.assertEqual(b"".join(output), data)
+
+    def test__iter_chunks__content_defined(self):
+        documents = [{"_id": i, "v": "x" * 100} for i in range(1000)]
+        options = {"min_size": 1024, "max_size": 64 * 1024, "mask": 0xf}
+
+        before = list(chunks.iter_chunks(bson_stream(documents), **options))
+        after = list(chunks.iter_chunks(bson_stream([{"_id": -1}] + documents), **options))
+
+        # only the chunk holding the new document changes
+        self.assertGreater(len(set(before) & set(after)), len(before) - 2)
+
+    def test__iter_chunks__not_bson(self):
+        output = list(chunks.iter_chunks(io.BytesIO(b"abcde"), bson=False, max_size=2))
+        self.assertEqual(output, [b"ab", b"cd", b"e"])
+
+
+class TestChunkStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = chunks.ChunkStore(os.path.join(self.directory.name, ".chunks"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # put, get
+
+    def test__put(self):
+        digest = self.store.put(b"data")
+        self.assertEqual(self.store.get(digest), b"data")
+        self.assertEqual(self.store.put(b"data"), digest)
+        self.assertEqual(list(self.store.digests()), [digest])
+
+    # collect
+
+    def test__collect(self):
+        kept = self.store.put(b"kept")
+        removed = self.store.put(b"removed")
+
+        with mock.patch("mongobar.chunks.time.time", return_value=2 ** 40):
+            self.assertEqual(self.store.collect(set([kept])), 1)
+
+        self.assertEqual(list(self.store.digests()), [kept])
+        self.assertFalse(os.path.exists(self.store.chunk_path(removed)))
+
+    def test__collect__grace_period(self):
+        self.store.put(b"recent")
+        self.assertEqual(self.store.collect(set()), 0)
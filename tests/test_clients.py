@@ -0,0 +1,58 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import pymongo
+
+from unittest import mock
+
+from mongobar.clients import ClientRegistry
+from mongobar.connection import Connection
+
+from mongobar.exceptions import ServerConnectionError
+
+
+# Test Client Registry
+
+@mock.patch("mongobar.clients.pymongo.MongoClient")
+class TestClientRegistry(unittest.TestCase):
+
+    # get
+
+    def test__get(self, mongoclient):
+        r = ClientRegistry()
+        c = Connection("default", "localhost", 27017)
+        client = r.get(c, {"host": "localhost", "port": 27017})
+
+        mongoclient.assert_called_with(host="localhost", port=27017)
+        client.admin.command.assert_called_with("ping")
+
+    def test__get__same_identity(self, mongoclient):
+        r = ClientRegistry()
+        c1 = Connection("one", "localhost", 27017)
+        c2 = Connection("two", "localhost", 27017)
+        r.get(c1, {})
+        r.get(c2, {})
+        self.assertEqual(mongoclient.call_count, 1)
+
+    def test__get__different_identity(self, mongoclient):
+        r = ClientRegistry()
+        c1 = Connection("one", "localhost", 27017)
+        c2 = Connection("one", "localhost", 27017, "user", "pass")
+        r.get(c1, {})
+        r.get(c2, {})
+        self.assertEqual(mongoclient.call_count, 2)
+
+    def test__get__raises_ServerConnectionError(self, mongoclient):
+        mongoclient.return_value.admin.command.side_effect = pymongo.errors.PyMongoError()
+        r = ClientRegistry()
+        with self.assertRaises(ServerConnectionError):
+            r.get(Connection("default", "localhost", 27017), {})
+        self.assertEqual(r.clients, {})
+
+    # close
+
+    def test__close(self, mongoclient):
+        r = ClientRegistry()
+        client = r.get(Connection("default", "localhost", 27017), {})
+        r.close()
+        client.close.assert_called_with()
+        self.assertEqual(r.clients, {})
@@ -0,0 +1,92 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import tempfile
+import shutil
+import gzip
+import os
+
+from unittest import mock
+
+import mongobar.compression as compression
+
+from mongobar.exceptions import CodecNotFoundError
+from mongobar.exceptions import CodecNotAvailableError
+
+
+# Test Compression
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = b"document" * 1000
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as file_handle:
+            file_handle.write(self.data)
+        return path
+
+    # get_codec
+
+    def test__get_codec__default(self):
+        codec = compression.get_codec()
+        self.assertEqual(codec.name, "gzip")
+        self.assertIsNone(codec.level)
+
+    def test__get_codec__name_and_level(self):
+        codec = compression.get_codec("zstd:9")
+        self.assertEqual(codec.name, "zstd")
+        self.assertEqual(codec.level, 9)
+
+    def test__get_codec__metadata(self):
+        codec = compression.get_codec({"codec": "lz4", "level": None})
+        self.assertEqual(codec.name, "lz4")
+        self.assertIsNone(codec.level)
+
+    def test__get_codec__raises_CodecNotFoundError(self):
+        with self.assertRaises(CodecNotFoundError):
+            compression.get_codec("brotli")
+
+    # paths
+
+    def test__get_path_codec(self):
+        self.assertEqual(compression.get_path_codec("c1.bson.zst").name, "zstd")
+        self.assertIsNone(compression.get_path_codec("c1.bson"))
+
+    def test__strip_extension(self):
+        self.assertEqual(compression.strip_extension("d1/c1.bson.gz"), "d1/c1.bson")
+        self.assertEqual(compression.strip_extension("d1/c1.bson"), "d1/c1.bson")
+
+    # compress_file, decompress_file
+
+    def test__compress_file__gzip(self):
+        path = self.write("c1.bson")
+        compressed_path = compression.compress_file(compression.GzipCodec(1), path)
+
+        self.assertEqual(compressed_path, path + ".gz")
+        self.assertFalse(os.path.exists(path))
+        with gzip.open(compressed_path, "rb") as file_handle:
+            self.assertEqual(file_handle.read(), self.data)
+
+    def test__compress_file__round_trip(self):
+        for codec in compression.codecs.values():
+            path = self.write("c1.bson")
+            compressed_path = compression.compress_file(codec(), path)
+
+            destination_path = os.path.join(self.directory, "restored.bson")
+            compression.decompress_file(compressed_path, destination_path)
+
+            with open(destination_path, "rb") as file_handle:
+                self.assertEqual(file_handle.read(), self.data)
+
+            os.remove(compressed_path)
+
+    @mock.patch("mongobar.compression.importlib.import_module", side_effect=ImportError)
+    def test__open__missing_package__raises_CodecNotAvailableError(self, *args):
+        path = os.path.join(self.directory, "c1.bson.zst")
+        with self.assertRaises(CodecNotAvailableError):
+            compression.ZstdCodec().open(path, "wb")
@@ -7,6 +7,8 @@ from unittest import mock
 
 from mongobar.config import Config
 from mongobar.connection import Connections
+from mongobar.exceptions import ConnectionNotSetError
+from mongobar.exceptions import ConnectionGroupNotSetError
 
 
 mocked_config_1 = {
@@ -82,3 +84,67 @@ class TestConfig(unittest.TestCase):
         m = Config()
         m.add({"log_file": "/logfile"})
         self.assertEqual(m.log_file, "/logfile")
+
+    # concurrency
+
+    def test__concurrency_property(self):
+        m = Config()
+        self.assertEqual(m.concurrency, 1)
+
+    def test__concurrency_property__minimum(self):
+        m = Config()
+        m.add({"concurrency": 0})
+        self.assertEqual(m.concurrency, 1)
+
+    # compression
+
+    def test__compression_property(self):
+        m = Config()
+        self.assertEqual(m.compression, "gzip")
+
+    def test__compression_property__connection(self):
+        m = Config()
+        m.add({"compression": "lz4"})
+        self.assertEqual(m.compression, "lz4")
+
+        m.add({"connections": {"default": {"compression": "zstd:9"}}})
+        self.assertEqual(m.compression, "zstd:9")
+
+    # retention
+
+    def test__retention_property(self):
+        m = Config()
+        self.assertEqual(m.retention, {})
+
+    def test__retention_property__connection(self):
+        m = Config()
+        m.add({"retention": {"daily": 7, "weekly": 4}})
+        m.add({"connections": {"default": {"retention": {"daily": 3}}}})
+        self.assertEqual(m.retention, {"daily": 3, "weekly": 4})
+
+    # connection_names
+
+    def test__connection_names(self):
+        m = Config()
+        self.assertEqual(m.connection_names(), [])
+
+        m.add(mocked_config_1)
+        m.add(mocked_config_2)
+        self.assertEqual(m.connection_names(), ["custom", "default"])
+
+    def test__connection_names__group(self):
+        m = Config()
+        m.add(mocked_config_2)
+        m.add({"groups": {"prod": ["custom", "default"]}})
+        self.assertEqual(m.connection_names("prod"), ["custom", "default"])
+
+    def test__connection_names__group_not_set(self):
+        m = Config()
+        with self.assertRaises(ConnectionGroupNotSetError):
+            m.connection_names("prod")
+
+    def test__connection_names__group_connection_not_set(self):
+        m = Config()
+        m.add({"groups": {"prod": ["missing"]}})
+        with self.assertRaises(ConnectionNotSetError):
+            m.connection_names("prod")
@@ -9,6 +9,7 @@ from mongobar.connection import Connections
 
 from mongobar.exceptions import ConnectionNotSetError
 from mongobar.exceptions import ConnectionAttributeNotSetError
+from mongobar.exceptions import ConnectionAttributeInvalidError
 
 
 # Test Connection
@@ -89,6 +90,71 @@ class TestConnection(unittest.TestCase):
 
         self.assertEqual(c.socket, "localhost:27017")
 
+    # identity
+
+    def test__identity_property(self):
+        c = Connection(
+            name="default",
+            host="localhost",
+            port=27017,
+            username="username",
+            password="password",
+            authdb="authdb"
+        )
+
+        self.assertEqual(c.identity, ("localhost", 27017, "username", "authdb", None, (), None))
+
+    # replica sets
+
+    def test__seeds_property(self):
+        c = Connection(
+            name="default",
+            host="h1",
+            port=27017,
+            hosts=["h1:27017", "h2:27017"]
+        )
+
+        self.assertEqual(c.seeds, ["h1:27017", "h2:27017"])
+
+    def test__validate__read_preference(self):
+        c = Connection(
+            name="default",
+            host="localhost",
+            port=27017,
+            read_preference="secondaryPreferred"
+        )
+
+        self.assertTrue(c.validate())
+
+    def test__validate__invalid_read_preference__raises__ConnectionAttributeInvalidError(self):
+        c = Connection(
+            name="default",
+            host="localhost",
+            port=27017,
+            read_preference="secondaries"
+        )
+
+        with self.assertRaises(ConnectionAttributeInvalidError):
+            c.validate()
+
+    def test__get__replica_set(self):
+        c = Connection(
+            name="default",
+            host="h1",
+            port=27017,
+            replicaset="rs0",
+            hosts=["h2:27017"],
+            read_preference="secondary"
+        )
+
+        self.assertEqual(c.get(), {
+            "host": "h1",
+            "port": 27017,
+            "replicaset": "rs0",
+            "hosts": ["h2:27017"],
+            "read_preference": "secondary"
+        })
+
     # auth
 
     def test__auth__returns_False(self):
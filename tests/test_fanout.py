@@ -0,0 +1,108 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import asyncio
+
+from unittest import mock
+
+from mongobar.fanout import FanoutScheduler
+
+
+def python_job(connection, host, code):
+    return {
+        "connection": connection,
+        "host": host,
+        "command": [sys.executable, "-c", code]
+    }
+
+
+class FakeProcess(object):
+
+    def __init__(self, tracker, host):
+        self.tracker = tracker
+        self.host = host
+        self.returncode = 0
+
+    async def communicate(self):
+        self.tracker.start(self.host)
+        await asyncio.sleep(0.01)
+        self.tracker.stop(self.host)
+        return b"\x1b[36mBackup foo-bar created!\x1b[0m\n", None
+
+
+class ConcurrencyTracker(object):
+
+    def __init__(self):
+        self.running = {}
+        self.peak = 0
+        self.host_peak = 0
+
+    def start(self, host):
+        self.running[host] = self.running.get(host, 0) + 1
+        self.peak = max(self.peak, sum(self.running.values()))
+        self.host_peak = max(self.host_peak, self.running[host])
+
+    def stop(self, host):
+        self.running[host] -= 1
+
+    async def create_subprocess_exec(self, *command, **kwargs):
+        return FakeProcess(self, command[0])
+
+
+# Test FanoutScheduler
+
+class TestFanoutScheduler(unittest.TestCase):
+
+    def test__run(self):
+        scheduler = FanoutScheduler()
+        results = scheduler.run([
+            python_job("c1", "h1", "print('Backup foo-bar created!')"),
+            python_job("c2", "h2", "import sys; print('boom'); sys.exit(3)")
+        ])
+
+        self.assertEqual([r["connection"] for r in results], ["c1", "c2"])
+
+        self.assertTrue(results[0]["success"])
+        self.assertEqual(results[0]["backup"], "foo-bar")
+
+        self.assertFalse(results[1]["success"])
+        self.assertEqual(results[1]["returncode"], 3)
+        self.assertIsNone(results[1]["backup"])
+        self.assertEqual(results[1]["output"].strip(), "boom")
+
+    def test__run__missing_command(self):
+        scheduler = FanoutScheduler()
+        results = scheduler.run([{
+            "connection": "c1",
+            "host": "h1",
+            "command": ["/nonexistent/mongobar"]
+        }])
+        self.assertFalse(results[0]["success"])
+        self.assertIsNone(results[0]["returncode"])
+
+    def test__run__concurrency_limits(self):
+        tracker = ConcurrencyTracker()
+        jobs = []
+        for i in range(12):
+            jobs.append({
+                "connection": "c{}".format(i),
+                "host": "h{}".format(i % 3),
+                "command": ["h{}".format(i % 3)]
+            })
+
+        scheduler = FanoutScheduler(concurrency=2, host_concurrency=1)
+        with mock.patch("mongobar.fanout.asyncio.create_subprocess_exec", tracker.create_subprocess_exec):
+            results = scheduler.run(jobs)
+
+        self.assertEqual(tracker.peak, 2)
+        self.assertEqual(tracker.host_peak, 1)
+        self.assertTrue(all(r["backup"] == "foo-bar" for r in results))
+
+    def test__run__host_concurrency(self):
+        tracker = ConcurrencyTracker()
+        jobs = [{"connection": "c{}".format(i), "host": "h1", "command": ["h1"]} for i in range(6)]
+
+        scheduler = FanoutScheduler(concurrency=10, host_concurrency=3)
+        with mock.patch("mongobar.fanout.asyncio.create_subprocess_exec", tracker.create_subprocess_exec):
+            scheduler.run(jobs)
+
+        self.assertEqual(tracker.host_peak, 3)
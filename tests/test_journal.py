@@ -0,0 +1,42 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import tempfile
+
+from mongobar.journal import Journal
+
+
+# Test Journal
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = Journal(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test__completed__no_journal(self):
+        self.assertEqual(self.journal.completed(), set())
+
+    def test__add(self):
+        self.journal.add("d1")
+        self.journal.add("d2.c1")
+        self.assertEqual(Journal(self.directory.name).completed(), set(["d1", "d2.c1"]))
+
+    def test__completed__ignores_partial_line(self):
+        with open(self.journal.path, "w") as file_handle:
+            file_handle.write("d1\nd2")
+        self.assertEqual(self.journal.completed(), set(["d1"]))
+
+    def test__run(self):
+        self.assertEqual(self.journal.run("d1", lambda: 5), 5)
+        self.assertEqual(self.journal.completed(), set(["d1"]))
+
+    def test__run__failure_not_recorded(self):
+        def job():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            self.journal.run("d1", job)
+        self.assertEqual(self.journal.completed(), set())
@@ -5,7 +5,14 @@ import logging
 import os
 import subprocess
 import datetime
+import tempfile
+import gzip
+import json
+import copy
 import pymongo
+import bson
+import bson.timestamp
+import bson.objectid
 
 from unittest import mock
 
@@ -148,6 +155,30 @@ class TestMongobar(unittest.TestCase):
     def setUpClass(cls):
         logging.getLogger("mongobar").addHandler(logging.NullHandler())
 
+    def setUp(self):
+        mongobar.clients.registry.close()
+
+        catalog_patcher = mock.patch("mongobar.mongobar.Catalog")
+        self.catalog = catalog_patcher.start()
+        self.addCleanup(catalog_patcher.stop)
+
+        oplog_patcher = mock.patch("mongobar.mongobar.native.oplog_timestamp", return_value=None)
+        self.oplog_timestamp = oplog_patcher.start()
+        self.addCleanup(oplog_patcher.stop)
+
+        # backup directories are not created, so completed namespaces are not journaled
+        journal_patcher = mock.patch("mongobar.mongobar.Journal.add")
+        self.journal_add = journal_patcher.start()
+        self.addCleanup(journal_patcher.stop)
+
+        # backups add keys to the metadata returned by generate_metadata
+        for constant in [MOCKED_BACKUP_METADATA_1_DB, MOCKED_BACKUP_METADATA_3_DBS]:
+            self.addCleanup(
+                lambda c, data: (c.clear(), c.update(data)),
+                constant,
+                copy.deepcopy(constant)
+            )
+
     # generate_backup_name
 
     @mock.patch("mongobar.mongobar.pkgutil.get_data", side_effect=[b"foo", b"bar"])
@@ -225,6 +256,62 @@ class TestMongobar(unittest.TestCase):
         with self.assertRaises(mongobar.exceptions.ServerConnectionError):
             m.create_pymongo_client()
 
+    def test__create_pymongo_client__replica_set_options(self, mongoclient):
+        m = mongobar.Mongobar()
+        m.config.add({
+            "connections": {
+                "default": {
+                    "host": "h1",
+                    "port": 27017,
+                    "replicaset": "rs0",
+                    "hosts": ["h2:27017", "h3:27017"],
+                    "read_preference": "secondaryPreferred"
+                }
+            }
+        })
+        m.create_pymongo_client()
+        mongoclient.assert_called_with(
+            host=["h1:27017", "h2:27017", "h3:27017"],
+            port=27017,
+            replicaset="rs0",
+            readPreference="secondaryPreferred"
+        )
+
+    # tool_command
+
+    def test__tool_command__replica_set(self, mongoclient):
+        m = mongobar.Mongobar()
+        m.config.add({
+            "connections": {
+                "default": {
+                    "host": "h1",
+                    "port": 27017,
+                    "replicaset": "rs0",
+                    "hosts": ["h2:27017"],
+                    "read_preference": "secondary"
+                }
+            }
+        })
+
+        self.assertEqual(m.tool_command("mongodump"), [
+            "mongodump",
+            "--host", "rs0/h1:27017,h2:27017",
+            "--readPreference", "secondary"
+        ])
+        self.assertEqual(m.tool_command("mongorestore"), [
+            "mongorestore",
+            "--host", "rs0/h1:27017,h2:27017"
+        ])
+
+    def test__create_pymongo_client__reuses_client(self, mongoclient):
+        m = mongobar.Mongobar()
+        client = m.create_pymongo_client()
+
+        self.assertIs(m.create_pymongo_client(), client)
+        self.assertIs(mongobar.Mongobar().create_pymongo_client(), client)
+        self.assertEqual(mongoclient.call_count, 1)
+        client.admin.command.assert_called_once_with("ping")
+
     # generate_metadata
 
     def test__generate_metadata__databases_arg(self, mongoclient):
@@ -246,6 +333,38 @@ class TestMongobar(unittest.TestCase):
         metadata = m.generate_metadata(databases=["d1", "d2", "d3", "local"])
         self.assertNotIn("local", metadata["databases"])
 
+    def test__generate_metadata__fast_metadata(self, mongoclient):
+        m = mongobar.Mongobar()
+        m.config.add({"fast_metadata": True})
+
+        stats = {"count": 5, "size": 100, "storageSize": 50}
+        with mock.patch.object(MockedMongoDatabase, "command", create=True, return_value=stats):
+            with mock.patch("mongobar.Mongobar.run_jobs", side_effect=lambda jobs, c=None: [j() for j in jobs]) as run_jobs:
+                metadata = m.generate_metadata(databases=["d1", "d2"])
+
+        # collections are scanned concurrently even with the default concurrency
+        self.assertEqual([c[0][1] for c in run_jobs.call_args_list], [8, 8])
+        self.assertEqual(len(run_jobs.call_args_list[1][0][0]), 6)
+
+        self.assertEqual([d["name"] for d in metadata["databases"]], ["d1", "d2"])
+        self.assertEqual([c["name"] for c in metadata["databases"][1]["collections"]], ["c1", "c2", "c3"])
+        self.assertEqual(metadata["databases"][0]["collections"][0], {
+            "name": "c1",
+            "document_count": 5,
+            "size": 100,
+            "storage_size": 50
+        })
+
+    def test__generate_metadata__fast_metadata__stats_error(self, mongoclient):
+        m = mongobar.Mongobar()
+        m.config.add({"fast_metadata": True})
+
+        error = pymongo.errors.OperationFailure("ns not found")
+        with mock.patch.object(MockedMongoDatabase, "command", create=True, side_effect=error):
+            metadata = m.generate_metadata(databases=["d1"])
+
+        self.assertEqual(metadata["databases"][0]["collections"][0]["document_count"], 0)
+
     # write_metadata
 
     @mock.patch("builtins.open", new_callable=mock.mock_open)
@@ -305,7 +424,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup(self, check_output, *args):
         m = mongobar.Mongobar()
         m.backup()
@@ -319,7 +438,6 @@ class TestMongobar(unittest.TestCase):
                 "--port", "27017",
                 "--db", "d1",
                 "--out", directory,
-                "--quiet",
                 "--gzip"
             ]),
             check_output.call_args_list
@@ -331,7 +449,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup__create_root_directory(self, *args):
         m = mongobar.Mongobar()
         m.backup()
@@ -343,7 +461,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup__create_host_directory(self, *args):
         m = mongobar.Mongobar()
         m.backup()
@@ -355,7 +473,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup__message_arg(self, *args):
         m = mongobar.Mongobar()
         m.backup(message="foo")
@@ -374,7 +492,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup__auth_args(self, *args):
 
         m = mongobar.Mongobar()
@@ -401,7 +519,6 @@ class TestMongobar(unittest.TestCase):
                 "--authenticationDatabase", "authdb",
                 "--db", "d1",
                 "--out", os.path.join(m.config.connection_dir, "foo-bar"),
-                "--quiet",
                 "--gzip"
             ]),
             args[0].call_args_list
@@ -413,7 +530,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup__db_does_not_exist__command_called(self, check_output, *args):
 
         m = mongobar.Mongobar()
@@ -426,7 +543,6 @@ class TestMongobar(unittest.TestCase):
                 "--port", "27017",
                 "--db", "foobar",
                 "--out", os.path.join(m.config.connection_dir, "foo-bar"),
-                "--quiet",
                 "--gzip"
             ]),
             check_output.call_args_list
@@ -438,7 +554,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output", side_effect=[subprocess.CalledProcessError(1, "")])
+    @mock.patch("mongobar.Mongobar.stream_command", side_effect=[subprocess.CalledProcessError(1, "")])
     def test__backup__db_arg__raises_CalledProcessError(self, check_output, *args):
         m = mongobar.Mongobar()
         with self.assertRaises(mongobar.exceptions.CommandError):
@@ -450,7 +566,7 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup__collection_arg(self, check_output, *args):
 
         m = mongobar.Mongobar()
@@ -464,7 +580,6 @@ class TestMongobar(unittest.TestCase):
                 "--db", "d1",
                 "--collection", "c1",
                 "--out", os.path.join(m.config.connection_dir, "foo-bar"),
-                "--quiet",
                 "--gzip"
             ]),
             check_output.call_args_list
@@ -476,7 +591,29 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__collections_arg__one_command_per_database(self, check_output, *args):
+
+        m = mongobar.Mongobar()
+        m.backup(databases=["d1"], collections=["c1", "c2"])
+
+        check_output.assert_called_once_with([
+            "mongodump",
+            "--host", "localhost",
+            "--port", "27017",
+            "--db", "d1",
+            "--excludeCollection", "c3",
+            "--out", os.path.join(m.config.connection_dir, "foo-bar"),
+            "--gzip"
+        ])
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.stream_command")
     def test__backup__collection_does_not_exist__command_called(self, check_output, *args):
 
         m = mongobar.Mongobar()
@@ -490,7 +627,6 @@ class TestMongobar(unittest.TestCase):
                 "--db", "d1",
                 "--collection", "foobar",
                 "--out", os.path.join(m.config.connection_dir, "foo-bar"),
-                "--quiet",
                 "--gzip"
             ]),
             check_output.call_args_list
@@ -503,17 +639,255 @@ class TestMongobar(unittest.TestCase):
     @mock.patch("mongobar.mongobar.create_directory", return_value=True)
     @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
     @mock.patch("mongobar.Mongobar.write_metadata")
-    @mock.patch("mongobar.mongobar.subprocess.check_output", side_effect=[subprocess.CalledProcessError(1, "")])
+    @mock.patch("mongobar.Mongobar.stream_command", side_effect=[subprocess.CalledProcessError(1, "")])
     def test__backup__collection_arg__raises_CalledProcessError(self, check_output, *args):
         m = mongobar.Mongobar()
         with self.assertRaises(mongobar.exceptions.CommandError):
             m.backup(collections=["foobar"])
 
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__concurrency(self, check_output, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"concurrency": 3})
+        m.backup(databases=["d1", "d2", "d3"])
+
+        self.assertEqual(check_output.call_count, 3)
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.stream_command", side_effect=subprocess.CalledProcessError(1, ""))
+    def test__backup__concurrency__raises_CommandError(self, check_output, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"concurrency": 3})
+        with self.assertRaises(mongobar.exceptions.CommandError):
+            m.backup(databases=["d1", "d2", "d3"])
+
+    @mock.patch("mongobar.mongobar.os.makedirs")
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.mongobar.native.dump_collection", return_value=3)
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__native_engine(self, check_output, dump_collection, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"engine": "native"})
+
+        with mock.patch.object(MockedMongoDatabase, "list_collections", create=True, return_value=[
+            {"name": "c1", "type": "collection", "options": {}},
+            {"name": "v1", "type": "view", "options": {}},
+            {"name": "system.js", "type": "collection", "options": {}}
+        ]):
+            m.backup(databases=["d1"])
+
+        check_output.assert_not_called()
+        self.assertEqual(dump_collection.call_count, 1)
+        self.assertEqual(dump_collection.call_args[0][1], "c1")
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__records_oplog_position(self, check_output, write_metadata, *args):
+        self.oplog_timestamp.return_value = bson.timestamp.Timestamp(100, 2)
+
+        m = mongobar.Mongobar()
+        m.backup()
+
+        metadata = write_metadata.call_args[0][1]
+        self.assertEqual(metadata["type"], "full")
+        self.assertEqual(metadata["oplog"], {"start": None, "end": {"t": 100, "i": 2}})
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.compress_backup")
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__compression(self, check_output, compress_backup, write_metadata, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"compression": "zstd:9"})
+        m.backup()
+
+        directory = os.path.join(m.config.connection_dir, "foo-bar")
+
+        self.assertIn(
+            mock.call([
+                "mongodump",
+                "--host", "localhost",
+                "--port", "27017",
+                "--db", "d1",
+                "--out", directory
+            ]),
+            check_output.call_args_list
+        )
+        self.assertEqual(compress_backup.call_args[0][0], directory)
+        self.assertEqual(compress_backup.call_args[0][1].name, "zstd")
+
+        metadata = write_metadata.call_args[0][1]
+        self.assertEqual(metadata["compression"], {"codec": "zstd", "level": 9})
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.read_metadata", return_value={"oplog": {"start": None, "end": {"t": 100, "i": 2}}})
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.mongobar.native.dump_oplog", return_value=10)
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__incremental(self, check_output, dump_oplog, write_metadata, *args):
+        self.oplog_timestamp.side_effect = [
+            bson.timestamp.Timestamp(200, 1),
+            bson.timestamp.Timestamp(50, 1)
+        ]
+
+        m = mongobar.Mongobar()
+        m.backup(incremental=True, parent="parent-backup")
+
+        check_output.assert_not_called()
+
+        metadata = write_metadata.call_args[0][1]
+        self.assertEqual(metadata["type"], "incremental")
+        self.assertEqual(metadata["parent"], "parent-backup")
+        self.assertEqual(metadata["oplog"], {
+            "start": {"t": 100, "i": 2},
+            "end": {"t": 200, "i": 1}
+        })
+
+        path = os.path.join(m.config.connection_dir, "foo-bar", "oplog.bson.gz")
+        dump_oplog.assert_called_with(
+            mock.ANY,
+            path,
+            bson.timestamp.Timestamp(100, 2),
+            bson.timestamp.Timestamp(200, 1),
+            [],
+            1000,
+            mock.ANY
+        )
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.read_metadata", return_value={"oplog": {"start": None, "end": {"t": 100, "i": 2}}})
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.mongobar.native.dump_oplog", return_value=10)
+    def test__backup__incremental__oplog_gap__raises_IncrementalBackupError(self, *args):
+        self.oplog_timestamp.side_effect = [
+            bson.timestamp.Timestamp(200, 1),
+            bson.timestamp.Timestamp(150, 1)
+        ]
+
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.IncrementalBackupError):
+            m.backup(incremental=True, parent="parent-backup")
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.read_metadata", return_value={"oplog": {"start": None, "end": None}})
+    def test__backup__incremental__no_parent_oplog__raises_IncrementalBackupError(self, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.IncrementalBackupError):
+            m.backup(incremental=True, parent="parent-backup")
+
+    # partial backups
+
+    @mock.patch("mongobar.mongobar.os.makedirs")
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.mongobar.native.dump_collection", return_value=2)
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__partial(self, check_output, dump_collection, write_metadata, *args):
+        m = mongobar.Mongobar()
+        filters = {
+            "*": {"a": 1},
+            "d1.c2": {"_id": {"$gte": bson.objectid.ObjectId("5a0000000000000000000000")}}
+        }
+
+        with mock.patch.object(MockedMongoDatabase, "list_collections", create=True, return_value=[
+            {"name": "c1", "type": "collection", "options": {}},
+            {"name": "c2", "type": "collection", "options": {}}
+        ]):
+            m.backup(databases=["d1"], filters=filters, sample=0.5)
+
+        # mongodump can not sample, partial backups are read with cursors
+        check_output.assert_not_called()
+        queries = [(c[0][1], c[0][6], c[0][7]) for c in dump_collection.call_args_list]
+        self.assertEqual(queries, [
+            ("c1", {"a": 1}, 0.5),
+            ("c2", filters["d1.c2"], 0.5)
+        ])
+
+        metadata = write_metadata.call_args[0][1]
+        self.assertEqual(metadata["partial"], {
+            "filters": {
+                "*": {"a": 1},
+                "d1.c2": {"_id": {"$gte": {"$oid": "5a0000000000000000000000"}}}
+            },
+            "sample": 0.5
+        })
+        counts = [c["document_count"] for c in metadata["databases"][0]["collections"]]
+        self.assertEqual(counts, [2, 2, 1])
+
+    def test__backup__partial__archive_storage__raises_PartialBackupError(self, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"storage": "archive"})
+        with self.assertRaises(mongobar.exceptions.PartialBackupError):
+            m.backup(sample=0.1)
+
+    def test__backup__partial__incremental__raises_PartialBackupError(self, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.PartialBackupError):
+            m.backup(filters={"*": {"a": 1}}, incremental=True)
+
+    def test__backup__partial__invalid_sample__raises_PartialBackupError(self, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.PartialBackupError):
+            m.backup(sample=0)
+
+    # run_commands
+
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__run_commands__returns_durations(self, check_output, *args):
+        m = mongobar.Mongobar()
+        durations = m.run_commands([["a"], ["b"], ["c"]], concurrency=2)
+        self.assertEqual(len(durations), 3)
+        self.assertEqual(check_output.call_count, 3)
+
+    @mock.patch("mongobar.Mongobar.stream_command", side_effect=subprocess.CalledProcessError(1, ""))
+    def test__run_commands__stops_on_failure(self, check_output, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.CommandError):
+            m.run_commands([["a"]] * 10, concurrency=1)
+        self.assertEqual(check_output.call_count, 1)
+
     # restore
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists", return_value=False)
     def test__restore__raises_BackupNotFoundError(self, *args):
         m = mongobar.Mongobar()
@@ -522,7 +896,7 @@ class TestMongobar(unittest.TestCase):
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore(self, *args):
         m = mongobar.Mongobar()
@@ -530,22 +904,34 @@ class TestMongobar(unittest.TestCase):
 
         directory = os.path.join(m.config.connection_dir, "d1")
 
-        self.assertIn(
-            mock.call([
-                "mongorestore",
-                "--host", "localhost",
-                "--port", "27017",
-                "--nsInclude", "d1.*",
-                "--drop",
-                "--dir", directory,
-                "--gzip"
-            ]),
-            args[1].call_args_list
-        )
+        args[1].assert_called_once_with([
+            "mongorestore",
+            "--host", "localhost",
+            "--port", "27017",
+            "--nsInclude", "d1.*",
+            "--nsInclude", "d2.*",
+            "--nsInclude", "d3.*",
+            "--drop",
+            "--dir", directory,
+            "--gzip",
+            "--noIndexRestore"
+        ])
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
+    @mock.patch("mongobar.mongobar.os.path.exists")
+    def test__restore__concurrency(self, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"concurrency": 4})
+        m.restore("backup", databases=["d1"])
+
+        command = args[1].call_args[0][0]
+        self.assertEqual(command[-2:], ["--numParallelCollections", "4"])
+
+    @mock.patch("mongobar.Mongobar.backup")
+    @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__databases_arg__raises_DatabaseNotFoundInBackupError(self, *args):
         m = mongobar.Mongobar()
@@ -554,7 +940,7 @@ class TestMongobar(unittest.TestCase):
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__collections_arg__raises_CollectionNotFoundInBackupError(self, *args):
         m = mongobar.Mongobar()
@@ -563,7 +949,7 @@ class TestMongobar(unittest.TestCase):
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__destination_databases_arg__raises_DestinationDatabasesLengthError(self, *args):
         m = mongobar.Mongobar()
@@ -572,7 +958,7 @@ class TestMongobar(unittest.TestCase):
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__authentication_options(self, *args):
         m = mongobar.Mongobar()
@@ -600,37 +986,43 @@ class TestMongobar(unittest.TestCase):
                 "-p", "pass",
                 "--authenticationDatabase", "authdb",
                 "--nsInclude", "d1.*",
+                "--nsInclude", "d2.*",
+                "--nsInclude", "d3.*",
                 "--drop",
                 "--dir", directory,
-                "--gzip"
+                "--gzip",
+                "--noIndexRestore"
             ]),
             args[1].call_args_list
         )
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__destination_databases_arg(self, *args):
         m = mongobar.Mongobar()
-        m.restore("backup", databases=["d1"], destination_databases=["destination"])
+        m.restore("backup", databases=["d1", "d2"], destination_databases=["destination", "d2"])
 
-        directory = os.path.expanduser("~/.mongobar_backups/localhost:27017/backup/d1")
+        directory = os.path.expanduser("~/.mongobar_backups/localhost:27017/backup")
 
-        args[1].assert_called_with([
+        args[1].assert_called_once_with([
             "mongorestore",
             "--host", "localhost",
             "--port", "27017",
-            "--db", "destination",
             "--nsInclude", "d1.*",
+            "--nsInclude", "d2.*",
+            "--nsFrom", "d1.$collection$",
+            "--nsTo", "destination.$collection$",
             "--drop",
             "--dir", directory,
-            "--gzip"
+            "--gzip",
+            "--noIndexRestore"
         ])
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output", side_effect=[subprocess.CalledProcessError(1, "")])
+    @mock.patch("mongobar.Mongobar.stream_command", side_effect=[subprocess.CalledProcessError(1, "")])
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__raises_CommandError(self, *args):
         m = mongobar.Mongobar()
@@ -639,28 +1031,31 @@ class TestMongobar(unittest.TestCase):
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output")
+    @mock.patch("mongobar.Mongobar.stream_command")
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__collection_arg(self, *args):
         m = mongobar.Mongobar()
-        m.restore("backup", collections=["c1"])
+        m.restore("backup", collections=["c1", "c2"])
 
-        self.assertIn(
-            mock.call([
-                "mongorestore",
-                "--host", "localhost",
-                "--port", "27017",
-                "--nsInclude", "d1.c1",
-                "--drop",
-                "--dir", os.path.join(m.config.connection_dir, "backup"),
-                "--gzip"
-            ]),
-            args[1].call_args_list
-        )
+        args[1].assert_called_once_with([
+            "mongorestore",
+            "--host", "localhost",
+            "--port", "27017",
+            "--nsInclude", "d1.c1",
+            "--nsInclude", "d1.c2",
+            "--nsInclude", "d2.c1",
+            "--nsInclude", "d2.c2",
+            "--nsInclude", "d3.c1",
+            "--nsInclude", "d3.c2",
+            "--drop",
+            "--dir", os.path.join(m.config.connection_dir, "backup"),
+            "--gzip",
+            "--noIndexRestore"
+        ])
 
     @mock.patch("mongobar.Mongobar.backup")
     @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
-    @mock.patch("mongobar.mongobar.subprocess.check_output", side_effect=[subprocess.CalledProcessError(1, "")])
+    @mock.patch("mongobar.Mongobar.stream_command", side_effect=[subprocess.CalledProcessError(1, "")])
     @mock.patch("mongobar.mongobar.os.path.exists")
     def test__restore__collection_arg__raises_CommandError(self, *args):
         m = mongobar.Mongobar()
@@ -668,6 +1063,107 @@ class TestMongobar(unittest.TestCase):
         with self.assertRaises(mongobar.exceptions.CommandError):
             m.restore("backup", collections=["c1"])
 
+    @mock.patch("mongobar.Mongobar.backup")
+    @mock.patch("mongobar.Mongobar.read_metadata", return_value={
+        "host": "localhost",
+        "port": 27017,
+        "date": datetime.datetime.today().isoformat(),
+        "databases": [{
+            "name": "d1",
+            "collections": [
+                {"name": "c1", "document_count": 1},
+                {"name": "c2", "document_count": 100},
+                {"name": "c3", "document_count": 10}
+            ]
+        }]
+    })
+    @mock.patch("mongobar.Mongobar.stream_command")
+    @mock.patch("mongobar.mongobar.os.path.exists")
+    def test__restore__schedule_arg(self, *args):
+        m = mongobar.Mongobar()
+        m.restore("backup", schedule=True)
+
+        commands = [c[0][0] for c in args[1].call_args_list]
+        namespaces = [c[c.index("--nsInclude") + 1] for c in commands]
+        self.assertEqual(namespaces, ["d1.c2", "d1.c3", "d1.c1"])
+
+    @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
+    @mock.patch("mongobar.mongobar.native.restore_collection", return_value=1)
+    @mock.patch("mongobar.Mongobar.stream_command")
+    @mock.patch("mongobar.mongobar.os.path.exists")
+    def test__restore__native_engine(self, exists, check_output, restore_collection, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"engine": "native"})
+        m.restore("backup", databases=["d2"], collections=["c1"], destination_databases=["d3"])
+
+        check_output.assert_not_called()
+        self.assertEqual(restore_collection.call_count, 1)
+
+        database = m.create_pymongo_client()["d3"]
+        database.get_collection.assert_called_with("c1")
+
+        path = os.path.join(m.config.connection_dir, "backup", "d2", "c1.bson.gz")
+        self.assertEqual(restore_collection.call_args[0][1], path)
+
+    @mock.patch("mongobar.Mongobar.read_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.mongobar.native.read_collection_metadata", return_value={
+        "options": {"capped": True, "size": 4096}, "indexes": []
+    })
+    @mock.patch("mongobar.mongobar.native.restore_collection", return_value=1)
+    @mock.patch("mongobar.mongobar.os.path.exists", side_effect=lambda p: not p.endswith("c2.bson.gz"))
+    def test__restore__native_engine__skips_collections_without_dump_file(self, exists, restore_collection, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"engine": "native", "indexes": False})
+        m.restore("backup")
+
+        paths = sorted([os.path.basename(c[0][1]) for c in restore_collection.call_args_list])
+        self.assertEqual(paths, ["c1.bson.gz", "c3.bson.gz"])
+        for call in restore_collection.call_args_list:
+            self.assertEqual(call[0][4], {"capped": True, "size": 4096})
+
+    @mock.patch("mongobar.Mongobar.stream_command")
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    def test__restore__incremental_chain(self, exists, check_output, *args):
+        base = dict(MOCKED_BACKUP_METADATA_1_DB, type="full")
+        incrementals = {
+            "i1": dict(MOCKED_BACKUP_METADATA_1_DB, type="incremental", parent="base"),
+            "i2": dict(MOCKED_BACKUP_METADATA_1_DB, type="incremental", parent="i1")
+        }
+
+        m = mongobar.Mongobar()
+        with mock.patch.object(m, "read_metadata", side_effect=lambda n: incrementals.get(n, base)):
+            m.restore("i2")
+
+        commands = [c[0][0] for c in check_output.call_args_list]
+        self.assertEqual(len(commands), 3)
+        self.assertIn(os.path.join(m.config.connection_dir, "base"), commands[0])
+        for command, name in zip(commands[1:], ["i1", "i2"]):
+            self.assertIn("--oplogReplay", command)
+            self.assertIn(os.path.join(m.config.connection_dir, name), command)
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    def test__restore__incremental__destination_databases__raises_IncrementalBackupError(self, *args):
+        metadata = dict(MOCKED_BACKUP_METADATA_1_DB, type="incremental", parent="base")
+
+        m = mongobar.Mongobar()
+        with mock.patch.object(m, "read_metadata", return_value=metadata):
+            with self.assertRaises(mongobar.exceptions.IncrementalBackupError):
+                m.restore("i1", destination_databases=["foo"])
+
+    @mock.patch("mongobar.Mongobar.stream_command")
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    def test__restore__incremental__databases__raises_IncrementalBackupError(self, exists, check_output, *args):
+        metadata = dict(MOCKED_BACKUP_METADATA_3_DBS, type="incremental", parent="base")
+
+        m = mongobar.Mongobar()
+        with mock.patch.object(m, "read_metadata", return_value=metadata):
+            with self.assertRaises(mongobar.exceptions.IncrementalBackupError):
+                m.restore("i1", databases=["d1"])
+            with self.assertRaises(mongobar.exceptions.IncrementalBackupError):
+                m.restore("i1", collections=["c1"])
+
+        check_output.assert_not_called()
+
     # get connection directories
 
     @mock.patch("mongobar.mongobar.os.path.exists", return_value=False)
@@ -684,18 +1180,15 @@ class TestMongobar(unittest.TestCase):
         args[0].assert_called_with(m.config.root)
 
     @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
-    @mock.patch("mongobar.mongobar.get_directories", side_effect=[["host"],["db"]])
+    @mock.patch("mongobar.mongobar.get_directories", return_value=["host", ".trash"])
     def test__get_connection_directories__return_names_and_counts(self, *args):
+        self.catalog.return_value.counts.return_value = {"host": 2}
+
         m = mongobar.Mongobar()
-        m.get_connection_directories(count=True)
+        directories = m.get_connection_directories(count=True)
 
-        self.assertEqual(
-            args[0].call_args_list,
-            [
-                mock.call(m.config.root),
-                mock.call(os.path.join(m.config.root, "host"))
-            ]
-        )
+        self.assertEqual(directories, [("host", 2)])
+        self.catalog.return_value.sync.assert_called_once_with("host")
 
     # list backups
 
@@ -713,19 +1206,890 @@ class TestMongobar(unittest.TestCase):
         m = mongobar.Mongobar()
         self.assertEqual(m.get_backups(), [])
 
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    def test__list_backups(self, *args):
+        m = mongobar.Mongobar()
+        m.list_backups(limit=5)
+
+        self.catalog.assert_called_with(m.config.root)
+        self.catalog.return_value.sync.assert_called_with("localhost:27017")
+        self.catalog.return_value.backups.assert_called_with("localhost:27017", 5, True)
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=False)
+    def test__list_backups__directory_does_not_exist__return_empty_list(self, *args):
+        m = mongobar.Mongobar()
+        self.assertEqual(m.list_backups(), [])
+
     # remove backup
 
-    @mock.patch("mongobar.mongobar.shutil.rmtree")
+    @mock.patch("mongobar.mongobar.Trash")
     @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
     def test__remove_backup(self, *args):
         m = mongobar.Mongobar()
         m.remove_backup("foo")
         backup_directory = m.config.connection_dir
-        args[1].assert_called_with(os.path.join(backup_directory, "foo"))
+        args[1].assert_called_with(m.config.trash_dir)
+        args[1].return_value.move.assert_called_with(os.path.join(backup_directory, "foo"))
+        self.catalog.return_value.remove.assert_called_with("localhost:27017", "foo")
 
     @mock.patch("mongobar.mongobar.os.path.exists", return_value=False)
-    @mock.patch("mongobar.mongobar.shutil.rmtree")
+    @mock.patch("mongobar.mongobar.Trash")
     def test__remove_backup__raises_BackupNotFoundError(self, *args):
         m = mongobar.Mongobar()
         with self.assertRaises(mongobar.exceptions.BackupNotFoundError):
             m.remove_backup("foo")
+        args[0].return_value.move.assert_not_called()
+
+    @mock.patch("mongobar.mongobar.Trash")
+    def test__collect_trash(self, *args):
+        args[0].return_value.collect.return_value = 3
+        m = mongobar.Mongobar()
+        m.config.add({"gc_workers": 8, "gc_rate": 100})
+        self.assertEqual(m.collect_trash(), 3)
+        args[0].return_value.collect.assert_called_with(8, 100.0)
+
+
+# Test Deduplicated Storage
+
+    # resume
+
+    def incomplete_metadata(self):
+        metadata = copy.deepcopy(MOCKED_BACKUP_METADATA_3_DBS)
+        metadata.update({
+            "complete": False,
+            "type": "full",
+            "targets": {"databases": None, "collections": None},
+            "oplog": {"start": None, "end": None},
+            "engine": "tools",
+            "storage": "directory",
+            "compression": {"codec": "gzip", "level": None}
+        })
+        return metadata
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata")
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.mongobar.Journal.completed", return_value={"d1"})
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__resume(self, check_output, completed, write_metadata, generate_metadata, *args):
+        m = mongobar.Mongobar()
+        with mock.patch("mongobar.Mongobar.read_metadata", return_value=self.incomplete_metadata()):
+            backup_name = m.backup(resume="foo-bar")
+
+        self.assertEqual(backup_name, "foo-bar")
+        generate_metadata.assert_not_called()
+
+        databases = [c[0][0][c[0][0].index("--db") + 1] for c in check_output.call_args_list]
+        self.assertEqual(databases, ["d2", "d3"])
+        self.assertEqual(self.journal_add.call_args_list, [mock.call("d2"), mock.call("d3")])
+
+        metadata = write_metadata.call_args[0][1]
+        self.assertTrue(metadata["complete"])
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    def test__backup__resume__complete__raises_ResumeError(self, *args):
+        metadata = self.incomplete_metadata()
+        metadata["complete"] = True
+
+        m = mongobar.Mongobar()
+        with mock.patch("mongobar.Mongobar.read_metadata", return_value=metadata):
+            with self.assertRaises(mongobar.exceptions.ResumeError):
+                m.backup(resume="foo-bar")
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    def test__backup__resume__settings_changed__raises_ResumeError(self, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"engine": "native"})
+        with mock.patch("mongobar.Mongobar.read_metadata", return_value=self.incomplete_metadata()):
+            with self.assertRaises(mongobar.exceptions.ResumeError):
+                m.backup(resume="foo-bar")
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_3_DBS)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.stream_command", side_effect=[b"", subprocess.CalledProcessError(1, "")])
+    def test__backup__failure__leaves_backup_incomplete(self, check_output, write_metadata, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.CommandError):
+            m.backup()
+
+        metadata = write_metadata.call_args[0][1]
+        self.assertFalse(metadata["complete"])
+        self.assertEqual(metadata["targets"], {"databases": None, "collections": None})
+        self.assertEqual(self.journal_add.call_args_list, [mock.call("d1")])
+        self.catalog.return_value.add.assert_called_once_with("localhost:27017", "foo-bar", metadata)
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    def test__restore__incomplete__raises_BackupIncompleteError(self, *args):
+        m = mongobar.Mongobar()
+        with mock.patch("mongobar.Mongobar.read_metadata", return_value=self.incomplete_metadata()):
+            with self.assertRaises(mongobar.exceptions.BackupIncompleteError):
+                m.restore("foo-bar")
+
+    # progress
+
+    def test__stream_command(self, *args):
+        m = mongobar.Mongobar()
+        m.progress = mongobar.progress.ProgressTracker(mock.Mock())
+        m.progress_callback = m.progress.callback
+
+        script = "import sys; sys.stderr.write('[##]  d1.c1  5/10  (50.0%)\\ndone dumping d1.c1 (10 documents)\\n')"
+        m.run_command([sys.executable, "-c", script])
+
+        self.assertEqual(m.progress.callback.call_count, 2)
+        self.assertEqual(m.progress.summary()["d1.c1"]["documents"], 10)
+
+    def test__run_command__raises_CommandError(self, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.CommandError) as context:
+            m.run_command([sys.executable, "-c", "import sys; sys.stderr.write('boom\\n'); sys.exit(1)"])
+        self.assertIn("boom", str(context.exception))
+
+    def test__run_command__tracks_progress_without_callback(self, *args):
+        m = mongobar.Mongobar()
+
+        script = "import sys; sys.stderr.write('done dumping d1.c1 (10 documents)\\n')"
+        m.run_command([sys.executable, "-c", script])
+
+        self.assertEqual(m.progress.summary()["d1.c1"]["documents"], 10)
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__progress(self, stream_command, write_metadata, *args):
+        def run(command):
+            m.progress.feed("done dumping d1.c1 (10 documents)", 0.0)
+            return 1.0
+        stream_command.side_effect = run
+
+        m = mongobar.Mongobar()
+        m.progress_callback = mock.Mock()
+        m.backup()
+
+        self.assertNotIn("--quiet", stream_command.call_args[0][0])
+        m.progress_callback.assert_called()
+
+        metadata = write_metadata.call_args[0][1]
+        self.assertEqual(metadata["throughput"]["d1.c1"]["documents"], 10)
+
+    @mock.patch("mongobar.mongobar.os.path.exists", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="foo-bar")
+    @mock.patch("mongobar.mongobar.get_directories", return_value=[])
+    @mock.patch("mongobar.mongobar.create_directory", return_value=True)
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value=MOCKED_BACKUP_METADATA_1_DB)
+    @mock.patch("mongobar.Mongobar.write_metadata")
+    @mock.patch("mongobar.Mongobar.stream_command")
+    def test__backup__throughput_without_callback(self, stream_command, write_metadata, *args):
+        m = mongobar.Mongobar()
+        stream_command.side_effect = lambda command: m.progress.feed("done dumping d1.c1 (10 documents)", 0.0)
+        m.backup()
+
+        self.assertNotIn("--quiet", stream_command.call_args[0][0])
+        metadata = write_metadata.call_args[0][1]
+        self.assertEqual(metadata["throughput"]["d1.c1"]["documents"], 10)
+
+    # clone
+
+    @mock.patch("mongobar.Mongobar.pipe_commands", return_value=1.0)
+    def test__clone(self, pipe_commands, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"connections": {"staging": {"host": "staging", "port": 27017}}})
+        m.clone(["d1", "d2"], destination_databases=["x1", "x2"], destination_connection="staging")
+
+        restore_command = [
+            "mongorestore",
+            "--host", "staging",
+            "--port", "27017",
+            "--nsFrom", "d1.*",
+            "--nsTo", "x1.*",
+            "--nsFrom", "d2.*",
+            "--nsTo", "x2.*",
+            "--archive",
+            "--drop"
+        ]
+        dump_command = [
+            "mongodump",
+            "--host", "localhost",
+            "--port", "27017",
+            "--archive",
+            "--quiet"
+        ]
+
+        self.assertEqual(pipe_commands.call_args_list, [
+            mock.call(dump_command + ["--db", "d1"], restore_command),
+            mock.call(dump_command + ["--db", "d2"], restore_command)
+        ])
+
+    @mock.patch("mongobar.Mongobar.pipe_commands", return_value=1.0)
+    def test__clone__whole_server(self, pipe_commands, *args):
+        m = mongobar.Mongobar()
+        m.config.add({"connections": {"staging": {"host": "staging", "port": 27017}}})
+        m.clone(destination_connection="staging")
+
+        self.assertEqual(pipe_commands.call_count, 1)
+        self.assertNotIn("--db", pipe_commands.call_args[0][0])
+
+    def test__clone__same_connection__raises_CloneError(self, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.CloneError):
+            m.clone(["d1"])
+
+    def test__clone__raises_DestinationDatabasesLengthError(self, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.DestinationDatabasesLengthError):
+            m.clone(["d1"], destination_databases=["x1", "x2"])
+
+    def test__pipe_commands(self, *args):
+        m = mongobar.Mongobar()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "output")
+            m.pipe_commands(
+                [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'archive' * 1000)"],
+                [sys.executable, "-c", "import sys, shutil; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))", path]
+            )
+
+            with open(path, "rb") as file_handle:
+                self.assertEqual(file_handle.read(), b"archive" * 1000)
+
+    def test__pipe_commands__raises_CommandError(self, *args):
+        m = mongobar.Mongobar()
+        with self.assertRaises(mongobar.exceptions.CommandError):
+            m.pipe_commands(
+                [sys.executable, "-c", "raise SystemExit(2)"],
+                [sys.executable, "-c", "import sys; sys.stdin.buffer.read()"]
+            )
+
+
+class TestMongobarStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.m = mongobar.Mongobar()
+        self.m.config.add({"root": self.root.name, "storage": "dedup"})
+
+        self.backup_dir = os.path.join(self.m.config.connection_dir, "b1")
+        os.makedirs(os.path.join(self.backup_dir, "d1"))
+
+        self.data = b"".join([bson.encode({"_id": i}) for i in range(100)])
+        with gzip.open(os.path.join(self.backup_dir, "d1", "c1.bson.gz"), "wb") as file_handle:
+            file_handle.write(self.data)
+        with open(os.path.join(self.backup_dir, "metadata.json"), "w+") as file_handle:
+            json.dump({"storage": "dedup"}, file_handle)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test__store_backup(self):
+        manifest = self.m.store_backup(self.backup_dir)
+
+        self.assertEqual(list(manifest["files"].keys()), [os.path.join("d1", "c1.bson.gz")])
+        self.assertEqual(sorted(os.listdir(self.backup_dir)), ["manifest.json", "metadata.json"])
+
+    def test__open_backup(self):
+        self.m.store_backup(self.backup_dir)
+
+        with self.m.open_backup("b1", {"storage": "dedup"}) as (directory, gzipped):
+            self.assertNotEqual(directory, self.backup_dir)
+            self.assertFalse(gzipped)
+            with open(os.path.join(directory, "d1", "c1.bson"), "rb") as file_handle:
+                self.assertEqual(file_handle.read(), self.data)
+
+        self.assertFalse(os.path.exists(directory))
+
+    def test__open_backup__directory_storage(self):
+        with self.m.open_backup("b1", {}) as (directory, gzipped):
+            self.assertEqual(directory, self.backup_dir)
+            self.assertTrue(gzipped)
+
+    def test__open_backup__codec(self):
+        path = os.path.join(self.backup_dir, "d1", "c2.bson")
+        with open(path, "wb") as file_handle:
+            file_handle.write(self.data)
+        mongobar.compression.compress_file(mongobar.compression.Lz4Codec(), path)
+
+        metadata = {"compression": {"codec": "lz4", "level": None}}
+        with self.m.open_backup("b1", metadata) as (directory, gzipped):
+            self.assertNotEqual(directory, self.backup_dir)
+            self.assertFalse(gzipped)
+            with open(os.path.join(directory, "d1", "c2.bson"), "rb") as file_handle:
+                self.assertEqual(file_handle.read(), self.data)
+
+        self.assertFalse(os.path.exists(directory))
+
+    @mock.patch("mongobar.mongobar.Catalog")
+    def test__remove_backup__collects_chunks(self, *args):
+        self.m.store_backup(self.backup_dir)
+        store = mongobar.chunks.ChunkStore(self.m.config.chunks_dir)
+        self.assertTrue(list(store.digests()))
+
+        with mock.patch("mongobar.chunks.time.time", return_value=2 ** 40):
+            self.m.remove_backup("b1")
+
+        self.assertEqual(list(store.digests()), [])
+
+
+    def test__restore_indexes(self):
+        metadata = {"options": {}, "indexes": [
+            {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+            {"v": 2, "key": {"a": 1}, "name": "a_1"},
+            {"v": 2, "key": {"b": 1}, "name": "b_1"}
+        ]}
+        path = os.path.join(self.backup_dir, "d1", "c1.metadata.json.gz")
+        with gzip.open(path, "wb") as file_handle:
+            file_handle.write(bson.json_util.dumps(metadata).encode("utf-8"))
+
+        backup_metadata = {"databases": [{"name": "d1", "collections": [
+            {"name": "c1", "document_count": 100},
+            {"name": "c2", "document_count": 10}
+        ]}]}
+
+        client = mock.MagicMock()
+        with mock.patch("mongobar.Mongobar.create_pymongo_client", return_value=client):
+            count = self.m.restore_indexes(self.backup_dir, backup_metadata, \
+                destination_databases=None)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(client.__getitem__.return_value.command.call_count, 2)
+        client.__getitem__.assert_called_with("d1")
+
+    @mock.patch("mongobar.Mongobar.restore_indexes")
+    @mock.patch("mongobar.Mongobar.tools_restore")
+    def test__restore__indexes_disabled(self, tools_restore, restore_indexes):
+        with open(os.path.join(self.backup_dir, "metadata.json"), "w+") as file_handle:
+            json.dump({"databases": []}, file_handle)
+
+        self.m.config.add({"indexes": False})
+        self.m.restore("b1")
+
+        tools_restore.assert_called()
+        restore_indexes.assert_not_called()
+
+
+class TestMongobarSkipUnchanged(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.m = mongobar.Mongobar()
+        self.m.config.add({"root": self.root.name, "skip_unchanged": True})
+
+        self.client = mock.MagicMock()
+        self.client.database_names.return_value = ["d1"]
+        client_patcher = mock.patch("mongobar.Mongobar.create_pymongo_client", return_value=self.client)
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+
+        oplog_patcher = mock.patch("mongobar.mongobar.native.oplog_timestamp", return_value=None)
+        oplog_patcher.start()
+        self.addCleanup(oplog_patcher.stop)
+
+        self.client.admin.command.return_value = {"ismaster": True}
+
+        # the previous backup, c1 and c2 fingerprinted
+        self.source_dir = os.path.join(self.m.config.connection_dir, "b0")
+        os.makedirs(os.path.join(self.source_dir, "d1"))
+        for filename in ["c1.bson.gz", "c1.metadata.json.gz", "c10.bson.gz", "c2.bson.gz"]:
+            with open(os.path.join(self.source_dir, "d1", filename), "wb") as file_handle:
+                file_handle.write(b"data")
+
+        self.m.write_metadata(self.source_dir, self.metadata({"c1": "a", "c2": "b"}, complete=True))
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def metadata(self, fingerprints=None, complete=None):
+        metadata = {
+            "date": datetime.datetime.today().isoformat(),
+            "databases": [{"name": "d1", "collections": [
+                {"name": "c1", "document_count": 1},
+                {"name": "c2", "document_count": 1}
+            ]}],
+            "type": "full",
+            "storage": "directory",
+            "compression": {"codec": "gzip", "level": None}
+        }
+        for collection in metadata["databases"][0]["collections"]:
+            if fingerprints:
+                collection["fingerprint"] = fingerprints[collection["name"]]
+        if complete is not None:
+            metadata["complete"] = complete
+        return metadata
+
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="b1")
+    @mock.patch("mongobar.Mongobar.run_command")
+    @mock.patch("mongobar.mongobar.native.collection_fingerprints", return_value={"c1": "a", "c2": "changed"})
+    def test__backup__skip_unchanged(self, collection_fingerprints, run_command, *args):
+        with mock.patch("mongobar.Mongobar.generate_metadata", return_value=self.metadata()):
+            self.m.backup()
+
+        backup_dir = os.path.join(self.m.config.connection_dir, "b1")
+
+        # only c1 is linked, c10 merely shares its prefix
+        self.assertEqual(sorted(os.listdir(os.path.join(backup_dir, "d1"))), [
+            "c1.bson.gz",
+            "c1.metadata.json.gz"
+        ])
+        self.assertTrue(os.path.samefile(
+            os.path.join(backup_dir, "d1", "c1.bson.gz"),
+            os.path.join(self.source_dir, "d1", "c1.bson.gz")
+        ))
+
+        command = run_command.call_args[0][0]
+        self.assertEqual(command[command.index("--excludeCollection") + 1], "c1")
+        self.assertEqual(command.count("--excludeCollection"), 1)
+
+        metadata = self.m.read_metadata("b1")
+        self.assertEqual(metadata["reused"], {"backup": "b0", "collections": ["d1.c1"]})
+        fingerprints = [c["fingerprint"] for c in metadata["databases"][0]["collections"]]
+        self.assertEqual(fingerprints, ["a", "changed"])
+
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="b1")
+    @mock.patch("mongobar.Mongobar.run_command")
+    @mock.patch("mongobar.mongobar.native.collection_fingerprints", return_value={"c1": "a", "c2": "b"})
+    def test__backup__skip_unchanged__codec_changed(self, collection_fingerprints, run_command, *args):
+        self.m.config.add({"compression": "gzip:9"})
+        with mock.patch("mongobar.Mongobar.generate_metadata", return_value=self.metadata()):
+            with mock.patch("mongobar.Mongobar.compress_backup"):
+                self.m.backup()
+
+        metadata = self.m.read_metadata("b1")
+        self.assertNotIn("reused", metadata)
+        self.assertNotIn("--excludeCollection", run_command.call_args[0][0])
+
+
+class TestMongobarSwapRestore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.m = mongobar.Mongobar()
+        self.m.config.add({"root": self.root.name})
+
+        self.client = mock.MagicMock()
+        self.client.__getitem__.return_value.collection_names.return_value = [
+            "mongobar_staging.c1",
+            "mongobar_staging.c2"
+        ]
+        client_patcher = mock.patch("mongobar.Mongobar.create_pymongo_client", return_value=self.client)
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+
+        self.backup_dir = os.path.join(self.m.config.connection_dir, "b1")
+        os.makedirs(os.path.join(self.backup_dir, "d1"))
+        with open(os.path.join(self.backup_dir, "metadata.json"), "w+") as file_handle:
+            json.dump({"databases": [{"name": "d1", "collections": [
+                {"name": "c1", "document_count": 1},
+                {"name": "c2", "document_count": 5}
+            ]}]}, file_handle)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    @mock.patch("mongobar.Mongobar.restore_collection_indexes", return_value=1)
+    @mock.patch("mongobar.Mongobar.run_command", return_value=1.0)
+    def test__restore__swap(self, run_command, restore_collection_indexes):
+        self.m.restore("b1", destination_databases=["d2"], swap=True)
+
+        self.assertEqual(run_command.call_args_list[0][0][0], [
+            "mongorestore",
+            "--host", "localhost",
+            "--port", "27017",
+            "--nsInclude", "d1.c2",
+            "--nsFrom", "d1.c2",
+            "--nsTo", "d2.mongobar_staging.c2",
+            "--drop",
+            "--dir", self.backup_dir,
+            "--gzip",
+            "--noIndexRestore"
+        ])
+        self.assertEqual(run_command.call_count, 2)
+
+        restore_collection_indexes.assert_any_call(self.client, os.path.join(self.backup_dir, "d1"), \
+            "d2", "c1", "mongobar_staging.c1")
+
+        self.client.admin.command.assert_any_call(
+            "renameCollection",
+            "d2.mongobar_staging.c1",
+            to="d2.c1",
+            dropTarget=True
+        )
+        self.assertEqual(self.client.admin.command.call_count, 2)
+
+    @mock.patch("mongobar.Mongobar.run_command", side_effect=mongobar.exceptions.CommandError("failed"))
+    def test__restore__swap__failure_leaves_targets(self, run_command):
+        with self.assertRaises(mongobar.exceptions.CommandError):
+            self.m.restore("b1", swap=True)
+
+        self.client.admin.command.assert_not_called()
+        self.client.__getitem__.return_value.drop_collection.assert_any_call("mongobar_staging.c1")
+        self.client.__getitem__.return_value.drop_collection.assert_any_call("mongobar_staging.c2")
+
+    @mock.patch("mongobar.Mongobar.restore_collection_indexes", return_value=1)
+    @mock.patch("mongobar.Mongobar.run_command", return_value=1.0)
+    def test__restore__swap__rename_failure(self, *args):
+        error = pymongo.errors.OperationFailure("rename failed")
+        self.client.admin.command.side_effect = [{}, error]
+
+        with self.assertRaises(mongobar.exceptions.SwapRestoreError) as context:
+            self.m.restore("b1", swap=True)
+
+        # c2 is the largest collection so it is swapped in first
+        self.assertIn("swapped in before the failure: d1.c2", str(context.exception))
+        drop_collection = self.client.__getitem__.return_value.drop_collection
+        self.assertEqual(drop_collection.call_args_list, [mock.call("mongobar_staging.c1")])
+
+    @mock.patch("mongobar.Mongobar.restore_collection", return_value=1)
+    def test__restore__swap__native_engine(self, restore_collection):
+        self.m.config.add({"engine": "native", "indexes": False})
+        for collection in ["c1", "c2"]:
+            with gzip.open(os.path.join(self.backup_dir, "d1", collection + ".bson.gz"), "wb"):
+                pass
+        self.m.restore("b1", swap=True)
+
+        collections = sorted([c[0][3] for c in restore_collection.call_args_list])
+        self.assertEqual(collections, ["mongobar_staging.c1", "mongobar_staging.c2"])
+        self.assertEqual(self.client.admin.command.call_count, 2)
+
+    def test__restore__swap__archive__raises_SwapRestoreError(self):
+        with open(os.path.join(self.backup_dir, "metadata.json"), "w+") as file_handle:
+            json.dump({"databases": [], "storage": "archive"}, file_handle)
+
+        with self.assertRaises(mongobar.exceptions.SwapRestoreError):
+            self.m.restore("b1", swap=True)
+
+
+class TestMongobarShards(unittest.TestCase):
+
+    shards = [
+        {"name": "s1", "host": "rs1/h1:27018,h2:27018"},
+        {"name": "s2", "host": "rs2/h3:27018"}
+    ]
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.m = mongobar.Mongobar()
+        self.m.config.add({"root": self.root.name})
+
+        self.client = mock.MagicMock()
+        client_patcher = mock.patch("mongobar.Mongobar.create_pymongo_client", return_value=self.client)
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+
+        catalog_patcher = mock.patch("mongobar.mongobar.Catalog")
+        catalog_patcher.start()
+        self.addCleanup(catalog_patcher.stop)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test__get_shards(self):
+        self.client.admin.command.side_effect = [
+            {"ismaster": True, "msg": "isdbgrid"},
+            {"shards": [{"_id": "s1", "host": "rs1/h1:27018,h2:27018", "state": 1}]}
+        ]
+        self.assertEqual(self.m.get_shards(self.client), [
+            {"name": "s1", "host": "rs1/h1:27018,h2:27018"}
+        ])
+
+    def test__get_shards__not_mongos(self):
+        self.client.admin.command.return_value = {"ismaster": True}
+        self.assertEqual(self.m.get_shards(self.client), [])
+
+    def test__shard_connection(self):
+        self.m.config.add({"connections": {"default": {
+            "username": "user",
+            "password": "pass",
+            "read_preference": "secondary"
+        }}})
+
+        connection = self.m.shard_connection(self.shards[0])
+
+        self.assertEqual(connection.name, "default/s1")
+        self.assertEqual(connection.socket, "h1:27018")
+        self.assertEqual(connection.replicaset, "rs1")
+        self.assertEqual(connection.seeds, ["h1:27018", "h2:27018"])
+        self.assertEqual(connection.username, "user")
+        self.assertEqual(connection.read_preference, "secondary")
+
+    def test__paused_balancer(self):
+        self.client.admin.command.return_value = {"mode": "full"}
+
+        with self.m.paused_balancer(self.client):
+            self.client.admin.command.assert_called_with("balancerStop")
+
+        self.client.admin.command.assert_called_with("balancerStart")
+
+    def test__paused_balancer__restarts_on_failure(self):
+        self.client.admin.command.return_value = {"mode": "full"}
+
+        with self.assertRaises(ValueError):
+            with self.m.paused_balancer(self.client):
+                raise ValueError()
+
+        self.client.admin.command.assert_called_with("balancerStart")
+
+    def test__paused_balancer__already_off(self):
+        self.client.admin.command.return_value = {"mode": "off"}
+
+        with self.m.paused_balancer(self.client):
+            pass
+
+        self.client.admin.command.assert_called_once_with("balancerStatus")
+
+    @mock.patch("mongobar.Mongobar.generate_backup_name", return_value="b1")
+    @mock.patch("mongobar.Mongobar.generate_metadata", return_value={"databases": []})
+    @mock.patch("mongobar.Mongobar.run_command")
+    def test__backup__shards(self, run_command, *args):
+        self.client.database_names.return_value = ["d1", "d2"]
+        self.m.config.add({"connections": {"default": {"read_preference": "secondary"}}})
+
+        with mock.patch("mongobar.Mongobar.get_shards", return_value=self.shards):
+            with mock.patch("mongobar.Mongobar.paused_balancer") as paused_balancer:
+                self.m.backup()
+
+        paused_balancer.assert_called_once_with(self.client)
+
+        backup_dir = os.path.join(self.m.config.connection_dir, "b1")
+        commands = sorted([c[0][0] for c in run_command.call_args_list])
+        self.assertEqual(commands[0], [
+            "mongodump",
+            "--host", "rs1/h1:27018,h2:27018",
+            "--readPreference", "secondary",
+            "--db", "d1",
+            "--out", os.path.join(backup_dir, "s1"),
+            "--gzip"
+        ])
+        self.assertEqual(len(commands), 4)
+
+        metadata = self.m.read_metadata("b1")
+        self.assertTrue(metadata["complete"])
+        self.assertEqual([s["name"] for s in metadata["shards"]], ["s1", "s2"])
+        self.assertEqual(metadata["shards"][0]["host"], "rs1/h1:27018,h2:27018")
+        self.assertEqual(metadata["shards"][0]["namespaces"], 2)
+
+    def test__backup__shards__native_engine__raises_EngineError(self):
+        self.m.config.add({"engine": "native"})
+        with mock.patch("mongobar.Mongobar.get_shards", return_value=self.shards):
+            with self.assertRaises(mongobar.exceptions.EngineError):
+                self.m.backup()
+
+    @mock.patch("mongobar.Mongobar.run_command", return_value=1.0)
+    def test__restore__shards(self, run_command):
+        backup_dir = os.path.join(self.m.config.connection_dir, "b1")
+        os.makedirs(os.path.join(backup_dir, "s1", "d1"))
+        os.makedirs(os.path.join(backup_dir, "s2", "d1"))
+        os.makedirs(os.path.join(backup_dir, "s2", "d2"))
+
+        metadata = {
+            "databases": [
+                {"name": "d1", "collections": [{"name": "c1", "document_count": 1}]},
+                {"name": "d2", "collections": [{"name": "c1", "document_count": 1}]}
+            ],
+            "shards": self.shards
+        }
+        with open(os.path.join(backup_dir, "metadata.json"), "w+") as file_handle:
+            json.dump(metadata, file_handle)
+
+        self.m.restore("b1")
+
+        # the collections are dropped once, not by each shard's mongorestore
+        self.assertEqual(self.client.__getitem__.return_value.drop_collection.call_count, 2)
+
+        commands = [c[0][0] for c in run_command.call_args_list]
+        self.assertEqual(len(commands), 2)
+        for command in commands:
+            self.assertNotIn("--drop", command)
+
+        directories = [c[c.index("--dir") + 1] for c in commands]
+        self.assertEqual(directories, [
+            os.path.join(backup_dir, "s1"),
+            os.path.join(backup_dir, "s2")
+        ])
+        self.assertEqual(commands[1].count("--nsInclude"), 2)
+
+
+class TestMongobarArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.m = mongobar.Mongobar()
+        self.m.config.add({"root": self.root.name, "storage": "archive"})
+
+        self.backup_dir = os.path.join(self.m.config.connection_dir, "b1")
+        os.makedirs(self.backup_dir)
+
+        self.data = b"archive" * 1000
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test__dump_archive__restore_archive(self):
+        path = os.path.join(self.backup_dir, "dump.archive.zst")
+        codec = mongobar.compression.get_codec("zstd")
+
+        command = [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'archive' * 1000)"]
+        self.m.dump_archive(command, path, codec)
+
+        output_path = os.path.join(self.root.name, "output")
+        command = [sys.executable, "-c", "import sys, shutil; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))", output_path]
+        self.m.restore_archive(command, path)
+
+        with open(output_path, "rb") as file_handle:
+            self.assertEqual(file_handle.read(), self.data)
+
+    def test__dump_archive__raises_CommandError(self):
+        path = os.path.join(self.backup_dir, "dump.archive.gz")
+        codec = mongobar.compression.get_codec("gzip")
+
+        with self.assertRaises(mongobar.exceptions.CommandError):
+            self.m.dump_archive([sys.executable, "-c", "raise SystemExit(1)"], path, codec)
+
+    @mock.patch("mongobar.Mongobar.dump_archive")
+    def test__archive_backup(self, dump_archive):
+        self.m.archive_backup(["d1", "d2"], None, self.backup_dir, whole_server=True)
+
+        self.assertEqual(dump_archive.call_count, 1)
+        self.assertEqual(dump_archive.call_args[0][0], [
+            "mongodump",
+            "--host", "localhost",
+            "--port", "27017",
+            "--archive",
+            "--quiet"
+        ])
+        self.assertEqual(dump_archive.call_args[0][1], os.path.join(self.backup_dir, "dump.archive.gz"))
+
+    @mock.patch("mongobar.Mongobar.dump_archive")
+    def test__archive_backup__collections(self, dump_archive):
+        self.m.archive_backup(["d1"], ["c1", "c2"], self.backup_dir)
+
+        paths = [c[0][1] for c in dump_archive.call_args_list]
+        self.assertEqual(paths, [
+            os.path.join(self.backup_dir, "d1.c1.archive.gz"),
+            os.path.join(self.backup_dir, "d1.c2.archive.gz")
+        ])
+        self.assertEqual(dump_archive.call_args[0][0][-4:], ["--db", "d1", "--collection", "c2"])
+
+    @mock.patch("mongobar.Mongobar.restore_archive", return_value=1.0)
+    def test__archive_restore(self, restore_archive):
+        for name in ["d1.archive.gz", "d2.archive.gz", "metadata.json"]:
+            open(os.path.join(self.backup_dir, name), "w").close()
+
+        dest_conn = self.m.config.connection
+        self.m.archive_restore(self.backup_dir, MOCKED_BACKUP_METADATA_3_DBS, ["d1"], ["c1"], \
+            ["x1"], dest_conn)
+
+        restore_archive.assert_called_once_with([
+            "mongorestore",
+            "--host", "localhost",
+            "--port", "27017",
+            "--nsInclude", "d1.c1",
+            "--nsFrom", "d1.*",
+            "--nsTo", "x1.*",
+            "--archive",
+            "--drop"
+        ], os.path.join(self.backup_dir, "d1.archive.gz"))
+
+    def test__backup__native_engine__raises_EngineError(self):
+        self.m.config.add({"engine": "native"})
+
+        with self.assertRaises(mongobar.exceptions.EngineError):
+            self.m.backup()
+
+
+class TestMongobarPrune(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.m = mongobar.Mongobar()
+        self.m.config.add({"root": self.root.name, "prune_batch_size": 2})
+
+        for name, date, extra in [
+            ("b1", "2023-05-01T10:00:00.000000", {}),
+            ("b2", "2023-05-02T10:00:00.000000", {}),
+            ("b3", "2023-05-03T10:00:00.000000", {}),
+            ("b4", "2023-05-03T11:00:00.000000", {"type": "incremental", "parent": "b3"}),
+            ("b5", "2023-05-04T10:00:00.000000", {"complete": False})
+        ]:
+            backup_dir = os.path.join(self.m.config.connection_dir, name)
+            os.makedirs(os.path.join(backup_dir, "d1"))
+            with open(os.path.join(backup_dir, "d1", "c1.bson"), "wb") as file_handle:
+                file_handle.write(b"x" * 100)
+
+            metadata = {"date": date, "databases": []}
+            metadata.update(extra)
+            with open(os.path.join(backup_dir, "metadata.json"), "w+") as file_handle:
+                json.dump(metadata, file_handle)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test__get_backup_size(self):
+        size = os.path.getsize(os.path.join(self.m.config.connection_dir, "b1", "metadata.json"))
+        self.assertEqual(self.m.get_backup_size("b1"), 100 + size)
+
+    def test__plan_prune(self):
+        backups = self.m.plan_prune({"hourly": 1})
+        self.assertEqual([b["name"] for b in backups], ["b1", "b2"])
+        self.assertEqual(backups[0]["date"], datetime.datetime(2023, 5, 1, 10))
+        self.assertGreater(backups[0]["size"], 100)
+
+    def test__plan_prune__hard_links(self):
+        connection_dir = self.m.config.connection_dir
+        os.unlink(os.path.join(connection_dir, "b3", "d1", "c1.bson"))
+        os.link(
+            os.path.join(connection_dir, "b2", "d1", "c1.bson"),
+            os.path.join(connection_dir, "b3", "d1", "c1.bson")
+        )
+        os.unlink(os.path.join(connection_dir, "b2", "metadata.json"))
+        os.link(
+            os.path.join(connection_dir, "b1", "metadata.json"),
+            os.path.join(connection_dir, "b2", "metadata.json")
+        )
+
+        backups = self.m.plan_prune({"hourly": 1})
+        self.assertEqual([b["name"] for b in backups], ["b1", "b2"])
+
+        # the metadata shared by both pruned backups counts once, the dump
+        # file b2 shares with b3 is not freed
+        size = os.path.getsize(os.path.join(connection_dir, "b1", "metadata.json"))
+        self.assertEqual([b["size"] for b in backups], [100 + size, 0])
+
+    def test__get_backup_size__dedup_chunks(self):
+        self.m.config.add({"storage": "dedup"})
+        self.m.store_backup(os.path.join(self.m.config.connection_dir, "b1"))
+
+        self.assertGreater(self.m.get_backup_size("b1"), 100)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.m.config.connection_dir, "b1", "d1", "c1.bson")
+        ))
+
+    def test__plan_prune__skips_backups_without_metadata(self):
+        os.makedirs(os.path.join(self.m.config.connection_dir, "in-progress", "d1"))
+        with open(os.path.join(self.m.config.connection_dir, "b2", "metadata.json"), "w") as file_handle:
+            file_handle.write("{")
+
+        backups = self.m.plan_prune({"hourly": 1})
+        self.assertEqual([b["name"] for b in backups], ["b1"])
+
+    def test__plan_prune__no_policy(self):
+        self.assertEqual(self.m.plan_prune(), [])
+
+    def test__plan_prune__connection_policy(self):
+        self.m.config.add({"connections": {"default": {"retention": {"daily": 2}}}})
+        self.assertEqual([b["name"] for b in self.m.plan_prune()], ["b1"])
+
+    def test__prune__dry_run(self):
+        self.m.prune({"hourly": 1}, dry_run=True)
+        self.assertEqual(sorted(self.m.get_backups()), ["b1", "b2", "b3", "b4", "b5"])
+
+    @mock.patch("mongobar.Mongobar.collect_chunks")
+    def test__prune(self, collect_chunks):
+        self.m.prune({"daily": 1})
+        self.assertEqual(sorted(self.m.get_backups()), ["b3", "b4", "b5"])
+        self.assertEqual(len(mongobar.trash.Trash(self.m.config.trash_dir).entries()), 2)
+        collect_chunks.assert_called_once_with()
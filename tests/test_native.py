@@ -0,0 +1,247 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import tempfile
+import gzip
+import os
+import datetime
+import bson
+import bson.json_util
+import bson.objectid
+import bson.timestamp
+
+from unittest import mock
+
+from bson.raw_bson import RawBSONDocument
+
+import mongobar.native as native
+
+
+# Test Native Engine
+
+class TestNative(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # dump_collection
+
+    def test__dump_collection(self):
+        documents = [{"_id": 1}, {"_id": 2}, {"_id": 3}]
+
+        database = mock.MagicMock()
+        collection = database.get_collection.return_value
+        collection.find.return_value = [
+            RawBSONDocument(bson.encode(d)) for d in documents
+        ]
+        database.__getitem__.return_value.list_indexes.return_value = [
+            {"v": 2, "key": {"_id": 1}, "name": "_id_"}
+        ]
+
+        count = native.dump_collection(database, "c1", self.directory.name, 10)
+        self.assertEqual(count, 3)
+        collection.find.assert_called_with({}, batch_size=10)
+
+        path = os.path.join(self.directory.name, "c1.bson.gz")
+        with gzip.open(path, "rb") as file_handle:
+            self.assertEqual(bson.decode_all(file_handle.read()), documents)
+
+        path = os.path.join(self.directory.name, "c1.metadata.json.gz")
+        with gzip.open(path, "rb") as file_handle:
+            metadata = bson.json_util.loads(file_handle.read().decode("utf-8"))
+        self.assertEqual(metadata["indexes"][0]["name"], "_id_")
+        self.assertEqual(metadata["options"], {})
+
+    def test__dump_collection__query(self):
+        database = mock.MagicMock()
+        collection = database.get_collection.return_value
+        collection.find.return_value = [RawBSONDocument(bson.encode({"_id": 1}))]
+
+        count = native.dump_collection(database, "c1", self.directory.name, 10, query={"a": 1})
+        self.assertEqual(count, 1)
+        collection.find.assert_called_with({"a": 1}, batch_size=10)
+
+    def test__dump_collection__sample_ratio(self):
+        database = mock.MagicMock()
+        collection = database.get_collection.return_value
+        collection.count_documents.return_value = 250
+        collection.aggregate.return_value = [RawBSONDocument(bson.encode({"_id": 1}))]
+
+        native.dump_collection(database, "c1", self.directory.name, 10, \
+            query={"a": 1}, sample=0.01)
+
+        collection.count_documents.assert_called_with({"a": 1})
+        collection.aggregate.assert_called_with(
+            [{"$match": {"a": 1}}, {"$sample": {"size": 3}}],
+            allowDiskUse=True,
+            batchSize=10
+        )
+
+    def test__dump_collection__sample_size(self):
+        database = mock.MagicMock()
+        collection = database.get_collection.return_value
+        collection.aggregate.return_value = []
+
+        native.dump_collection(database, "c1", self.directory.name, 10, sample=100)
+
+        collection.count_documents.assert_not_called()
+        collection.aggregate.assert_called_with(
+            [{"$sample": {"size": 100}}],
+            allowDiskUse=True,
+            batchSize=10
+        )
+
+    # collection_fingerprints
+
+    def test__collection_fingerprints__stats(self):
+        database = mock.MagicMock()
+        database.command.return_value = {"count": 3, "size": 120}
+        find = database.__getitem__.return_value.find.return_value
+        find.sort.return_value.limit.return_value = [{"_id": 7}]
+
+        fingerprints = native.collection_fingerprints(database, ["c1"])
+
+        database.command.assert_called_with("collStats", "c1")
+        self.assertEqual(fingerprints, {"c1": "[3, 120, 7]"})
+
+    def test__collection_fingerprints__dbhash(self):
+        database = mock.MagicMock()
+        database.command.return_value = {"collections": {"c1": "abc"}, "md5": "def"}
+
+        fingerprints = native.collection_fingerprints(database, ["c1", "c2"], "dbhash")
+
+        database.command.assert_called_with("dbHash", collections=["c1", "c2"])
+        self.assertEqual(fingerprints, {"c1": "abc", "c2": None})
+
+    # filters
+
+    def test__filters_to_json__filters_from_json(self):
+        filters = {"d1.c1": {"_id": {"$gte": bson.objectid.ObjectId("5a0000000000000000000000")}}}
+        data = native.filters_to_json(filters)
+        self.assertEqual(data, {"d1.c1": {"_id": {"$gte": {"$oid": "5a0000000000000000000000"}}}})
+        self.assertEqual(native.filters_from_json(data), filters)
+
+    def test__filters_from_json__string(self):
+        self.assertEqual(native.filters_from_json('{"a": {"$gt": 1}}'), {"a": {"$gt": 1}})
+
+    def test__combine_filters(self):
+        self.assertEqual(native.combine_filters([]), {})
+        self.assertEqual(native.combine_filters([("*", {"a": 1})]), {"*": {"a": 1}})
+        self.assertEqual(
+            native.combine_filters([("*", {"a": 1}), ("*", {"b": 2})]),
+            {"*": {"$and": [{"a": 1}, {"b": 2}]}}
+        )
+
+    def test__combine_filters__since(self):
+        since = {"_id": {"$gte": 1}}
+        self.assertEqual(native.combine_filters([], since), {"*": since})
+        self.assertEqual(native.combine_filters([("*", {"a": 1}), ("d1.c1", {"b": 2})], since), {
+            "*": {"$and": [since, {"a": 1}]},
+            "d1.c1": {"$and": [since, {"b": 2}]}
+        })
+
+    def test__since_filter(self):
+        now = datetime.datetime(2020, 1, 31, tzinfo=datetime.timezone.utc)
+        start = native.since_filter(30, now)["_id"]["$gte"]
+        self.assertEqual(start.generation_time, datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+
+    # collection metadata, indexes
+
+    def test__read_collection_metadata(self):
+        metadata = {"options": {}, "indexes": [{"v": 2, "key": {"a": 1, "b": -1}, "name": "a_1_b_-1"}]}
+        path = os.path.join(self.directory.name, "c1.metadata.json.gz")
+        with gzip.open(path, "wb") as file_handle:
+            file_handle.write(bson.json_util.dumps(metadata).encode("utf-8"))
+
+        result = native.read_collection_metadata(self.directory.name, "c1")
+        self.assertEqual(result, metadata)
+        self.assertEqual(list(result["indexes"][0]["key"].keys()), ["a", "b"])
+
+    def test__read_collection_metadata__not_found(self):
+        self.assertIsNone(native.read_collection_metadata(self.directory.name, "c1"))
+
+    def test__create_index(self):
+        database = mock.MagicMock()
+        spec = {"v": 2, "key": {"a": 1}, "name": "a_1", "ns": "d1.c1", "unique": True}
+
+        native.create_index(database, "c1", spec)
+        database.command.assert_called_with(
+            "createIndexes",
+            "c1",
+            indexes=[{"key": {"a": 1}, "name": "a_1", "unique": True}]
+        )
+
+    # timestamps
+
+    def test__timestamp_json(self):
+        timestamp = bson.timestamp.Timestamp(100, 2)
+        data = native.timestamp_to_json(timestamp)
+        self.assertEqual(data, {"t": 100, "i": 2})
+        self.assertEqual(native.timestamp_from_json(data), timestamp)
+        self.assertIsNone(native.timestamp_to_json(None))
+        self.assertIsNone(native.timestamp_from_json(None))
+
+    # dump_oplog
+
+    def test__dump_oplog(self):
+        entries = [{"ts": bson.timestamp.Timestamp(101, 1), "ns": "d1.c1"}]
+
+        client = mock.MagicMock()
+        oplog = client.__getitem__.return_value.get_collection.return_value
+        oplog.find.return_value = [RawBSONDocument(bson.encode(e)) for e in entries]
+
+        path = os.path.join(self.directory.name, "oplog.bson.gz")
+        start = bson.timestamp.Timestamp(100, 1)
+        end = bson.timestamp.Timestamp(200, 1)
+        count = native.dump_oplog(client, path, start, end, ["^d1\\."], 10)
+
+        self.assertEqual(count, 1)
+        query = oplog.find.call_args[0][0]
+        self.assertEqual(query["ts"], {"$gt": start, "$lte": end})
+        self.assertEqual(query["ns"]["$in"][0].pattern, "^d1\\.")
+
+        with gzip.open(path, "rb") as file_handle:
+            self.assertEqual(bson.decode_all(file_handle.read()), entries)
+
+    # iter_batches
+
+    def test__iter_batches(self):
+        batches = list(native.iter_batches(range(5), 2))
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+
+    # restore_collection
+
+    def test__restore_collection(self):
+        documents = [{"_id": i} for i in range(5)]
+
+        path = os.path.join(self.directory.name, "c1.bson.gz")
+        with gzip.open(path, "wb") as file_handle:
+            for document in documents:
+                file_handle.write(bson.encode(document))
+
+        collection = mock.Mock()
+        count = native.restore_collection(collection, path, 2, 2)
+
+        self.assertEqual(count, 5)
+        collection.drop.assert_called_with()
+        self.assertEqual(collection.insert_many.call_count, 3)
+
+        inserted = []
+        for call in collection.insert_many.call_args_list:
+            self.assertEqual(call[1], {"ordered": False})
+            inserted += [bson.decode(d.raw) for d in call[0][0]]
+        self.assertEqual(sorted(inserted, key=lambda d: d["_id"]), documents)
+        collection.database.command.assert_not_called()
+
+    def test__restore_collection__options(self):
+        path = os.path.join(self.directory.name, "c1.bson.gz")
+        with gzip.open(path, "wb") as file_handle:
+            file_handle.write(bson.encode({"_id": 1}))
+
+        collection = mock.Mock()
+        collection.name = "c1"
+        native.restore_collection(collection, path, options={"capped": True, "size": 4096})
+
+        collection.database.command.assert_called_once_with("create", "c1", capped=True, size=4096)
@@ -0,0 +1,102 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+
+from unittest import mock
+
+import mongobar.progress as progress
+
+
+# Test Progress
+
+class TestProgress(unittest.TestCase):
+
+    # parse_line
+
+    def test__parse_line__dump(self):
+        line = "2023-05-01T10:00:00.123+0000\t[######..................]  d1.c1  2500/10000  (25.0%)"
+        self.assertEqual(progress.parse_line(line), {
+            "namespace": "d1.c1",
+            "unit": "documents",
+            "current": 2500,
+            "total": 10000,
+            "done": False
+        })
+
+    def test__parse_line__restore(self):
+        line = "2023-05-01T10:00:00.123+0000\t[######..................]  d1.c1  1.50MB/6.00MB  (25.0%)"
+        self.assertEqual(progress.parse_line(line), {
+            "namespace": "d1.c1",
+            "unit": "bytes",
+            "current": 1572864,
+            "total": 6291456,
+            "done": False
+        })
+
+    def test__parse_line__done(self):
+        for line in [
+            "2023-05-01T10:00:00.123+0000\tdone dumping d1.c1 (10000 documents)",
+            "2023-05-01T10:00:00.123+0000\tfinished restoring d1.c1 (10000 documents, 0 failures)"
+        ]:
+            result = progress.parse_line(line)
+            self.assertEqual(result["namespace"], "d1.c1")
+            self.assertEqual(result["current"], 10000)
+            self.assertTrue(result["done"])
+
+    def test__parse_line__other(self):
+        self.assertIsNone(progress.parse_line("2023-05-01T10:00:00.123+0000\twriting d1.c1 to d1/c1.bson"))
+
+    # ProgressTracker
+
+    @mock.patch("mongobar.progress.time.time", side_effect=[110.0, 120.0, 130.0])
+    def test__tracker__feed(self, *args):
+        callback = mock.Mock()
+        tracker = progress.ProgressTracker(callback)
+
+        event = tracker.feed("[####]  d1.c1  0/10000  (0.0%)", started=100.0)
+        self.assertEqual(event["rate"], 0.0)
+        self.assertIsNone(event["eta"])
+
+        event = tracker.feed("[####]  d1.c1  2500/10000  (25.0%)", started=100.0)
+        self.assertEqual(event["rate"], 250.0)
+        self.assertEqual(event["eta"], 30.0)
+        callback.assert_called_with(event)
+
+        event = tracker.feed("done dumping d1.c1 (10000 documents)", started=100.0)
+        self.assertEqual(event["eta"], 0.0)
+
+        self.assertEqual(tracker.summary(), {
+            "d1.c1": {
+                "documents": 10000,
+                "bytes": None,
+                "duration": 20.0,
+                "documents_per_second": 500.0,
+                "bytes_per_second": None
+            }
+        })
+
+    @mock.patch("mongobar.progress.time.time", side_effect=[100.0, 150.0, 160.0, 170.0])
+    def test__tracker__feed__namespaces_start_separately(self, *args):
+        tracker = progress.ProgressTracker()
+
+        tracker.feed("[####]  d1.c1  0/1000  (0.0%)", started=100.0)
+        tracker.feed("[####]  d1.c2  0/1000  (0.0%)", started=100.0)
+        tracker.feed("done dumping d1.c1 (1000 documents)", started=100.0)
+        event = tracker.feed("done dumping d1.c2 (1000 documents)", started=100.0)
+        self.assertEqual(event["elapsed"], 20.0)
+
+        summary = tracker.summary()
+        self.assertEqual(summary["d1.c1"]["documents_per_second"], 16.7)
+        self.assertEqual(summary["d1.c2"]["documents_per_second"], 50.0)
+
+    @mock.patch("mongobar.progress.time.time", return_value=110.0)
+    def test__tracker__feed__done_only(self, *args):
+        tracker = progress.ProgressTracker()
+
+        event = tracker.feed("done dumping d1.c1 (100 documents)", started=100.0)
+        self.assertEqual(event["elapsed"], 10.0)
+        self.assertEqual(tracker.summary()["d1.c1"]["documents_per_second"], 10.0)
+
+    def test__tracker__feed__other(self):
+        tracker = progress.ProgressTracker()
+        self.assertIsNone(tracker.feed("writing d1.c1 to d1/c1.bson"))
+        self.assertEqual(tracker.summary(), {})
@@ -0,0 +1,101 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import datetime
+
+import mongobar.retention as retention
+
+from mongobar.exceptions import RetentionPolicyError
+
+
+def backup(name, *date, size=10, parent=None):
+    return {"name": name, "date": datetime.datetime(*date), "size": size, "parent": parent}
+
+
+# Test Retention
+
+class TestRetention(unittest.TestCase):
+
+    def setUp(self):
+        self.backups = [
+            backup("h1", 2023, 5, 8, 9),
+            backup("h2", 2023, 5, 8, 10),
+            backup("h3", 2023, 5, 8, 10, 30),
+            backup("d1", 2023, 5, 7, 12),
+            backup("d2", 2023, 5, 6, 12),
+            backup("w1", 2023, 4, 30, 12),
+            backup("m1", 2023, 3, 15, 12)
+        ]
+
+    # validate_policy
+
+    def test__validate_policy(self):
+        self.assertTrue(retention.validate_policy({"daily": 7, "max_bytes": 1024, "weekly": None}))
+
+    def test__validate_policy__unknown_rule(self):
+        with self.assertRaises(RetentionPolicyError):
+            retention.validate_policy({"minutely": 1})
+
+    def test__validate_policy__invalid_value(self):
+        for value in [-1, "7", 1.5, True]:
+            with self.assertRaises(RetentionPolicyError):
+                retention.validate_policy({"daily": value})
+
+    # parse_date
+
+    def test__parse_date(self):
+        self.assertEqual(
+            retention.parse_date("2023-05-01T10:00:00.123000"),
+            datetime.datetime(2023, 5, 1, 10, 0, 0, 123000)
+        )
+        self.assertEqual(retention.parse_date("2023-05-01T10:00:00"), datetime.datetime(2023, 5, 1, 10))
+
+    def test__parse_date__invalid(self):
+        with self.assertRaises(RetentionPolicyError):
+            retention.parse_date("yesterday")
+
+    # select_backups
+
+    def test__select_backups__empty(self):
+        self.assertEqual(retention.select_backups([], {"daily": 1}), set())
+
+    def test__select_backups__hourly(self):
+        keep = retention.select_backups(self.backups, {"hourly": 2})
+        self.assertEqual(keep, set(["h3", "h1"]))
+
+    def test__select_backups__daily(self):
+        keep = retention.select_backups(self.backups, {"daily": 3})
+        self.assertEqual(keep, set(["h3", "d1", "d2"]))
+
+    def test__select_backups__grandfather_father_son(self):
+        keep = retention.select_backups(self.backups, {"daily": 2, "weekly": 2, "monthly": 3})
+        self.assertEqual(keep, set(["h3", "d1", "w1", "m1"]))
+
+    def test__select_backups__zero_keeps_newest(self):
+        keep = retention.select_backups(self.backups, {"daily": 0})
+        self.assertEqual(keep, set(["h3"]))
+
+    def test__select_backups__max_bytes(self):
+        keep = retention.select_backups(self.backups, {"max_bytes": 35})
+        self.assertEqual(keep, set(["h3", "h2", "h1"]))
+
+    def test__select_backups__max_bytes__keeps_newest(self):
+        keep = retention.select_backups(self.backups, {"max_bytes": 1})
+        self.assertEqual(keep, set(["h3"]))
+
+    def test__select_backups__max_bytes__shared_files(self):
+        backups = [
+            dict(backup("b1", 2023, 5, 1, 10), files={"a": 20, "b": 10}),
+            dict(backup("b2", 2023, 5, 2, 10), files={"a": 20, "c": 10}),
+            dict(backup("b3", 2023, 5, 3, 10), files={"a": 20, "d": 10})
+        ]
+        keep = retention.select_backups(backups, {"max_bytes": 50})
+        self.assertEqual(keep, set(["b1", "b2", "b3"]))
+
+    def test__select_backups__keeps_incremental_chain(self):
+        backups = [
+            backup("full", 2023, 5, 1, 10),
+            backup("inc1", 2023, 5, 2, 10, parent="full"),
+            backup("inc2", 2023, 5, 3, 10, parent="inc1")
+        ]
+        keep = retention.select_backups(backups, {"daily": 1})
+        self.assertEqual(keep, set(["full", "inc1", "inc2"]))
@@ -0,0 +1,80 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import tempfile
+import subprocess
+import json
+import os
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "mongobar", "scripts", "mongobar")
+
+# runs the script, then reports how long it took and which modules it loaded
+RUNNER = """
+import sys, json, runpy, time
+start = time.perf_counter()
+sys.argv = ["mongobar"] + json.loads(sys.argv[1])
+runpy.run_path({script!r}, run_name="__main__")
+sys.stderr.write("\\nDURATION " + str(time.perf_counter() - start))
+sys.stderr.write("\\nMODULES " + json.dumps(sorted(sys.modules)))
+"""
+
+# seconds an offline action may take, excluding interpreter startup, about
+# four times what it takes today, so slow machines pass but a regression such
+# as an eager import of every dependency fails, the module checks below catch
+# the smaller regression of importing pymongo alone
+STARTUP_LIMIT = 0.5
+
+
+# Test Script
+
+class TestScript(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.home.cleanup()
+
+    def run_script(self, *args):
+        environment = dict(os.environ)
+        environment["HOME"] = self.home.name
+        environment["PYTHONPATH"] = ROOT
+
+        arguments = ["--root", os.path.join(self.home.name, "root")] + list(args)
+        result = subprocess.run(
+            [sys.executable, "-c", RUNNER.format(script=SCRIPT), json.dumps(arguments)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=environment,
+            universal_newlines=True,
+            timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        modules = result.stderr.rsplit("MODULES ", 1)[1]
+        self.duration = float(result.stderr.rsplit("DURATION ", 1)[1].split("\n", 1)[0])
+        return result.stdout, set(json.loads(modules))
+
+    # startup
+
+    def test__offline_actions__do_not_import_pymongo(self):
+        for action in ["config", "dirs", "backups", "connection", "gc"]:
+            _, modules = self.run_script(action)
+            self.assertNotIn("pymongo", modules, action)
+            self.assertNotIn("bson", modules, action)
+
+    def test__config__does_not_import_dateutil(self):
+        output, modules = self.run_script("config")
+        self.assertIn("Connections:", output)
+        self.assertNotIn("dateutil.parser", modules)
+
+    def test__offline_actions__startup_time(self):
+        for action in ["config", "backups"]:
+            # the fastest of a few runs, so a busy machine does not fail it
+            durations = []
+            for _ in range(3):
+                self.run_script(action)
+                durations.append(self.duration)
+
+            self.assertLess(min(durations), STARTUP_LIMIT, action)
@@ -0,0 +1,82 @@
+import sys; sys.path.append("../") # noqa
+import unittest
+import tempfile
+import shutil
+import os
+
+from unittest import mock
+
+import mongobar.trash as trash
+
+
+# Test Trash
+
+class TestTrash(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.trash = trash.Trash(os.path.join(self.root, ".trash"))
+
+        self.backup_dir = os.path.join(self.root, "localhost:27017", "b1")
+        for database in ["d1", "d2"]:
+            os.makedirs(os.path.join(self.backup_dir, database))
+            for collection in ["c1", "c2"]:
+                path = os.path.join(self.backup_dir, database, collection + ".bson")
+                with open(path, "wb") as file_handle:
+                    file_handle.write(b"data")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    # move
+
+    def test__move(self):
+        destination = self.trash.move(self.backup_dir)
+        self.assertFalse(os.path.exists(self.backup_dir))
+        self.assertTrue(os.path.isdir(os.path.join(destination, "d1")))
+        self.assertEqual(self.trash.entries(), [destination])
+
+    def test__move__same_name_twice(self):
+        first = self.trash.move(self.backup_dir)
+        os.makedirs(self.backup_dir)
+        second = self.trash.move(self.backup_dir)
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(self.trash.entries()), 2)
+
+    def test__entries__trash_does_not_exist(self):
+        self.assertEqual(self.trash.entries(), [])
+
+    # collect
+
+    def test__collect(self):
+        self.trash.move(self.backup_dir)
+        self.assertEqual(self.trash.collect(workers=2), 4)
+        self.assertEqual(self.trash.entries(), [])
+
+    def test__collect__empty(self):
+        self.assertEqual(self.trash.collect(), 0)
+
+    @mock.patch("mongobar.trash.time.sleep")
+    def test__collect__rate(self, sleep):
+        self.trash.move(self.backup_dir)
+        self.trash.collect(workers=1, rate=1000)
+        self.assertTrue(sleep.called)
+
+
+# Test Throttle
+
+class TestThrottle(unittest.TestCase):
+
+    @mock.patch("mongobar.trash.time.sleep")
+    @mock.patch("mongobar.trash.time.time", return_value=100.0)
+    def test__wait(self, time, sleep):
+        throttle = trash.Throttle(rate=4)
+        throttle.wait()
+        throttle.wait()
+        throttle.wait()
+        self.assertEqual(sleep.call_args_list, [mock.call(0.25), mock.call(0.5)])
+
+    @mock.patch("mongobar.trash.time.sleep")
+    def test__wait__unthrottled(self, sleep):
+        trash.Throttle().wait()
+        sleep.assert_not_called()